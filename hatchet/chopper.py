@@ -3,56 +3,417 @@
 #
 # SPDX-License-Identifier: MIT
 
+import heapq
+import warnings
+
 import pandas as pd
 import numpy as np
 
 
+def _level_codes(index, level):
+    """Codes of an index level, numbering its values in sorted order.
+
+    This uses the codes of a MultiIndex rather than hashing every row.
+
+    Return:
+        (tuple): ``(codes, values)``, where ``values[codes[i]]`` is the value
+            of the level in row i
+    """
+    if not isinstance(index, pd.MultiIndex):
+        return pd.factorize(index.get_level_values(level), sort=True)
+    position = index.names.index(level)
+    codes = index.codes[position]
+    values = index.levels[position]
+    # keep the values that are used, in sorted order
+    used = np.flatnonzero(np.bincount(codes, minlength=len(values)))
+    order = used[values[used].argsort()]
+    remap = np.zeros(len(values), dtype=np.intp)
+    remap[order] = np.arange(len(order))
+    return remap[codes], values[order]
+
+
+def _node_rows(graphframe, cache=None):
+    """Number the nodes of the rows of the dataframe.
+
+    Arguments:
+        cache (dict, optional): intermediates shared by several analyses of
+            the same graphframe (see Chopper.analyze)
+
+    Return:
+        (tuple): ``(node_codes, nodes, first_rows)``, where ``nodes`` are in
+            sorted order, ``nodes[node_codes[i]]`` is the node of row i, and
+            ``first_rows[j]`` is the first row of ``nodes[j]``
+    """
+    if cache is not None and "node_rows" in cache:
+        return cache["node_rows"]
+    node_codes, nodes = _level_codes(graphframe.dataframe.index, "node")
+    first_rows = np.unique(node_codes, return_index=True)[1]
+    result = (node_codes, nodes, first_rows)
+    if cache is not None:
+        cache["node_rows"] = result
+    return result
+
+
+def _node_metrics(graphframe, columns, function="mean", cache=None):
+    """Values of columns for every node, aggregated across ranks/threads.
+
+    Exclusive and inclusive metrics are aggregated with function ("mean" or
+    "max"), ignoring NaN. Other columns take the first row of each node, as
+    in GraphFrame.drop_index_levels.
+
+    Arguments:
+        cache (dict, optional): intermediates shared by several analyses of
+            the same graphframe (see Chopper.analyze)
+
+    Return:
+        (tuple): ``(nodes, values)``, where ``values[column][i]`` is the value
+            of the column for ``nodes[i]``
+    """
+    dataframe = graphframe.dataframe
+    metrics = graphframe.exc_metrics + graphframe.inc_metrics
+    node_codes, nodes, rows = _node_rows(graphframe, cache)
+    values = {}
+    for column in columns:
+        key = ("node_metric", column, function if column in metrics else None)
+        if cache is not None and key in cache:
+            values[column] = cache[key]
+            continue
+        column_values = dataframe[column].to_numpy()
+        if column not in metrics or len(rows) == len(dataframe):
+            values[column] = column_values[rows]
+        else:
+            values[column] = _aggregate_rows(
+                column_values.astype(float), node_codes, len(nodes), function
+            )
+        if cache is not None:
+            cache[key] = values[column]
+    return nodes, values
+
+
+def _aggregate_rows(column_values, node_codes, num_nodes, function):
+    """Aggregate the values of the rows of each node, ignoring NaN."""
+    present = ~np.isnan(column_values)
+    if function == "max":
+        result = np.full(num_nodes, np.nan)
+        np.fmax.at(result, node_codes[present], column_values[present])
+        return result
+    total = np.bincount(node_codes[present], column_values[present], num_nodes)
+    count = np.bincount(node_codes[present], minlength=num_nodes)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / count
+
+
+def _callpath_keys(graph, callpaths):
+    """Number the call paths of the nodes of a graph.
+
+    A call path is numbered by the number of its parent's call path and the
+    frame of its last node, so call paths are compared in constant time and
+    match across graphs that share the ``callpaths`` dict.
+
+    Arguments:
+        graph (Graph): graph whose nodes are numbered
+        callpaths (dict): numbers of the call paths seen so far, by
+            (parent number, frame); new call paths are added to it
+
+    Return:
+        (dict): list of call path numbers of each node (more than one if the
+            node has several parents)
+    """
+    keys = {}
+    # parents come before their children in reverse postorder
+    for node in reversed(list(graph.traverse(order="post"))):
+        parent_keys = [key for parent in node.parents for key in keys.get(parent, [])]
+        keys[node] = [
+            callpaths.setdefault((parent_key, node.frame), len(callpaths))
+            for parent_key in (parent_keys or [-1])
+        ]
+    return keys
+
+
+class _RankFeatures:
+    """(ranks x features) matrix of a graphframe, built a block at a time.
+
+    The features are the values of each metric at each node, summed over the
+    threads of a rank; nodes that a rank did not execute have the value 0.
+    The rows of the dataframe are sorted by node and by rank once, so blocks
+    of nodes or of ranks are built from contiguous rows.
+    """
+
+    def __init__(self, graphframe, metrics):
+        index = graphframe.dataframe.index
+        self.node_codes, self.nodes = _level_codes(index, "node")
+        self.rank_codes, self.ranks = _level_codes(index, "rank")
+        self.metrics = metrics
+        self.values = [
+            np.nan_to_num(graphframe.dataframe[metric].to_numpy(dtype=float))
+            for metric in metrics
+        ]
+        self.num_nodes = len(self.nodes)
+        self.num_ranks = len(self.ranks)
+        self.num_features = len(metrics) * self.num_nodes
+
+        self.by_node = np.argsort(self.node_codes, kind="stable")
+        self.node_starts = np.searchsorted(
+            self.node_codes[self.by_node], np.arange(self.num_nodes + 1)
+        )
+        # the rows of each rank are contiguous in these copies
+        by_rank = np.argsort(self.rank_codes, kind="stable")
+        self.rank_starts = np.searchsorted(
+            self.rank_codes[by_rank], np.arange(self.num_ranks + 1)
+        )
+        self.rank_node_codes = self.node_codes[by_rank]
+        self.rank_values = [values[by_rank] for values in self.values]
+
+    def node_block(self, start, stop):
+        """Features of the nodes in [start, stop) for all ranks.
+
+        Return:
+            (ndarray): (ranks x (metrics x nodes)) matrix, metric-major
+        """
+        rows = self.by_node[self.node_starts[start] : self.node_starts[stop]]
+        width = stop - start
+        flat = self.rank_codes[rows] * width + (self.node_codes[rows] - start)
+        size = self.num_ranks * width
+        return np.hstack(
+            [
+                np.bincount(flat, values[rows], size).reshape(self.num_ranks, width)
+                for values in self.values
+            ]
+        )
+
+    def rank_block(self, ranks):
+        """All features of the given ranks (codes).
+
+        Return:
+            (ndarray): (len(ranks) x (metrics x nodes)) matrix, metric-major
+        """
+        starts = self.rank_starts[ranks]
+        lengths = self.rank_starts[ranks + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        rows = offsets + np.arange(lengths.sum())
+        local = np.repeat(np.arange(len(ranks)), lengths)
+        flat = local * self.num_features + self.rank_node_codes[rows]
+        size = len(ranks) * self.num_features
+        block = np.zeros(size)
+        for i, values in enumerate(self.rank_values):
+            block += np.bincount(flat + i * self.num_nodes, values[rows], size)
+        return block.reshape(len(ranks), self.num_features)
+
+
 class Chopper:
     """High-level API for performance analysis."""
 
-    def flat_profile(self, graphframe, groupby_column=None, as_index=True):
+    # analyses that Chopper.analyze can run on a single graphframe
+    _analyses = (
+        "flat_profile",
+        "load_imbalance",
+        "hot_path",
+        "correlation_analysis",
+        "rank_outliers",
+    )
+
+    # intermediates shared by the analyses of a Chopper.analyze call
+    _intermediates = None
+
+    def analyze(self, graphframe, analyses=None):
+        """Runs several analyses of a graphframe at once.
+        Inputs:
+         - analyses: List of analyses to run, each given by name
+         ("flat_profile", "load_imbalance", "hot_path",
+         "correlation_analysis" or "rank_outliers"), or as a (name, kwargs)
+         tuple to pass
+         arguments, e.g., ("load_imbalance", {"verbose": True}).
+         Default: all of them, with the correlation between all metrics
+         (rank_outliers only if the dataframe is indexed by rank).
+        Output:
+         - dict of the result of each analysis, by name.
+
+        The intermediates that the analyses share, such as the nodes of the
+        rows and the metrics aggregated across processes/threads, are
+        computed once for all of them.
+
+        Example:
+        results = graphframe.analyze(["flat_profile", ("hot_path", {"top_k": 5})])
+        results["hot_path"]
+        """
+        if analyses is None:
+            analyses = [
+                name
+                for name in self._analyses
+                if name != "rank_outliers" or "rank" in graphframe.dataframe.index.names
+            ]
+
+        planned = []
+        for analysis in analyses:
+            name, kwargs = (
+                (analysis, {}) if isinstance(analysis, str) else tuple(analysis)
+            )
+            if name not in self._analyses:
+                raise ValueError(
+                    "unknown analysis {!r}; must be one of {}".format(
+                        name, ", ".join(self._analyses)
+                    )
+                )
+            kwargs = dict(kwargs)
+            if name == "correlation_analysis" and kwargs.get("metrics") is None:
+                kwargs["metrics"] = graphframe.exc_metrics + graphframe.inc_metrics
+            planned.append((name, kwargs))
+
+        self._intermediates = {}
+        try:
+            _node_rows(graphframe, self._intermediates)
+            results = {}
+            for name, kwargs in planned:
+                results[name] = getattr(self, name)(graphframe, **kwargs)
+        finally:
+            self._intermediates = None
+        return results
+
+    def flat_profile(
+        self, graphframe, groupby_column=None, as_index=True, per_rank=False
+    ):
         """Generates flat profile for a given graphframe.
-        Returns a new dataframe."""
-        graphframe2 = graphframe.deepcopy()
+        Returns a new dataframe.
+
+        Inputs:
+         - groupby_column: Column (or list of columns) to group the nodes by.
+         Default: "name"
+         - as_index: If False, the groups are columns of the result.
+         - per_rank: If True, one flat profile per rank/thread, indexed by
+         group and rank/thread. Otherwise, the metrics of each node are
+         averaged across ranks/threads before the nodes are summed.
+        Output:
+         - dataframe of the sums of the numeric columns of each group, and
+         the first value of the other columns, sorted by decreasing default
+         metric.
 
+        The profile is computed from the columns of the dataframe; neither
+        the graphframe nor its graph is copied.
+        """
         if groupby_column is None:
             groupby_column = "name"
+        groupby_columns = (
+            [groupby_column] if isinstance(groupby_column, str) else groupby_column
+        )
 
-        # TODO: change drop_index_levels(). Drop only ranks or threads.
-        graphframe2.drop_index_levels()
-
-        result_dataframe = graphframe2.dataframe.groupby(
-            groupby_column, as_index=as_index
-        ).sum()
-        result_dataframe = result_dataframe.sort_values(
-            by=[graphframe.default_metric], ascending=False
+        dataframe = graphframe.dataframe
+        index = dataframe.index
+        columns = [
+            column for column in dataframe.columns if column not in groupby_columns
+        ]
+        numeric = set(
+            column
+            for column in columns
+            if pd.api.types.is_numeric_dtype(dataframe[column])
+            and not pd.api.types.is_bool_dtype(dataframe[column])
+        )
+        metrics = graphframe.exc_metrics + graphframe.inc_metrics
+        rank_levels = [name for name in index.names if name != "node"]
+
+        if per_rank:
+            # every row is a node of one rank/thread
+            row_values = {c: dataframe[c].to_numpy() for c in groupby_columns + columns}
+            levels = [_level_codes(index, name) for name in rank_levels]
+        else:
+            # aggregate each node across ranks/threads first
+            _, row_values = _node_metrics(
+                graphframe, groupby_columns + columns, cache=self._intermediates
+            )
+            levels = []
+
+        # number the groups of the rows in sorted order, ignoring rows with
+        # a missing key (as in DataFrame.groupby)
+        keys = [pd.factorize(row_values[c], sort=True) for c in groupby_columns]
+        keys += levels
+        shape = tuple(len(values) for _, values in keys)
+        valid = np.all([codes >= 0 for codes, _ in keys], axis=0)
+        flat = np.ravel_multi_index(
+            tuple(np.where(valid, codes, 0) for codes, _ in keys), shape
+        )
+        groups, group_codes = np.unique(flat[valid], return_inverse=True)
+        group_codes = group_codes.ravel()
+
+        # the other columns take the value of the first row of each group
+        _, first = np.unique(group_codes, return_index=True)
+        sums = {}
+        for column in columns:
+            if column not in numeric:
+                sums[column] = row_values[column][valid][first]
+                continue
+            values = row_values[column].astype(float)
+            sums[column] = np.bincount(
+                group_codes, np.nan_to_num(values[valid], nan=0.0), len(groups)
+            )
+            if pd.api.types.is_integer_dtype(dataframe[column]) and (
+                per_rank or column not in metrics
+            ):
+                sums[column] = sums[column].astype(dataframe[column].dtype)
+
+        group_index = np.unravel_index(groups, shape)
+        names = (
+            list(groupby_columns) + rank_levels if per_rank else list(groupby_columns)
         )
+        result_index = pd.MultiIndex.from_arrays(
+            [values[codes] for codes, (_, values) in zip(group_index, keys)],
+            names=names,
+        )
+        if len(names) == 1:
+            result_index = result_index.get_level_values(0)
+        result_dataframe = pd.DataFrame(sums, index=result_index)
+        if as_index is False:
+            result_dataframe = result_dataframe.reset_index()
+
+        if graphframe.default_metric in result_dataframe.columns:
+            order = np.argsort(
+                -result_dataframe[graphframe.default_metric].to_numpy(), kind="stable"
+            )
+            result_dataframe = result_dataframe.iloc[order]
 
         return result_dataframe
 
-    def flatten(self, graphframe, groupby_column="name"):
+    def flatten(self, graphframe, groupby_column="name", per_rank=False):
         """
         Flattens the graphframe by changing its graph structure and the dataframe.
         Returns a new graphframe.
+
+        Inputs:
+         - per_rank: If True, the metrics are summed per rank/thread and the
+         dataframe keeps its rank/thread index levels.
         """
-        result_graphframe = graphframe.groupby_aggregate(groupby_column, "sum")
+        if groupby_column is None:
+            groupby_column = "name"
+        result_graphframe = graphframe.groupby_aggregate(
+            groupby_column, "sum", per_rank=per_rank
+        )
 
         return result_graphframe
 
-    def to_callgraph(self, graphframe):
+    def to_callgraph(self, graphframe, per_rank=False):
         """
         Converts a CCT to a callgraph.
         Returns a new graphframe.
+
+        Inputs:
+         - per_rank: If True, the metrics are summed per rank/thread and the
+         dataframe keeps its rank/thread index levels, e.g., for the load
+         imbalance of each function.
         """
 
         # TODO: provide hierarchy information in the graphframe metadata to access the
         #       hierarchy of the input nodes - currently using function name
-        result_graphframe = graphframe.groupby_aggregate("name", "sum")
+        result_graphframe = graphframe.groupby_aggregate(
+            "name", "sum", per_rank=per_rank
+        )
 
         return result_graphframe
 
     def load_imbalance(
-        self, graphframe, metric_column=None, threshold=None, verbose=False
+        self,
+        graphframe,
+        metric_column=None,
+        threshold=None,
+        verbose=False,
+        sketch=False,
     ):
         """Calculates load imbalance for the given metric column.
         Takes a graphframe and a metric column to calculate the
@@ -64,183 +425,258 @@ class Chopper:
         Returns a new graphframe with corresponding <metric>.imbalance column.
         If the verbose parameter is True, it provides frequency histogram,
         the top five ranks that have the highest metric value, and percentile
-        information.
+        information. The statistics of all nodes are computed at once from a
+        (nodes x processes/threads) matrix of the metric values.
+
+        If sketch is True, the statistics come from a quantile sketch per
+        node instead: the sketches of a graphframe read with sketch=True, or
+        sketches built from the dataframe. The mean and max are exact, the
+        percentiles (other than min and max) and histogram counts are
+        estimates, and the top five ranks are not available.
         """
-
-        def _update_metric_lists(metric_type, metric):
-            """Update graphframe.inc_metrics and graphframe.exc_metrics
-            lists after renaming/creating columns"""
-            metric_type.append(metric + ".mean")
-            metric_type.append(metric + ".max")
-
-        def _calculate_statistics(dataframe, metric_column, func):
-            """Calculate frequency histogram and percentiles. Find the
-            ranks that have the highest metric values."""
-            index_names = list(dataframe.index.names)
-            index_names.remove("node")
-
-            # create dict that stores aggregation function for each column.
-            # fuc = [np.mean, np.max] for the metric_column.
-            agg_dict = {}
-            for col in dataframe.columns.tolist():
-                if col == metric_column:
-                    agg_dict[col] = func
-                else:
-                    agg_dict[col] = lambda x: x.iloc[0]
-
-            # move node from index to column and group by node.
-            dataframe.reset_index(level="node", inplace=True)
-            grouped_df = dataframe.groupby("node")
-
-            # if verbose, calculate statistics for the
-            # frequency histogram, percentiles, and the top
-            # five ranks that has the highest metric value.
-            if verbose:
-                statistics_dict = {}
-                # for each group
-                for node, item in grouped_df:
-                    freqs = []
-                    percentiles = []
-
-                    group = grouped_df.get_group(node)
-                    group.reset_index(inplace=True)
-                    # sort by metric value. get rank and metric value
-                    sorted_rank_metric = group[["rank", metric_column]].sort_values(
-                        by=metric_column, ascending=False
-                    )
-                    # store sorted ranks and metrics
-                    sorted_ranks = sorted_rank_metric["rank"].to_numpy()
-                    sorted_metric = sorted_rank_metric[metric_column].to_numpy()
-                    num_ranks = len(sorted_ranks)
-
-                    # we have fixed number of bins = 10.
-                    # Example: max=100, min=0, size=(100-0)/10=10
-                    bins = 10
-                    max = sorted_metric[0]
-                    min = sorted_metric[-1]
-                    size = (max - min) / bins
-                    if size != 0:
-                        for i in range(bins):
-                            bin_start = min + i * size
-                            bin_end = min + (i + 1) * size
-                            # sometimes bin_end != end because of
-                            # rounding. For example:
-                            # bin_end=52.93999, max = 53.94.
-                            if i == bins - 1:
-                                bin_end = max
-                            if i == 0:
-                                bin_start = min
-
-                            # count the number of ranks in a bin
-                            count = len(
-                                sorted_rank_metric[
-                                    (sorted_rank_metric[metric_column] > bin_start)
-                                    & (sorted_rank_metric[metric_column] <= bin_end)
-                                ]["rank"].unique()
-                            )
-                            freqs.append(count)
-
-                        # the first rank's value can be equal to min so
-                        # we count them as well.
-                        freqs[0] += len(
-                            sorted_rank_metric[
-                                (sorted_rank_metric[metric_column] == min)
-                            ]["rank"].unique()
-                        )
-                    else:
-                        # Example: if min=max=0 and num_ranks=2, freqs=[2, 2]
-                        freqs = [num_ranks] * bins
-
-                    # calculate percentiles.
-                    for i in [0, 25, 50, 75, 100]:
-                        percentiles.append(np.percentile(sorted_metric, i))
-
-                    # find the top five ranks that have the
-                    # highest metric value.
-                    if len(sorted_ranks) > 5:
-                        sorted_ranks = sorted_ranks[:5]
-
-                    # create statistics_dict.
-                    # add metric_column -> imbalance.ranks, time.hist, time.percentiles
-                    statistics_dict[node] = {
-                        "node": node,
-                        "{}.ranks".format(metric_column): sorted_ranks,
-                        "{}.hist".format(metric_column): freqs,
-                        "{}.percentiles".format(metric_column): percentiles,
-                    }
-
-                # create statistics dataframe from the dict.
-                statistics_df = pd.DataFrame.from_dict(statistics_dict.values())
-                statistics_df.set_index("node", inplace=True)
-
-            # aggregate grouped dataframe
-            agg_df = grouped_df.agg(agg_dict)
-
-            # pandas creates multiindex columns when we do .agg() using
-            # multiple functions (np.mean and np.max).
-            # We first flatten the columns to remove multiindex.
-            # Example after to_flat_index():
-            # [('time', 'mean'), ('time', 'max'), ('name', '<lambda>')]
-            # Then remove rename metric_column by adding mean and max.
-            # Remove <lambda> from others.
-            agg_df.columns = agg_df.columns.to_flat_index()
-            columns = agg_df.columns.values
-
-            for idx in range(len(columns)):
-                if columns[idx][0] == metric_column and columns[idx][1] == "mean":
-                    columns[idx] = metric_column + ".mean"
-                elif columns[idx][0] == metric_column and columns[idx][1] == "max":
-                    columns[idx] = metric_column + ".max"
-                else:
-                    columns[idx] = columns[idx][0]
-
-            # if verbose, join aggregate dataframe with
-            # statistics dataframe.
-            if verbose:
-                agg_df = agg_df.join(statistics_df, how="outer")
-
-            return agg_df
-
-        # Create a copy of the GraphFrame.
-        graphframe2 = graphframe.deepcopy()
-
         # Use default_metric if not given.
         if metric_column is None:
             metric_column = graphframe.default_metric
 
+        dataframe = graphframe.dataframe
         assert (
-            metric_column in graphframe2.dataframe.columns
+            metric_column in dataframe.columns
         ), "{} column does not exist in the dataframe.".format(metric_column)
 
-        if threshold is not None:
-            # Get the max value of the given metric.
-            max_val = graphframe2.dataframe.sort_values(by=metric_column).iloc[-1][
-                metric_column
-            ]
-            # Calculate the threshold.
-            thres_val = max_val * threshold
+        if sketch:
+            return self._sketch_load_imbalance(
+                graphframe, metric_column, threshold, verbose
+            )
+
+        # Lay out the metric as a (nodes x processes/threads) matrix, with NaN
+        # where a node has no row. Nodes are numbered in sorted order, like
+        # the groups of dataframe.groupby("node").
+        index = dataframe.index
+        node_codes, nodes, first_rows = _node_rows(graphframe, self._intermediates)
+        other_levels = [name for name in index.names if name != "node"]
+        column_codes = np.zeros(len(index), dtype=np.intp)
+        num_columns = 1
+        for name in other_levels:
+            codes, values = _level_codes(index, name)
+            column_codes = column_codes * len(values) + codes
+            num_columns *= len(values)
+        num_nodes = len(nodes)
+
+        metric = dataframe[metric_column].to_numpy()
+        values = metric.astype(float)
+        matrix = np.full((num_nodes, num_columns), np.nan)
+        matrix[node_codes, column_codes] = values
+        present = np.zeros((num_nodes, num_columns), dtype=bool)
+        present[node_codes, column_codes] = True
+        counts = present.sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.nanmean(matrix, axis=1)
+            maxes = np.nanmax(matrix, axis=1)
+        if np.issubdtype(metric.dtype, np.integer):
+            maxes = maxes.astype(metric.dtype)
+
+        # Other columns take the value of the first row of each node.
+        columns = {}
+        for col in dataframe.columns:
+            if col == metric_column:
+                columns[metric_column + ".mean"] = means
+                columns[metric_column + ".max"] = maxes
+            else:
+                columns[col] = dataframe[col].to_numpy()[first_rows]
+        result = pd.DataFrame(columns, index=pd.Index(nodes, name="node"))
+
+        # If verbose, calculate statistics for the frequency histogram,
+        # percentiles, and the top five ranks that have the highest metric
+        # value.
+        if verbose:
+            ranks = index.get_level_values("rank").to_numpy()
+            column_ranks = np.zeros(num_columns, dtype=ranks.dtype)
+            column_ranks[column_codes] = ranks
+            # nodes with a NaN metric value have NaN statistics
+            has_nan = (present & np.isnan(matrix)).any(axis=1)
+
+            # percentiles of the sorted values of each row; rows with the
+            # same number of values are computed together
+            sorted_matrix = np.sort(matrix, axis=1)
+            percentiles = np.full((num_nodes, 5), np.nan)
+            for count in np.unique(counts):
+                rows = np.flatnonzero((counts == count) & ~has_nan)
+                if len(rows):
+                    percentiles[rows] = np.percentile(
+                        sorted_matrix[rows, :count], [0, 25, 50, 75, 100], axis=1
+                    ).T
+
+            # find the top five ranks that have the highest metric value,
+            # in descending order (NaN last). Ties are broken by position,
+            # as in a stable sort.
+            keys = np.where(present, -matrix, np.nan)
+            keys[present & np.isnan(matrix)] = np.inf
+            if num_columns > 5:
+                fifth = np.partition(keys, 4, axis=1)[:, 4:5]
+                ties = keys == fifth
+                needed = 5 - (keys < fifth).sum(axis=1, keepdims=True)
+                top = (keys < fifth) | (ties & (np.cumsum(ties, axis=1) <= needed))
+                top[np.isnan(fifth[:, 0])] = present[np.isnan(fifth[:, 0])]
+            else:
+                top = present
+            top_rows, top_columns = np.nonzero(top)
+            order = np.lexsort((top_columns, keys[top_rows, top_columns], top_rows))
+            top_ranks = np.split(
+                column_ranks[top_columns[order]], np.cumsum(top.sum(axis=1))[:-1]
+            )
 
-        # Similar to drop_index_levels() but it calculates
-        # statistics if verbose == True.
-        graphframe2.dataframe = _calculate_statistics(
-            graphframe2.dataframe, metric_column, ["mean", "max"]
+            # frequency histogram with a fixed number of bins = 10, where bin i
+            # counts the ranks with a value in (min + i * size, min + (i + 1) *
+            # size], size = (max - min) / 10. The first bin also counts the
+            # ranks whose value is equal to min.
+            bins = 10
+            lo = np.where(has_nan, np.nan, sorted_matrix[:, 0])
+            hi = maxes.astype(float)
+            size = (hi - lo) / bins
+            row_lo = lo[node_codes]
+            row_hi = hi[node_codes]
+            row_size = size[node_codes]
+
+            def bin_start(b):
+                return np.where(b == 0, row_lo, row_lo + b * row_size)
+
+            def bin_end(b):
+                # sometimes bin_end != max because of rounding. For
+                # example: bin_end=52.93999, max = 53.94.
+                return np.where(b == bins - 1, row_hi, row_lo + (b + 1) * row_size)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                estimate = np.ceil((values - row_lo) / row_size) - 1
+                b = np.clip(np.nan_to_num(estimate), 0, bins - 1).astype(np.intp)
+                # correct for rounding in the estimate
+                b = np.where((b > 0) & (values <= bin_start(b)), b - 1, b)
+                b = np.where((b < bins - 1) & (values > bin_end(b)), b + 1, b)
+                in_bin = (values > bin_start(b)) & (values <= bin_end(b))
+                at_min = values == row_lo
+
+            def count_ranks(mask, keys):
+                # count unique ranks; ranks can only repeat within a node if
+                # there are other index levels, e.g., threads
+                if len(other_levels) > 1:
+                    rank_codes = pd.factorize(ranks)[0]
+                    keys = np.unique(
+                        keys[mask] * (rank_codes.max() + 1) + rank_codes[mask]
+                    ) // (rank_codes.max() + 1)
+                else:
+                    keys = keys[mask]
+                return np.bincount(keys, minlength=num_nodes * bins)
+
+            freqs = count_ranks(in_bin, node_codes * bins + b)
+            freqs = freqs.reshape(num_nodes, bins)
+            freqs[:, 0] += count_ranks(at_min, node_codes * bins)[::bins]
+            # Example: if min=max=0 and num_ranks=2, freqs=[2, 2]
+            freqs[size == 0] = counts[size == 0, np.newaxis]
+
+            # add metric_column -> time.ranks, time.hist, time.percentiles
+            result["{}.ranks".format(metric_column)] = pd.Series(
+                top_ranks, index=result.index, dtype=object
+            )
+            result["{}.hist".format(metric_column)] = pd.Series(
+                freqs.tolist(), index=result.index, dtype=object
+            )
+            result["{}.percentiles".format(metric_column)] = pd.Series(
+                [list(row) for row in percentiles], index=result.index, dtype=object
+            )
+
+        return self._imbalance_graphframe(
+            graphframe, result, metric_column, maxes, values.max(), threshold, verbose
         )
 
-        graphframe2.inc_metrics = []
-        graphframe2.exc_metrics = []
+    def _sketch_load_imbalance(self, graphframe, metric_column, threshold, verbose):
+        """load_imbalance with statistics from per-node quantile sketches."""
+        dataframe = graphframe.dataframe
+        metric_sketch = graphframe.quantile_sketch(metric_column)
+        _, nodes, first_rows = _node_rows(graphframe, self._intermediates)
+        rows = metric_sketch.keys.get_indexer(nodes)
+        # nodes without a sketch have NaN statistics
+        missing = rows < 0
+        rows[missing] = 0
+
+        def node_values(values):
+            values = np.asarray(values, dtype=float)[rows]
+            values[missing] = np.nan
+            return values
+
+        means = node_values(metric_sketch.mean)
+        maxes = node_values(metric_sketch.max)
+
+        # Other columns take the value of the first row of each node.
+        columns = {}
+        for col in dataframe.columns:
+            if col == metric_column:
+                columns[metric_column + ".mean"] = means
+                columns[metric_column + ".max"] = maxes
+            else:
+                columns[col] = dataframe[col].to_numpy()[first_rows]
+        result = pd.DataFrame(columns, index=pd.Index(nodes, name="node"))
 
-        # Add new columns to .inc_metrics or .exc_metrics.
-        if metric_column in graphframe2.inc_metrics:
-            _update_metric_lists(graphframe2.inc_metrics, metric_column)
-        elif metric_column in graphframe2.exc_metrics:
-            _update_metric_lists(graphframe2.exc_metrics, metric_column)
+        if verbose:
+            percentiles = metric_sketch.quantile([0, 0.25, 0.5, 0.75, 1])
+            freqs = metric_sketch.histogram(10)
+            percentiles = np.column_stack(
+                [node_values(percentiles[q]) for q in percentiles.columns]
+            )
+            freqs = np.column_stack([node_values(freqs[b]) for b in freqs.columns])
+            result["{}.hist".format(metric_column)] = pd.Series(
+                freqs.tolist(), index=result.index, dtype=object
+            )
+            result["{}.percentiles".format(metric_column)] = pd.Series(
+                [list(row) for row in percentiles], index=result.index, dtype=object
+            )
+
+        return self._imbalance_graphframe(
+            graphframe, result, metric_column, maxes, maxes.max(), threshold, verbose
+        )
+
+    @staticmethod
+    def _imbalance_graphframe(
+        graphframe, result, metric_column, maxes, max_value, threshold, verbose
+    ):
+        """Build the graphframe of load_imbalance from its per-node result."""
+        from .graphframe import GraphFrame, EmptyFilter
 
-        # filter out the nodes if their max metric value across
-        # processes/threads is less than threshold% of the max value
-        # of the given metric.
+        # <metric_column>.mean and .max are statistics across
+        # processes/threads, not exclusive or inclusive metrics.
+        attributes = dict([[x, getattr(graphframe, x)] for x in graphframe.attributes])
         if threshold is not None:
-            graphframe2 = graphframe2.filter(
-                lambda x: x[metric_column + ".max"] > thres_val
+            # filter out the nodes if their max metric value across
+            # processes/threads is less than threshold% of the max value
+            # of the given metric.
+            thres_val = max_value * threshold
+            result = result[maxes > thres_val]
+            if result.shape[0] == 0:
+                raise EmptyFilter(
+                    "The provided filter would have produced an empty GraphFrame."
+                )
+            graphframe2 = GraphFrame(
+                graphframe.graph,
+                result,
+                [],
+                [],
+                graphframe.default_metric,
+                dict(graphframe.metadata),
+                attributes=attributes,
+            ).squash()
+        else:
+            node_clone = {}
+            graph = graphframe.graph.copy(node_clone)
+            result.index = pd.Index(
+                [node_clone[node] for node in result.index], name="node"
+            )
+            graphframe2 = GraphFrame(
+                graph,
+                result,
+                [],
+                [],
+                graphframe.default_metric,
+                dict(graphframe.metadata),
+                attributes=attributes,
             )
 
         # Calculate load imbalance for the given metric
@@ -263,7 +699,13 @@ class Chopper:
         return graphframe2
 
     def hot_path(
-        self, graphframe, start_node=None, metric=None, threshold=0.5, callpath=[]
+        self,
+        graphframe,
+        start_node=None,
+        metric=None,
+        threshold=0.5,
+        callpath=None,
+        top_k=None,
     ):
         """Returns the hot_path function.
         Inputs:
@@ -273,64 +715,111 @@ class Chopper:
          Default: graphframe.default_metric
          - threshold: Threshold for parent-child comparison (parent <= child/2).
          Default: 0.5
+         - callpath (deprecated): Not used, the hot path is returned.
+         - top_k (optional): Return the top_k hottest paths instead of one.
         Output:
          - hot_path: list of nodes, starting from the start node to the hot node.
+         If top_k is given, a list of up to top_k such paths, hottest first.
+
+        The metric is averaged across processes/threads. The graphframe is
+        not copied.
 
         Example:
         root_node = graphframe.graph.roots[0]
         graphframe.hot_path(root_node)
         """
-
-        def find_hot_path(graphframe, parent, metric, threshold, callpath):
-            parent_metric = graphframe.dataframe.loc[parent, metric]
-            sorted_child_metric = []
-            # Get all children nodes with their metric values and append
-            # them to a list.
-            for child in parent.children:
-                child_metric = graphframe.dataframe.loc[child, metric]
-                sorted_child_metric.append((child, child_metric))
-
-            if sorted_child_metric:
-                # in-place sort children by their metric values.
-                sorted_child_metric.sort(key=lambda x: x[1], reverse=True)
-                child = sorted_child_metric[0][0]
-                child_metric = sorted_child_metric[0][1]
-                if child_metric < (threshold * parent_metric):
-                    # return hotpath since child's metric value is
-                    # not greater than threshold * parent's metric.
-                    callpath.append(child)
-                    return callpath
-                else:
-                    # continue from child if its metric is greater than
-                    # threshold * parent's metric.
-                    # For example, child_metric >= parent_metric/2
-                    callpath.append(child)
-                    return find_hot_path(graphframe, child, metric, threshold, callpath)
-
-            return callpath
-
-        # copy the graphframe not to modify the original graph
-        gf_copy = graphframe.deepcopy()
-        gf_copy.drop_index_levels()
+        if callpath is not None:
+            warnings.warn(
+                'hot_path() parameter "callpath=" is deprecated and not used, '
+                "the hot path is returned.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
 
         # choose the default metric if metric has not set
         if metric is None:
             metric = graphframe.default_metric
 
+        function = "mean" if graphframe.dataframe.index.nlevels > 1 else None
+        values = graphframe._node_values(metric, function=function)
+        # only the subtree of the start node is ordered
+        roots, children = graphframe.child_order(
+            metric, function=function, node=start_node
+        )
+
+        def value(node):
+            nid = node._hatchet_nid
+            return values[nid] if 0 <= nid < len(values) else np.nan
+
+        if top_k is not None:
+            return self._hot_paths(
+                roots if start_node is None else [start_node],
+                children,
+                value,
+                threshold,
+                top_k,
+            )
+
         # choose the root node that has the greatest metric value
         # if a start node is not specified
         if start_node is None:
-            roots_metrics = []
-            for root in gf_copy.graph.roots:
-                roots_metrics.append((root, gf_copy.dataframe.loc[root, metric]))
+            start_node = max(
+                graphframe.graph.roots,
+                key=lambda root: -np.inf if np.isnan(value(root)) else value(root),
+            )
 
-            # in-place sort
-            roots_metrics.sort(key=lambda x: x[1], reverse=True)
-            start_node = roots_metrics[0][0]
+        # follow the child with the largest metric value while its metric
+        # is at least threshold * parent's metric, e.g., child >= parent/2
+        callpath = [start_node]
+        node = start_node
+        while children.get(node):
+            child = children[node][0]
+            callpath.append(child)
+            if value(child) < threshold * value(node):
+                break
+            node = child
+        return callpath
 
-        return find_hot_path(
-            gf_copy, start_node, metric, threshold, callpath=[start_node]
-        )
+    @staticmethod
+    def _hot_paths(starts, children, value, threshold, top_k):
+        """Best-first search for the top_k hottest paths.
+
+        A path ends at a node none of whose children have at least threshold
+        times its metric value and, as in the single hot path, is followed by
+        the hottest of those children. Paths are expanded in order of
+        decreasing metric value, so the search stops after top_k paths if
+        the metric is inclusive (children have at most their parent's
+        value), and only the nodes on or next to the hottest paths are
+        visited.
+        """
+        # heap entries are (-value, tiebreak, position in visited), where
+        # visited holds (node, parent position) to rebuild the paths
+        visited = []
+        heap = []
+        for node in starts:
+            if not np.isnan(value(node)):
+                heapq.heappush(heap, (-value(node), len(visited), len(visited)))
+                visited.append((node, -1))
+
+        paths = []
+        while heap and len(paths) < top_k:
+            _, _, position = heapq.heappop(heap)
+            node = visited[position][0]
+            hot_children = [
+                child
+                for child in children.get(node, [])
+                if value(child) >= threshold * value(node)
+            ]
+            for child in hot_children:
+                heapq.heappush(heap, (-value(child), len(visited), len(visited)))
+                visited.append((child, position))
+            if not hot_children:
+                path = children.get(node, [])[:1]
+                while position >= 0:
+                    path.append(visited[position][0])
+                    position = visited[position][1]
+                paths.append(path[::-1])
+        return paths
 
     @staticmethod
     def multirun_analysis(
@@ -343,7 +832,8 @@ class Chopper:
     ):
         """Creates a pivot table.
         Inputs:
-         - graphframes: A list of graphframes.
+         - graphframes: A list of graphframes, or any iterable of them (e.g., a
+         generator that reads them one at a time).
          - pivot_index: The metric in each graphframe's metadata used to index the pivot table.
          Default: num_processes
          - columns: The non-numerical metric over which the pivot table's column values are aggregated.
@@ -355,14 +845,18 @@ class Chopper:
          - a pivot table
         """
 
-        assert (
-            graphframes is not None and len(graphframes) >= 2
-        ), "function param 'graphframes' requires at least two graphframe objects"
-
         if not isinstance(columns, list):
             columns = [columns]
 
-        for gf in graphframes:
+        # values of all runs, scattered into a (pivot values x column keys)
+        # matrix at the end; each run is read once, so graphframes can be
+        # an iterator that reads them one at a time
+        pivot_ids = {}
+        key_ids = {}
+        scattered = []
+        num_graphframes = 0
+        for gf in graphframes or []:
+            num_graphframes += 1
             assert (
                 pivot_index in gf.metadata.keys()
             ), "{} missing from GraphFrame metadata: use update_metadata() to specify.".format(
@@ -376,36 +870,70 @@ class Chopper:
                     column in gf.dataframe.columns
                 ), "{} column not present in all graphframes".format(column)
 
-        dataframes = []
-        for gf in graphframes:
-            gf_copy = gf.deepcopy()
-            gf_copy.drop_index_levels()
-
+            needed = list(dict.fromkeys(columns + [metric]))
+            if groupby_function is not None:
+                needed = list(dict.fromkeys(needed + ["name"]))
+            _, values = _node_metrics(gf, needed)
             # group by name if the user gives a function such as np.mean
             if groupby_function is not None:
-                gf_copy.dataframe = gf_copy.dataframe.groupby(
-                    "name", as_index=False
-                ).agg(groupby_function)
-
-            # Grab the pivot_index from the metadata, store this as a new
-            # column in the DataFrame.
-            pivot_val = gf.metadata[pivot_index]
-            gf_copy.dataframe[pivot_index] = pivot_val
-
-            # Filter the dataframe, keeping only the rows that are above the threshold
-            if threshold is not None:
-                filtered_rows = gf_copy.dataframe.apply(
-                    lambda x: x[metric] > threshold, axis=1
+                grouped = (
+                    pd.DataFrame(values)
+                    .groupby("name", as_index=False)
+                    .agg(groupby_function)
                 )
-                gf_copy.dataframe = gf_copy.dataframe[filtered_rows]
+                values = {column: grouped[column].to_numpy() for column in needed}
 
-            # Insert the graphframe's dataframe into a list.
-            dataframes.append(gf_copy.dataframe)
+            metric_values = values[metric].astype(float)
+            # keep the rows that are above the threshold
+            keep = ~np.isnan(metric_values)
+            if threshold is not None:
+                keep &= metric_values > threshold
+            # rows with a missing key are dropped, as in DataFrame.pivot_table
+            key_values = [values[column][keep] for column in columns]
+            valid = np.all([~pd.isna(v) for v in key_values], axis=0)
+            keys = (
+                key_values[0][valid]
+                if len(columns) == 1
+                else list(zip(*(v[valid] for v in key_values)))
+            )
+            key_codes = np.array(
+                [key_ids.setdefault(key, len(key_ids)) for key in keys], dtype=np.intp
+            )
+            pivot_id = pivot_ids.setdefault(gf.metadata[pivot_index], len(pivot_ids))
+            scattered.append((pivot_id, key_codes, metric_values[keep][valid]))
 
-        # Concatenate all DataFrames into a single DataFrame called result.
-        result = pd.concat(dataframes)
+        assert (
+            num_graphframes >= 2
+        ), "function param 'graphframes' requires at least two graphframe objects"
 
-        pivot_df = result.pivot_table(index=pivot_index, columns=columns, values=metric)
+        # the mean value of each (pivot value, column key) pair
+        num_keys = len(key_ids)
+        flat = np.concatenate(
+            [pivot_id * num_keys + codes for pivot_id, codes, _ in scattered]
+        )
+        size = len(pivot_ids) * num_keys
+        total = np.bincount(
+            flat, np.concatenate([values for _, _, values in scattered]), size
+        )
+        count = np.bincount(flat, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            matrix = (total / count).reshape(len(pivot_ids), num_keys)
+
+        pivot_values = list(pivot_ids)
+        keys = list(key_ids)
+        used = np.flatnonzero(count.reshape(len(pivot_ids), num_keys).any(axis=0))
+        if len(columns) == 1:
+            key_index = pd.Index([keys[i] for i in used], name=columns[0])
+        else:
+            key_index = pd.MultiIndex.from_tuples(
+                [keys[i] for i in used], names=columns
+            )
+        pivot_df = pd.DataFrame(
+            matrix[:, used],
+            index=pd.Index(pivot_values, name=pivot_index),
+            columns=key_index,
+        )
+        pivot_df = pivot_df.sort_index(axis=0).sort_index(axis=1)
 
         return pivot_df
 
@@ -423,7 +951,9 @@ class Chopper:
         """
         Calculates the speedup and efficiency values.
         Inputs:
-         - graphframes: A list of graphframes.
+         - graphframes: A list of graphframes, or any iterable of them (e.g., a
+         generator that reads them one at a time). The run with the smallest
+         pivot_index value is the base.
          - weak: True for weak scaling experiments.
          - strong: True for strong scaling experiments.
          - efficiency: True if the user wants to calculate efficiency.
@@ -434,10 +964,12 @@ class Chopper:
          Default: time
          - threshold: The threshold for filtering metric rows of the graphframes.
         Output:
-         - a new dataframe that stores speedup and efficiency values.
-        """
-        from .graphframe import GraphFrame
+         - a new dataframe that stores speedup and efficiency values, indexed
+         by the nodes of the base graphframe (one per call path).
 
+        The nodes of the runs are matched by call path; the graphframes are
+        not modified.
+        """
         assert (
             strong is True or weak is True
         ), "at least one of the 'strong' and 'weak' parameters should be True."
@@ -448,50 +980,85 @@ class Chopper:
             weak is False or speedup is False
         ), "speed up can be calculated only for strong scaling."
 
-        process_to_gf = []
+        # match the nodes of the runs by call path instead of unifying their
+        # graphs: each run is reduced to the metric values of its call paths,
+        # so graphframes can be an iterator that reads them one at a time
+        callpaths = {}
+        runs = []
+        base = None
         for gf in graphframes:
             assert (
-                "num_processes" in gf.metadata.keys()
+                pivot_index in gf.metadata.keys()
             ), "pivot_index missing from GraphFrame metadata: use update_metadata() to specify."
-            process_to_gf.append((gf.metadata[pivot_index], gf))
-
-        GraphFrame.unify_multiple_graphframes(graphframes)
-
-        sorted(process_to_gf, key=lambda x: x[0])
-        base_numpes = process_to_gf[0][0]
-        base_graphframe = process_to_gf[0][1]
+            # each node's metrics are averaged across ranks/threads, as in
+            # multirun_analysis
+            nodes, values = _node_metrics(gf, metrics)
+            keys = _callpath_keys(gf.graph, callpaths)
+            node_keys = [keys.get(node, []) for node in nodes]
+            position = np.repeat(np.arange(len(nodes)), [len(k) for k in node_keys])
+            codes = np.fromiter(
+                (key for k in node_keys for key in k), np.intp, len(position)
+            )
+            run_values = {}
+            for metric in metrics:
+                # sum the nodes that have the same call path
+                metric_values = values[metric].astype(float)[position]
+                run_values[metric] = pd.Series(metric_values).groupby(codes).sum()
+            num_procs = gf.metadata[pivot_index]
+            runs.append((num_procs, run_values))
+
+            # the run with the smallest pivot_index is the base, whose other
+            # columns are kept
+            if base is None or num_procs < base[0]:
+                metric_columns = set(gf.inc_metrics + gf.exc_metrics)
+                columns = [
+                    column
+                    for column in gf.dataframe.columns
+                    if column not in metric_columns
+                ]
+                _, values = _node_metrics(gf, columns)
+                codes, first = np.unique(codes, return_index=True)
+                base = (
+                    num_procs,
+                    pd.DataFrame(
+                        {column: values[column][position[first]] for column in columns},
+                        index=pd.Index(nodes[position[first]], name="node"),
+                    ),
+                    codes,
+                )
 
-        result_df = pd.DataFrame()
-        # add base values to the resulting dataframe.
-        for column in base_graphframe.dataframe.columns:
-            if column not in base_graphframe.inc_metrics + base_graphframe.exc_metrics:
-                result_df[column] = base_graphframe.dataframe[column]
+        runs.sort(key=lambda run: run[0])
+        base_numpes, result_df, base_codes = base
+        base_values = dict(runs[0][1])
 
         # calculate speedup and efficiency.
-        for other in process_to_gf[1:]:
+        for other_numpes, other_values in runs[1:]:
             for metric in metrics:
-                if weak:
-                    new_column_name = "{}.{}.{}".format(other[0], metric, "efficiency")
-                    # weak scaling efficiency: base / other
-                    result_df[new_column_name] = (
-                        base_graphframe.dataframe[metric] / other[1].dataframe[metric]
-                    )
-                else:
-                    if speedup:
-                        new_column_name = "{}.{}.{}".format(other[0], metric, "speedup")
-                        # strong scaling speedup: base / other
-                        result_df[new_column_name] = (
-                            base_graphframe.dataframe[metric]
-                            / other[1].dataframe[metric]
-                        )
-                    if efficiency:
+                base_metric = base_values[metric].reindex(base_codes).to_numpy()
+                other_metric = other_values[metric].reindex(base_codes).to_numpy()
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    if weak:
                         new_column_name = "{}.{}.{}".format(
-                            other[0], metric, "efficiency"
+                            other_numpes, metric, "efficiency"
                         )
-                        # strong scaling efficiency: base * num_procs_base / other
-                        result_df[new_column_name] = (
-                            base_graphframe.dataframe[metric] * base_numpes
-                        ) / (other[1].dataframe[metric] * other[0])
+                        # weak scaling efficiency: base / other
+                        result_df[new_column_name] = base_metric / other_metric
+                    else:
+                        if speedup:
+                            new_column_name = "{}.{}.{}".format(
+                                other_numpes, metric, "speedup"
+                            )
+                            # strong scaling speedup: base / other
+                            result_df[new_column_name] = base_metric / other_metric
+                        if efficiency:
+                            new_column_name = "{}.{}.{}".format(
+                                other_numpes, metric, "efficiency"
+                            )
+                            # strong scaling efficiency:
+                            # base * num_procs_base / other
+                            result_df[new_column_name] = (base_metric * base_numpes) / (
+                                other_metric * other_numpes
+                            )
         return result_df
 
     def correlation_analysis(self, graphframe, metrics=None, method="spearman"):
@@ -513,3 +1080,186 @@ class Chopper:
         dataframe = graphframe.dataframe[metrics]
         corr_matrix = dataframe.corr(method=method)
         return corr_matrix
+
+    def rank_outliers(
+        self,
+        graphframe,
+        metrics=None,
+        method="mad",
+        threshold=None,
+        num_clusters=None,
+        chunk_size=2**24,
+        iterations=100,
+        seed=0,
+    ):
+        """Scores how much each process (rank) deviates from the others, and
+        optionally clusters the ranks.
+        Inputs:
+         - metrics: Metric or list of metrics to compare.
+         Default: graphframe.default_metric
+         - method: "mad" for the modified z-score, based on the median and the
+         median absolute deviation of each feature, or "zscore" for the
+         z-score, based on the mean and the standard deviation.
+         Default: "mad"
+         - threshold: Score above which a feature of a rank is an outlier.
+         Default: 3.5 for "mad", 3 for "zscore"
+         - num_clusters (optional): Number of clusters of ranks, found with
+         mini-batch k-means on the scaled features.
+         - chunk_size: Number of values of the (ranks x features) matrix
+         processed at a time.
+         - iterations: Number of mini-batches of k-means.
+         - seed: Seed of the random mini-batches.
+        Output:
+         - dataframe indexed by rank, with the largest score of each rank
+         ("score"), the node and metric where it occurs ("node", "metric"),
+         the number of outlier features ("num_outliers"), whether the rank is
+         an outlier ("outlier"), and its cluster ("cluster") if num_clusters
+         is given.
+
+        The features of a rank are the values of the metrics at every node,
+        summed over its threads (0 for nodes it did not execute). The
+        (ranks x features) matrix is never built as a whole: the scores are
+        computed for a block of nodes at a time, and k-means reads a block of
+        ranks at a time.
+        """
+        if metrics is None:
+            metrics = graphframe.default_metric
+        if not isinstance(metrics, list):
+            metrics = [metrics]
+        for metric in metrics:
+            assert (
+                metric in graphframe.dataframe.columns
+            ), "{} column not present in graphframe".format(metric)
+        assert (
+            "rank" in graphframe.dataframe.index.names
+        ), "rank_outliers requires a dataframe indexed by rank."
+        assert method in ("mad", "zscore"), "method must be 'mad' or 'zscore'."
+        if threshold is None:
+            threshold = 3.5 if method == "mad" else 3.0
+
+        features = _RankFeatures(graphframe, metrics)
+        num_ranks, num_nodes = features.num_ranks, features.num_nodes
+        center = np.zeros(features.num_features)
+        scale = np.zeros(features.num_features)
+        score = np.zeros(num_ranks)
+        worst = np.zeros(num_ranks, dtype=np.intp)
+        num_outliers = np.zeros(num_ranks, dtype=np.int64)
+
+        nodes_per_block = max(1, chunk_size // max(num_ranks * len(metrics), 1))
+        for start in range(0, num_nodes, nodes_per_block):
+            stop = min(start + nodes_per_block, num_nodes)
+            block = features.node_block(start, stop)
+            positions = (
+                np.arange(len(metrics))[:, np.newaxis] * num_nodes
+                + np.arange(start, stop)
+            ).ravel()
+            if method == "mad":
+                block_center = np.median(block, axis=0)
+                deviation = np.abs(block - block_center)
+                # the modified z-score of Iglewicz and Hoaglin, falling back
+                # on the mean absolute deviation where most values are equal
+                block_scale = np.median(deviation, axis=0) / 0.6745
+                mean_deviation = deviation.mean(axis=0) * 1.2533
+                block_scale = np.where(block_scale > 0, block_scale, mean_deviation)
+            else:
+                block_center = block.mean(axis=0)
+                deviation = np.abs(block - block_center)
+                block_scale = block.std(axis=0)
+            center[positions] = block_center
+            scale[positions] = block_scale
+            with np.errstate(invalid="ignore", divide="ignore"):
+                scores = np.where(block_scale > 0, deviation / block_scale, 0.0)
+
+            # keep the largest score of each rank
+            block_worst = scores.argmax(axis=1)
+            block_score = scores[np.arange(num_ranks), block_worst]
+            better = block_score > score
+            score[better] = block_score[better]
+            worst[better] = positions[block_worst[better]]
+            num_outliers += (scores > threshold).sum(axis=1)
+
+        result = pd.DataFrame(
+            {
+                "score": score,
+                "node": features.nodes[worst % num_nodes] if num_nodes else [],
+                "metric": np.array(metrics, dtype=object)[worst // max(num_nodes, 1)],
+                "num_outliers": num_outliers,
+                "outlier": score > threshold,
+            },
+            index=pd.Index(features.ranks, name="rank"),
+        )
+
+        if num_clusters is not None:
+            scale = np.where(scale > 0, scale, 1.0)
+            # mini-batches of at most 1024 ranks
+            ranks_per_batch = min(
+                1024, max(1, chunk_size // max(features.num_features, 1))
+            )
+            result["cluster"] = self._rank_clusters(
+                features, center, scale, num_clusters, ranks_per_batch, iterations, seed
+            )
+
+        return result
+
+    @staticmethod
+    def _rank_clusters(
+        features, center, scale, num_clusters, batch_size, iterations, seed
+    ):
+        """Mini-batch k-means (Sculley, 2010) of the scaled features of the
+        ranks. Returns the cluster of each rank."""
+        rng = np.random.default_rng(seed)
+        num_ranks = features.num_ranks
+        batch_size = min(batch_size, num_ranks)
+
+        def batch(ranks):
+            return (features.rank_block(ranks) - center) / scale
+
+        def nearest(points, centers):
+            distances = (
+                (points**2).sum(axis=1)[:, np.newaxis]
+                - 2 * points @ centers.T
+                + (centers**2).sum(axis=1)[np.newaxis, :]
+            )
+            return distances.argmin(axis=1)
+
+        # k-means++ initialization on a sample of the ranks
+        sample = batch(np.sort(rng.choice(num_ranks, batch_size, replace=False)))
+        num_clusters = min(num_clusters, len(sample))
+        centers = [sample[rng.integers(len(sample))]]
+        distances = ((sample - centers[0]) ** 2).sum(axis=1)
+        for _ in range(1, num_clusters):
+            total = distances.sum()
+            if total > 0:
+                chosen = rng.choice(len(sample), p=distances / total)
+            else:
+                chosen = rng.integers(len(sample))
+            centers.append(sample[chosen])
+            distances = np.minimum(
+                distances, ((sample - sample[chosen]) ** 2).sum(axis=1)
+            )
+        centers = np.array(centers)
+
+        # each center moves towards the mean of its points in every batch,
+        # with a learning rate that decreases with its number of points
+        counts = np.zeros(num_clusters)
+        for _ in range(iterations):
+            points = batch(np.sort(rng.choice(num_ranks, batch_size, replace=False)))
+            labels = nearest(points, centers)
+            batch_counts = np.bincount(labels, minlength=num_clusters)
+            membership = np.zeros((num_clusters, len(points)))
+            membership[labels, np.arange(len(points))] = 1.0
+            sums = membership @ points
+            counts += batch_counts
+            updated = batch_counts > 0
+            centers[updated] += (
+                sums[updated] - batch_counts[updated, np.newaxis] * centers[updated]
+            ) / counts[updated, np.newaxis]
+
+        return np.concatenate(
+            [
+                nearest(
+                    batch(np.arange(start, min(start + batch_size, num_ranks))), centers
+                )
+                for start in range(0, num_ranks, batch_size)
+            ]
+        )
@@ -35,20 +35,32 @@ import pandas as pd
 import numpy as np
 import warnings
 from ..util.colormaps import ColorMaps
+from ..util.node_columns import node_columns, node_row
 
 
 class ConsoleRenderer:
     def __init__(self, unicode=False, color=False):
         self.unicode = unicode
         self.color = color
-        self.visited = []
+        self.visited = set()
 
     def render(self, roots, dataframe, **kwargs):
-        result = self.render_preamble()
+        result = "".join(self.render_chunks(roots, dataframe, **kwargs))
+        if self.unicode:
+            return result
+        else:
+            return result.encode("utf-8")
 
+    def render_chunks(self, roots, dataframe, **kwargs):
+        """Render the tree incrementally, one line at a time.
+
+        Takes the same arguments as render, but yields the output in chunks
+        instead of building it in memory, so it can be written to a file as
+        it is produced.
+        """
         if roots is None:
-            result += "The graph is empty.\n\n"
-            return result
+            yield self.render_preamble() + "The graph is empty.\n\n"
+            return
 
         self.metric_columns = kwargs["metric_column"]
         self.precision = kwargs["precision"]
@@ -61,6 +73,13 @@ class ConsoleRenderer:
         self.highlight = kwargs["highlight_name"]
         self.colormap = kwargs["colormap"]
         self.invert_colormap = kwargs["invert_colormap"]
+        # optional pruning of the rendered tree
+        self.threshold = kwargs.get("threshold")
+        self.threshold_relative = kwargs.get("threshold_relative", False)
+        self.max_children = kwargs.get("max_children")
+        self.lines_left = kwargs.get("max_lines")
+        # (roots, children) ordered by a metric, see GraphFrame.child_order
+        self.child_order = kwargs.get("child_order")
 
         if self.color:
             self.colors = self.colors_enabled
@@ -122,17 +141,41 @@ class ConsoleRenderer:
         else:
             self.lr_arrows = {"◀": "< ", "▶": "> "}
 
-        # TODO: probably better to sort by time
-        for root in sorted(roots, key=lambda n: n.frame):
-            result += self.render_frame(root, dataframe)
+        self.prune_column = kwargs.get("prune_column") or self.primary_metric
+        if self.prune_column not in dataframe.columns:
+            raise KeyError(
+                "prune_column={} does not exist in the dataframe, please select a valid column.".format(
+                    self.prune_column
+                )
+            )
 
-        if self.color is True:
-            result += self.render_legend()
+        # extract the columns shown for the selected rank and thread once,
+        # instead of looking up every node in the dataframe
+        self.rows, self.columns = node_columns(
+            dataframe,
+            [self.primary_metric, self.second_metric, self.name, self.context]
+            + ["_missing_node", self.prune_column],
+            self.rank,
+            self.thread,
+        )
 
-        if self.unicode:
-            return result
+        yield self.render_preamble()
+        if self.child_order is not None:
+            sorted_roots = self.child_order[0]
         else:
-            return result.encode("utf-8")
+            sorted_roots = sorted(roots, key=lambda n: n.frame)
+        for i, root in enumerate(sorted_roots):
+            if self.lines_left == 0:
+                yield self._render_elided(
+                    "",
+                    len(sorted_roots) - i,
+                    self._prune_values(sorted_roots[i:]),
+                )
+                break
+            yield from self._render_lines(root)
+
+        if self.color is True:
+            yield self.render_legend()
 
     # pylint: disable=W1401
     def render_preamble(self):
@@ -192,98 +235,192 @@ class ConsoleRenderer:
         return legend
 
     def render_frame(self, node, dataframe, indent="", child_indent=""):
-        node_depth = node._depth
-        if node_depth <= self.depth:
-            # set dataframe index based on whether rank and thread are part of
-            # the MultiIndex
-            if "rank" in dataframe.index.names and "thread" in dataframe.index.names:
-                df_index = (node, self.rank, self.thread)
-            elif "rank" in dataframe.index.names:
-                df_index = (node, self.rank)
-            elif "thread" in dataframe.index.names:
-                df_index = (node, self.thread)
-            else:
-                df_index = node
+        """Render the subgraph rooted at node (call render first)."""
+        return "".join(self._render_lines(node, indent, child_indent))
 
-            node_metric = dataframe.loc[df_index, self.primary_metric]
-
-            metric_precision = "{:." + str(self.precision) + "f}"
-            metric_str = (
-                self._ansi_color_for_metric(node_metric)
-                + metric_precision.format(node_metric)
-                + self.colors.end
-            )
-
-            if self.second_metric is not None:
-                metric_str += " {c.faint}{second_metric:.{precision}f}{c.end}".format(
-                    second_metric=dataframe.loc[df_index, self.second_metric],
-                    precision=self.precision,
-                    c=self.colors,
-                )
+    def _render_lines(self, root, indent="", child_indent=""):
+        """Yield the lines of the subgraph rooted at root."""
+        if self.unicode:
+            indents = {"├": "├─ ", "│": "│  ", "└": "└─ ", " ": "   "}
+        else:
+            indents = {"├": "|- ", "│": "|  ", "└": "`- ", " ": "   "}
+
+        threshold = self.threshold
+        if threshold is not None and self.threshold_relative:
+            threshold = threshold * self._prune_values([root])[0]
+
+        # Depth-first traversal with an explicit stack, in the same order as
+        # the recursive traversal. Entries are (node, indent, child_indent,
+        # base), where base is the child indent of the node's parent. Elided
+        # siblings are pushed as (None, indent, (count, total), base).
+        stack = [(root, indent, child_indent, indent)]
+        while stack:
+            entry = stack.pop()
+            node, indent, child_indent, base = entry
+            if node is None:
+                yield self._render_elided(indent, *child_indent)
+                continue
+            if node._depth > self.depth:
+                continue
+            if self.lines_left is not None:
+                if self.lines_left == 0:
+                    yield from self._elide_pending(entry, stack, indents)
+                    return
+                self.lines_left -= 1
+            yield self._render_node(node, indent)
 
-            node_name = dataframe.loc[df_index, self.name]
-            if self.expand is False:
-                if len(node_name) > 39:
-                    node_name = (
-                        node_name[:18] + "..." + node_name[(len(node_name) - 18) :]
+            # ensures that we never revisit nodes in the case of
+            # large complex graphs
+            if node not in self.visited:
+                self.visited.add(node)
+                if self.child_order is not None:
+                    sorted_children = self.child_order[1].get(node, [])
+                else:
+                    sorted_children = sorted(node.children, key=lambda n: n.frame)
+                elided = None
+                if node._depth < self.depth:
+                    sorted_children, elided = self._prune_children(
+                        sorted_children, threshold
                     )
-            name_str = (
-                self._ansi_color_for_name(node_name) + node_name + self.colors.end
-            )
-
-            # 0 is "", 1 is "L", and 2 is "R"
-            if "_missing_node" in dataframe.columns:
-                left_or_right = dataframe.loc[df_index, "_missing_node"]
-                if left_or_right == 0:
-                    lr_decorator = ""
-                elif left_or_right == 1:
-                    lr_decorator = " {c.left}{decorator}{c.end}".format(
-                        decorator=self.lr_arrows["◀"], c=self.colors
+                children = []
+                for child in sorted_children:
+                    children.append(
+                        (
+                            child,
+                            child_indent + indents["├"],
+                            child_indent + indents["│"],
+                            child_indent,
+                        )
                     )
-                elif left_or_right == 2:
-                    lr_decorator = " {c.right}{decorator}{c.end}".format(
-                        decorator=self.lr_arrows["▶"], c=self.colors
+                if elided is not None:
+                    children.append(
+                        (None, child_indent + indents["└"], elided, child_indent)
                     )
+                elif children:
+                    child = children[-1][0]
+                    children[-1] = (
+                        child,
+                        child_indent + indents["└"],
+                        child_indent + indents[" "],
+                        child_indent,
+                    )
+                stack.extend(reversed(children))
+
+    def _prune_values(self, nodes):
+        """Values of the pruning metric for the given nodes."""
+        values = self.columns[self.prune_column]
+        return np.array([values[node_row(self.rows, n)] for n in nodes], dtype=float)
+
+    def _prune_children(self, children, threshold):
+        """Apply the threshold and max_children options to a node's children.
+
+        Returns:
+            (tuple): the children to render, and (count, total) of the
+                elided children or None if no child is elided
+        """
+        if threshold is None and self.max_children is None:
+            return children, None
+        values = self._prune_values(children)
+        keep = np.ones(len(children), dtype=bool)
+        if threshold is not None:
+            keep &= values >= threshold
+        if self.max_children is not None and keep.sum() > self.max_children:
+            # keep the largest children, with NaN values last
+            order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable")
+            order = order[keep[order]][: self.max_children]
+            keep[:] = False
+            keep[order] = True
+            kept = [children[i] for i in order]
+        else:
+            kept = [c for c, k in zip(children, keep) if k]
+        if keep.all():
+            return kept, None
+        return kept, (int((~keep).sum()), np.nansum(values[~keep]))
+
+    def _elide_pending(self, entry, stack, indents):
+        """Summarize the entries left on the stack once max_lines is reached.
+
+        Each group of pending siblings is summarized by a single line.
+        """
+        pending = [entry] + stack[::-1]
+        del stack[:]
+        groups = []
+        for node, indent, child_indent, base in pending:
+            if node is None:
+                count, total = child_indent
+            elif node._depth > self.depth:
+                continue
+            else:
+                count, total = 1, np.nansum(self._prune_values([node]))
+            if groups and groups[-1][0] == base:
+                groups[-1][1] += count
+                groups[-1][2] += total
+            else:
+                groups.append([base, count, total, indent])
+        for base, count, total, indent in groups:
+            if indent != base:
+                indent = base + indents["└"]
+            yield self._render_elided(indent, count, total)
+
+    def _render_elided(self, indent, count, total):
+        """Render the summary line of elided nodes."""
+        if not np.isscalar(total):
+            total = np.nansum(total)
+        return "{indent}{c.faint}... {count} more ({total:.{precision}f} total){c.end}\n".format(
+            indent=indent,
+            count=count,
+            total=total,
+            precision=self.precision,
+            c=self.colors,
+        )
+
+    def _render_node(self, node, indent):
+        """Render the line of a single node."""
+        row = node_row(self.rows, node)
+
+        node_metric = self.columns[self.primary_metric][row]
+
+        metric_precision = "{:." + str(self.precision) + "f}"
+        metric_str = (
+            self._ansi_color_for_metric(node_metric)
+            + metric_precision.format(node_metric)
+            + self.colors.end
+        )
 
-            result = "{indent}{metric_str} {name_str}".format(
-                indent=indent, metric_str=metric_str, name_str=name_str
+        if self.second_metric is not None:
+            metric_str += " {c.faint}{second_metric:.{precision}f}{c.end}".format(
+                second_metric=self.columns[self.second_metric][row],
+                precision=self.precision,
+                c=self.colors,
             )
-            if "_missing_node" in dataframe.columns:
-                result += lr_decorator
-            if self.context in dataframe.columns:
-                result += " {c.faint}{context}{c.end}\n".format(
-                    context=dataframe.loc[df_index, self.context], c=self.colors
-                )
-            else:
-                result += "\n"
 
-            if self.unicode:
-                indents = {"├": "├─ ", "│": "│  ", "└": "└─ ", " ": "   "}
-            else:
-                indents = {"├": "|- ", "│": "|  ", "└": "`- ", " ": "   "}
+        node_name = self.columns[self.name][row]
+        if self.expand is False:
+            if len(node_name) > 39:
+                node_name = node_name[:18] + "..." + node_name[(len(node_name) - 18) :]
+        name_str = self._ansi_color_for_name(node_name) + node_name + self.colors.end
 
-            # ensures that we never revisit nodes in the case of
-            # large complex graphs
-            if node not in self.visited:
-                self.visited.append(node)
-                # TODO: probably better to sort by time
-                sorted_children = sorted(node.children, key=lambda n: n.frame)
-                if sorted_children:
-                    last_child = sorted_children[-1]
+        result = "{indent}{metric_str} {name_str}".format(
+            indent=indent, metric_str=metric_str, name_str=name_str
+        )
 
-                for child in sorted_children:
-                    if child is not last_child:
-                        c_indent = child_indent + indents["├"]
-                        cc_indent = child_indent + indents["│"]
-                    else:
-                        c_indent = child_indent + indents["└"]
-                        cc_indent = child_indent + indents[" "]
-                    result += self.render_frame(
-                        child, dataframe, indent=c_indent, child_indent=cc_indent
-                    )
+        # 0 is "", 1 is "L", and 2 is "R"
+        if "_missing_node" in self.columns:
+            left_or_right = self.columns["_missing_node"][row]
+            if left_or_right == 1:
+                result += " {c.left}{decorator}{c.end}".format(
+                    decorator=self.lr_arrows["◀"], c=self.colors
+                )
+            elif left_or_right == 2:
+                result += " {c.right}{decorator}{c.end}".format(
+                    decorator=self.lr_arrows["▶"], c=self.colors
+                )
+        if self.context in self.columns:
+            result += " {c.faint}{context}{c.end}\n".format(
+                context=self.columns[self.context][row], c=self.colors
+            )
         else:
-            result = ""
-            indents = {"├": "", "│": "", "└": "", " ": ""}
+            result += "\n"
 
         return result
 
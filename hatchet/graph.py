@@ -5,6 +5,8 @@
 
 from collections import defaultdict
 
+import numpy as np
+
 from .node import Node, traversal_order
 
 
@@ -26,6 +28,47 @@ class Graph:
     def __init__(self, roots):
         assert roots is not None
         self.roots = roots
+        self._reset_caches()
+
+    def _reset_caches(self):
+        """Drop cached per-node lookup tables, e.g., after renumbering."""
+        # incremented whenever the graph's structure or numbering changes
+        self._version = getattr(self, "_version", -1) + 1
+        self._node_table = None
+        self._node_valid = None
+        self._intervals = None
+
+    def node_table(self):
+        """Array of the nodes in this graph indexed by ``_hatchet_nid``.
+
+        IDs that do not belong to any node of this graph hold ``None``. The
+        table is built once and reused until the graph is renumbered.
+
+        Return:
+            (numpy.ndarray): object array mapping node ID -> Node
+        """
+        if self._node_table is None:
+            nodes = list(self.traverse())
+            nids = np.fromiter(
+                (n._hatchet_nid for n in nodes), dtype=np.intp, count=len(nodes)
+            )
+            if len(nids) and nids.min() < 0:
+                raise ValueError(
+                    "Graph nodes are not enumerated: call enumerate_traverse() first."
+                )
+            size = nids.max() + 1 if len(nids) else 0
+            table = np.full(size, None, dtype=object)
+            table[nids] = nodes
+            valid = np.zeros(size, dtype=bool)
+            valid[nids] = True
+            self._node_table = table
+            self._node_valid = valid
+        return self._node_table
+
+    def node_mask(self):
+        """Boolean array that is True for every ``_hatchet_nid`` in this graph."""
+        self.node_table()
+        return self._node_valid
 
     def traverse(self, order="pre", attrs=None, visited=None):
         """Preorder traversal of all roots of this Graph.
@@ -46,6 +89,135 @@ class Graph:
             for value in root.traverse(order=order, attrs=attrs, visited=visited):
                 yield value
 
+    def _interval_index(self):
+        """Preorder interval labels of this graph's depth-first spanning forest.
+
+        Every node gets the position at which the traversal enters it and
+        the position just past its last spanning-forest descendant, so the
+        descendants of a node in a tree are a contiguous range of preorder
+        positions. Edges that reach an already visited node (shared nodes in
+        DAGs, cycles) are kept separately, sorted by source position.
+
+        Return:
+            (tuple): ``(order, entry, exit, extra_src, extra_dst, is_forest)``
+                where ``order`` maps preorder position -> node ID, ``entry``
+                and ``exit`` map node ID -> position, and ``extra_src`` and
+                ``extra_dst`` hold the positions of non-spanning edges.
+        """
+        if self._intervals is None:
+            size = len(self.node_table())
+            entry = np.full(size, -1, dtype=np.intp)
+            exit = np.full(size, -1, dtype=np.intp)
+            order = []
+            extra = []
+
+            def _children(node):
+                return iter(sorted(node.children, key=traversal_order))
+
+            for root in sorted(self.roots, key=traversal_order):
+                if entry[root._hatchet_nid] >= 0:
+                    continue
+                entry[root._hatchet_nid] = len(order)
+                order.append(root._hatchet_nid)
+                path = [root]
+                stack = [_children(root)]
+                while stack:
+                    child = next(stack[-1], None)
+                    if child is None:
+                        stack.pop()
+                        exit[path.pop()._hatchet_nid] = len(order)
+                        continue
+                    if entry[child._hatchet_nid] >= 0:
+                        extra.append(
+                            (entry[path[-1]._hatchet_nid], entry[child._hatchet_nid])
+                        )
+                        continue
+                    entry[child._hatchet_nid] = len(order)
+                    order.append(child._hatchet_nid)
+                    path.append(child)
+                    stack.append(_children(child))
+
+            extra = np.array(sorted(extra), dtype=np.intp).reshape(-1, 2)
+            self._intervals = (
+                np.array(order, dtype=np.intp),
+                entry,
+                exit,
+                extra[:, 0],
+                extra[:, 1],
+                len(extra) == 0,
+            )
+        return self._intervals
+
+    def _reachable_positions(self, node):
+        """Boolean mask over preorder positions of everything reachable from node.
+
+        Whole spanning-forest intervals are marked at once, so only the
+        non-spanning edges inside already marked intervals are followed.
+        """
+        order, entry, exit, extra_src, extra_dst, _ = self._interval_index()
+        reached = np.zeros(len(order), dtype=bool)
+        pending = [entry[node._hatchet_nid]]
+        while pending:
+            start = pending.pop()
+            if reached[start]:
+                continue
+            stop = exit[order[start]]
+            reached[start:stop] = True
+            lo, hi = np.searchsorted(extra_src, [start, stop])
+            pending.extend(pos for pos in extra_dst[lo:hi] if not reached[pos])
+        return reached
+
+    def descendant_nids(self, node):
+        """IDs of all nodes reachable from node, excluding node itself.
+
+        For trees and forests this is a single contiguous slice of the
+        preorder; DAGs fall back to following the shared edges.
+
+        Arguments:
+            node (Node): a node of this graph
+
+        Return:
+            (numpy.ndarray): ``_hatchet_nid`` values in preorder
+        """
+        order, entry, exit, _, _, is_forest = self._interval_index()
+        start = entry[node._hatchet_nid]
+        if is_forest:
+            return order[start + 1 : exit[node._hatchet_nid]]
+        reached = self._reachable_positions(node)
+        # node may reach itself through a cycle; it is never its own descendant
+        reached[start] = False
+        return order[reached]
+
+    def descendants(self, node):
+        """List of all nodes reachable from node, excluding node itself.
+
+        Arguments:
+            node (Node): a node of this graph
+
+        Return:
+            (list): descendant nodes in preorder
+        """
+        return list(self.node_table()[self.descendant_nids(node)])
+
+    def is_ancestor(self, ancestor, node):
+        """True if node can be reached from ancestor by following child edges.
+
+        For trees and forests this is two integer comparisons of the
+        preorder interval labels. A node is not its own ancestor.
+
+        Arguments:
+            ancestor (Node): the candidate ancestor
+            node (Node): the candidate descendant
+        """
+        order, entry, exit, _, _, is_forest = self._interval_index()
+        start = entry[ancestor._hatchet_nid]
+        pos = entry[node._hatchet_nid]
+        if start < pos < exit[ancestor._hatchet_nid]:
+            return True
+        if is_forest or ancestor is node:
+            return False
+        return bool(self._reachable_positions(ancestor)[pos])
+
     def is_tree(self):
         """True if this graph is a tree, false otherwise."""
         if len(self.roots) > 1:
@@ -135,6 +307,7 @@ class Graph:
             for child in new.children:
                 child.parents = transform(child.parents)
         self.roots = transform(self.roots)
+        self._reset_caches()
 
     def normalize(self):
         merges = self.find_merges()
@@ -331,6 +504,7 @@ class Graph:
         for root in self.roots:
             root._depth = 0  # depth of root node is 0
             _iter_depth(root, visited)
+        self._reset_caches()
 
     def enumerate_traverse(self):
         if not self._check_enumerate_traverse():
@@ -338,6 +512,7 @@ class Graph:
                 node._hatchet_nid = i
 
             self.enumerate_depth()
+        self._reset_caches()
 
     def _check_enumerate_traverse(self):
         for i, node in enumerate(self.traverse()):
@@ -395,3 +570,46 @@ class Graph:
         graph.enumerate_traverse()
 
         return graph
+
+
+class GraphView(Graph):
+    """A graph whose nodes are shared with another graph.
+
+    Renumbering or merging the nodes of a view would also modify the graph
+    it was taken from, so these methods raise instead. Use ``copy()`` to
+    get a graph that can be modified.
+    """
+
+    def copy(self, old_to_new=None):
+        """Create and return a copy of this view.
+
+        Edges to nodes outside the view are not copied.
+
+        Arguments:
+            old_to_new (dict, optional): if provided, this dictionary will
+                be populated with mappings from old node -> new node
+        """
+        if old_to_new is None:
+            old_to_new = {}
+
+        for node in self.traverse():
+            old_to_new[node] = node.copy()
+
+        for old, new in old_to_new.items():
+            new.parents = [old_to_new[p] for p in old.parents if p in old_to_new]
+            new.children = [old_to_new[c] for c in old.children]
+
+        graph = Graph([old_to_new[r] for r in self.roots])
+        graph.enumerate_traverse()
+
+        return graph
+
+    def _read_only(self, *args, **kwargs):
+        raise ValueError(
+            "Graph view shares its nodes with another graph, use copy() to modify it"
+        )
+
+    enumerate_depth = _read_only
+    enumerate_traverse = _read_only
+    merge_nodes = _read_only
+    normalize = _read_only
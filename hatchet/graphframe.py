@@ -6,20 +6,24 @@
 import sys
 import traceback
 import os
+import heapq
+import json
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 import pandas as pd
 import numpy as np
 import multiprocess as mp
 
-from .node import Node
-from .graph import Graph
+from .node import Node, MultiplePathError, traversal_order
+from .graph import Graph, GraphView
 from .frame import Frame
 from .query import AbstractQuery, QueryMatcher, CypherQuery
 from .external.console import ConsoleRenderer
-from .util.dot import trees_to_dot
+from .util.dot import trees_to_dot, dot_chunks
 from .util.logger import Logger
+from .util.node_columns import node_columns, node_row
+from .util.sketch import QuantileSketch
 from .util.deprecated import deprecated_params
 from .chopper import Chopper
 
@@ -35,6 +39,19 @@ except ImportError:
     raise
 
 
+def _write_chunks(chunks, output):
+    """Write the chunks produced by an exporter to a file-like object."""
+    for chunk in chunks:
+        output.write(chunk)
+
+
+def _json_default(obj):
+    """Convert numpy scalars and other objects for json.dump."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
 def parallel_apply(filter_function, dataframe, queue):
     """A function called in parallel, which does a pandas apply on part of a
     dataframe and returns the results via multiprocessing queue function."""
@@ -48,6 +65,9 @@ class GraphFrame:
     and a dataframe.
     """
 
+    # maximum number of query results cached per graphframe
+    query_cache_size = 32
+
     def __init__(
         self,
         graph,
@@ -95,8 +115,13 @@ class GraphFrame:
                 "DataFrames passed to GraphFrame() must have an index called 'node'."
             )
 
+        # content version and cache of query results for this version
+        self._version = 0
+        self._query_cache = OrderedDict()
         self.graph = graph
         self.dataframe = dataframe
+        # True while the dataframe is a slice of another graphframe's data
+        self._shares_data = False
         self.exc_metrics = [] if exc_metrics is None else exc_metrics
         self.inc_metrics = [] if inc_metrics is None else inc_metrics
         self.default_metric = default_metric
@@ -127,14 +152,90 @@ class GraphFrame:
                 )
             setattr(self, x, y)
 
+    @property
+    def graph(self):
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+        self._modified()
+
+    @property
+    def dataframe(self):
+        return self._dataframe
+
+    @dataframe.setter
+    def dataframe(self, dataframe):
+        self._dataframe = dataframe
+        self._modified()
+
+    @property
+    def version(self):
+        """Content version of the graphframe.
+
+        The version changes whenever the graph or dataframe is replaced, when
+        GraphFrame methods modify them in place, and when the graph renumbers
+        or merges its nodes. After writing to ``dataframe`` in place or
+        editing the graph's nodes directly, call ``update_version()``.
+        """
+        return (self._version, self._graph._version)
+
+    def update_version(self):
+        """Mark the graphframe as modified and drop cached query results.
+
+        Call this after modifying the dataframe in place or editing the
+        children or parents of the graph's nodes, so that cached query
+        results and per-node lookup tables are not reused.
+        """
+        self._graph._reset_caches()
+        self._modified()
+
+    def _modified(self):
+        """Increment the version after the graphframe was modified."""
+        self._version += 1
+        self._query_cache.clear()
+
+    def _cached_query(self, key):
+        """Look up a cached query result for the current version.
+
+        Arguments:
+            key (hashable): normalized query, or None if it cannot be cached
+
+        Return:
+            the cached result, or None if there is none
+        """
+        if key is None or self.query_cache_size <= 0:
+            return None
+        key = (key, self.version)
+        result = self._query_cache.get(key)
+        if result is not None:
+            self._query_cache.move_to_end(key)
+        return result
+
+    def _cache_query(self, key, result):
+        """Store a query result for the current version, evicting the least
+        recently used results beyond ``query_cache_size``."""
+        if key is None or self.query_cache_size <= 0:
+            return
+        self._query_cache[(key, self.version)] = result
+        while len(self._query_cache) > self.query_cache_size:
+            self._query_cache.popitem(last=False)
+
     @staticmethod
     @Logger.loggable
-    def from_hpctoolkit(dirname):
+    def from_hpctoolkit(dirname, sketch=False, sketch_size=100):
         """Read an HPCToolkit database directory into a new GraphFrame.
 
         Arguments:
             dirname (str): parent directory of an HPCToolkit
                 experiment.xml file
+            sketch (bool, optional): fold the processes/threads into a
+                quantile sketch per node as they are read, for runs whose
+                per-rank dataframe would not fit in memory. The dataframe
+                then has one row per node with the mean of each metric, and
+                the sketches of each metric are in ``sketches``.
+            sketch_size (int, optional): maximum number of centroids per node
 
         Returns:
             (GraphFrame): new GraphFrame containing HPCToolkit profile data
@@ -144,7 +245,9 @@ class GraphFrame:
         from .readers.hpctoolkit_v4_reader import HPCToolkitV4Reader
 
         if "experiment.xml" in os.listdir(dirname):
-            return HPCToolkitReader(dirname).read()
+            return HPCToolkitReader(dirname, sketch_size if sketch else None).read()
+        elif sketch:
+            raise ValueError("Sketches are only supported for experiment.xml databases")
         else:
             return HPCToolkitV4Reader(dirname).read()
 
@@ -479,6 +582,17 @@ class GraphFrame:
 
         dataframe_copy.set_index(index_names, inplace=True)
 
+        attributes = dict([[x, getattr(self, x)] for x in self.attributes])
+        if "sketches" in attributes:
+            sketches = {}
+            for metric, sketch in attributes["sketches"].items():
+                sketches[metric] = sketch.merge()
+                sketches[metric].keys = pd.Index(
+                    [node_clone.get(node, node) for node in sketches[metric].keys],
+                    name="node",
+                )
+            attributes["sketches"] = sketches
+
         return GraphFrame(
             graph_copy,
             dataframe_copy,
@@ -486,11 +600,127 @@ class GraphFrame:
             list(self.inc_metrics),
             self.default_metric,
             dict(self.metadata),
+            attributes=attributes,
+        )
+
+    def subtree(self, node, depth=None):
+        """Return a lightweight view of the subtree rooted at node.
+
+        The view's graph is a read-only ``GraphView`` rooted at ``node`` that
+        shares this graphframe's nodes, which keep their IDs and depths. For
+        trees whose dataframe is sorted by node, the view's dataframe is a
+        slice of this graphframe's dataframe and no data is copied. GraphFrame
+        methods that modify the view in place copy its nodes and rows first;
+        writing to ``view.dataframe`` directly may also modify this
+        graphframe.
+
+        If ``depth`` is given, only nodes at most ``depth`` levels below
+        ``node`` are kept. These nodes are copied (keeping their IDs and
+        depths) so that the view's graph stops at ``depth``.
+
+        Arguments:
+            node (Node): root of the subtree
+            depth (int, optional): number of levels below node to keep
+
+        Return:
+            (GraphFrame): new graphframe for the subtree
+        """
+        table = self.graph.node_table()
+        nid = node._hatchet_nid
+        if not (0 <= nid < len(table) and table[nid] is node):
+            raise ValueError("{} is not a node of this graphframe".format(node))
+
+        index = self.dataframe.index
+        index_nodes = index.get_level_values("node")
+        shares_data = False
+
+        if depth is None:
+            graph = GraphView([node])
+            order, entry, exit, _, _, is_forest = self.graph._interval_index()
+            nids = order[entry[nid] : exit[nid]]
+            if (
+                is_forest
+                and np.all(np.diff(nids) == 1)
+                and index.is_monotonic_increasing
+            ):
+                # rows of a preorder-numbered subtree are contiguous
+                start, stop = index.slice_locs(node, table[nids[-1]])
+                dataframe = self.dataframe.iloc[start:stop]
+                shares_data = True
+            else:
+                nodes = [node] + self.graph.descendants(node)
+                dataframe = self.dataframe[index_nodes.isin(nodes)]
+        else:
+            nodes = [node] + [
+                n
+                for n in self.graph.descendants(node)
+                if n._depth - node._depth <= depth
+            ]
+            old_to_new = GraphFrame._copy_nodes(nodes)
+            graph = Graph([old_to_new[node]])
+            dataframe = GraphFrame._replace_nodes(
+                self.dataframe[index_nodes.isin(nodes)], old_to_new
+            )
+
+        view = GraphFrame(
+            graph,
+            dataframe,
+            list(self.exc_metrics),
+            list(self.inc_metrics),
+            self.default_metric,
+            dict(self.metadata),
             attributes=dict([[x, getattr(self, x)] for x in self.attributes]),
         )
+        view._shares_data = shares_data
+        return view
+
+    @staticmethod
+    def _copy_nodes(nodes):
+        """Copy nodes, keeping their IDs, depths and the edges between them.
+
+        Return:
+            (dict): mapping from each node to its copy
+        """
+        old_to_new = {}
+        for n in nodes:
+            old_to_new[n] = n.copy()
+            old_to_new[n]._hatchet_nid = n._hatchet_nid
+            old_to_new[n]._depth = n._depth
+        for old, new in old_to_new.items():
+            for child in old.children:
+                if child in old_to_new:
+                    new.add_child(old_to_new[child])
+                    old_to_new[child].add_parent(new)
+        return old_to_new
+
+    @staticmethod
+    def _replace_nodes(dataframe, old_to_new):
+        """Return a copy of dataframe indexed by the copied nodes."""
+        index_names = dataframe.index.names
+        dataframe = dataframe.reset_index()
+        dataframe["node"] = dataframe["node"].apply(lambda x: old_to_new[x])
+        dataframe.set_index(index_names, inplace=True)
+        return dataframe
+
+    def _materialize(self):
+        """Prepare the graph and dataframe to be modified in place.
+
+        Subtree views get their own copy of the nodes and the dataframe, and
+        the version is updated so that cached query results are not reused.
+        """
+        if isinstance(self.graph, GraphView):
+            old_to_new = GraphFrame._copy_nodes(list(self.graph.traverse()))
+            self.graph = Graph([old_to_new[root] for root in self.graph.roots])
+            self.dataframe = GraphFrame._replace_nodes(self.dataframe, old_to_new)
+            self._shares_data = False
+        elif self._shares_data:
+            self.dataframe = self.dataframe.copy()
+            self._shares_data = False
+        self._modified()
 
     def drop_index_levels(self, function=np.mean):
         """Drop all index levels but `node`."""
+        self._materialize()
         index_names = list(self.dataframe.index.names)
         index_names.remove("node")
 
@@ -571,10 +801,17 @@ class GraphFrame:
                 query = QueryMatcher(filter_obj)
             elif isinstance(filter_obj, str):
                 query = CypherQuery(filter_obj)
-            query_matches = query.apply(self)
-            # match_set = list(set().union(*query_matches))
-            # filtered_df = dataframe_copy.loc[dataframe_copy["node"].isin(match_set)]
-            filtered_df = dataframe_copy.loc[dataframe_copy["node"].isin(query_matches)]
+            # select rows by looking up each row's node ID in the result mask
+            query_mask = query.apply_mask(self)
+            row_nids = np.fromiter(
+                (n._hatchet_nid for n in dataframe_copy["node"]),
+                dtype=np.intp,
+                count=len(dataframe_copy),
+            )
+            row_mask = np.zeros(len(row_nids), dtype=bool)
+            in_graph = row_nids < len(query_mask)
+            row_mask[in_graph] = query_mask[row_nids[in_graph]]
+            filtered_df = dataframe_copy.loc[row_mask]
         else:
             raise InvalidFilter(
                 "The argument passed to filter must be a callable, a query path list, or a QueryMatcher object."
@@ -608,6 +845,7 @@ class GraphFrame:
         This can be used to simplify the Graph, or to normalize Graph
         indexes between two GraphFrames.
         """
+        self._materialize()
         index_names = self.dataframe.index.names
         self.dataframe.reset_index(inplace=True)
 
@@ -656,9 +894,13 @@ class GraphFrame:
                 return connections[node]
 
         # run rewire for each root and make a new graph
-        visited = set()
-        for root in self.graph.roots:
-            rewire(root, None, visited)
+        if self.graph._interval_index()[5]:
+            # forests are rewired in one pass over the preorder
+            new_roots.extend(self._squash_forest(old_to_new))
+        else:
+            visited = set()
+            for root in self.graph.roots:
+                rewire(root, None, visited)
         graph = Graph(new_roots)
         graph.enumerate_traverse()
 
@@ -702,6 +944,39 @@ class GraphFrame:
         new_gf.calculate_inclusive_metrics()
         return new_gf
 
+    def _squash_forest(self, old_to_new):
+        """Connect the new nodes of squash for a graph that is a forest.
+
+        Each kept node becomes a child of its nearest kept ancestor, which
+        is found in a single pass over the preorder: the kept nodes whose
+        preorder interval contains the current position form a stack.
+
+        Arguments:
+            old_to_new (dict): new node for each old node that is kept
+
+        Return:
+            (list): the new roots
+        """
+        order, _, exit, _, _, _ = self.graph._interval_index()
+        table = self.graph.node_table()
+        new_roots = []
+        # (end of the preorder interval, new node) of the kept ancestors
+        ancestors = []
+        for position, nid in enumerate(order):
+            while ancestors and ancestors[-1][0] <= position:
+                ancestors.pop()
+            new_node = old_to_new.get(table[nid])
+            if new_node is None:
+                continue
+            if ancestors:
+                parent = ancestors[-1][1]
+                parent.add_child(new_node)
+                new_node.add_parent(parent)
+            else:
+                new_roots.append(new_node)
+            ancestors.append((exit[nid], new_node))
+        return new_roots
+
     def _init_sum_columns(self, columns, out_columns):
         """Helper function for subtree_sum and subgraph_sum."""
         if out_columns is None:
@@ -737,6 +1012,7 @@ class GraphFrame:
             function (callable): associative operator used to sum
                 elements, sum of an all-NA series is NaN (default: sum(min_count=1))
         """
+        self._materialize()
         out_columns = self._init_sum_columns(columns, out_columns)
 
         # sum over the output columns
@@ -801,6 +1077,7 @@ class GraphFrame:
             self.subtree_sum(columns, out_columns, function)
             return
 
+        self._materialize()
         out_columns = self._init_sum_columns(columns, out_columns)
         for node in self.graph.traverse():
             subgraph_nodes = list(node.traverse())
@@ -1389,6 +1666,8 @@ class GraphFrame:
         if self.graph is other.graph:
             return
 
+        self._materialize()
+        other._materialize()
         node_map = {}
         union_graph = self.graph.union(other.graph, node_map)
 
@@ -1413,6 +1692,116 @@ class GraphFrame:
         self.graph = union_graph
         other.graph = union_graph
 
+    def _node_values(self, metric, rank=0, thread=0, function=None):
+        """Values of a metric for all nodes, as an array indexed by node ID.
+
+        Arguments:
+            metric (str): metric to look up
+            rank (int, optional): rank whose values are used
+            thread (int, optional): thread whose values are used
+            function (function or str, optional): if given, use this
+                aggregate of the metric across ranks and threads (e.g., np.mean)
+
+        Return:
+            (numpy.ndarray): value of each node of the graph, NaN for nodes
+                without a row. The array is cached and must not be modified.
+        """
+        key = ("node_values", metric, rank, thread, function)
+        cached = self._cached_query(key)
+        if cached is not None:
+            return cached
+
+        if function is None:
+            rows, columns = node_columns(self.dataframe, [metric], rank, thread)
+        else:
+            aggregated = self.dataframe.groupby(level="node", sort=False).agg(
+                {metric: function}
+            )
+            rows, columns = node_columns(aggregated, [metric])
+        num_nodes = len(self.graph.node_table())
+        values = np.full(num_nodes, np.nan)
+        known = np.flatnonzero(rows[:num_nodes] >= 0)
+        values[known] = columns[metric][rows[known]]
+        self._cache_query(key, values)
+        return values
+
+    def child_order(self, metric, rank=0, thread=0, function=None, node=None):
+        """Order the roots and the children of every node by decreasing metric.
+
+        The order is computed for all nodes at once, with a single
+        ``np.lexsort`` over (parent, -metric), and cached until the graph
+        or dataframe changes. Nodes without a value come last, and ties keep
+        the default order by frame. If ``node`` is given, only ``node`` and
+        its descendants are ordered, and ``node`` is the only root.
+
+        Arguments:
+            metric (str): metric to order by
+            rank (int, optional): rank whose values are used
+            thread (int, optional): thread whose values are used
+            function (function or str, optional): if given, order by this
+                aggregate of the metric across ranks and threads (e.g., np.mean)
+            node (Node, optional): root of the subgraph to order
+
+        Return:
+            (tuple): ``(roots, children)``, the sorted list of roots and a dict
+                mapping each node with children to its sorted list of children
+        """
+        table = self.graph.node_table()
+        order, entry, exit, _, _, is_forest = self.graph._interval_index()
+        nid = None
+        if node is not None:
+            nid = node._hatchet_nid
+            if not (0 <= nid < len(table) and table[nid] is node):
+                raise ValueError("{} is not a node of this graphframe".format(node))
+        key = ("child_order", metric, rank, thread, function, nid)
+        cached = self._cached_query(key)
+        if cached is not None:
+            return cached
+
+        if node is None:
+            nids = order
+            roots = [root._hatchet_nid for root in self.graph.roots]
+        elif is_forest:
+            # the subtree is a contiguous range of the preorder
+            nids = order[entry[nid] : exit[nid]]
+            roots = [nid]
+        else:
+            nids = np.concatenate(([nid], self.graph.descendant_nids(node)))
+            roots = [nid]
+        nodes = table[nids]
+        parents = np.repeat(nids, [len(n.children) for n in nodes]).astype(np.intp)
+        children = np.fromiter(
+            (child._hatchet_nid for n in nodes for child in n.children),
+            dtype=np.intp,
+            count=len(parents),
+        )
+        # roots are ordered as the children of a virtual parent -1
+        roots = np.array(roots, np.intp)
+        parents = np.concatenate([np.full(len(roots), -1, np.intp), parents])
+        children = np.concatenate([roots, children])
+
+        values = self._node_values(metric, rank, thread, function)[children]
+        sort_key = np.where(np.isnan(values), np.inf, -values)
+
+        # parent, then decreasing metric, then preorder (frame) position
+        sorted_edges = np.lexsort((entry[children], sort_key, parents))
+        parents = parents[sorted_edges]
+        children = table[children[sorted_edges]]
+        starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+        ends = np.r_[starts[1:], len(parents)]
+
+        sorted_roots = []
+        sorted_children = {}
+        for start, end in zip(starts, ends):
+            if parents[start] < 0:
+                sorted_roots = children[start:end].tolist()
+            else:
+                sorted_children[table[parents[start]]] = children[start:end].tolist()
+
+        result = (sorted_roots, sorted_children)
+        self._cache_query(key, result)
+        return result
+
     @deprecated_params(
         metric="metric_column",
         name="name_column",
@@ -1434,13 +1823,39 @@ class GraphFrame:
         highlight_name=False,
         colormap="RdYlGn",
         invert_colormap=False,
+        threshold=None,
+        threshold_relative=False,
+        max_children=None,
+        max_lines=None,
+        output=None,
+        sort_by=None,
     ):
-        """Format this graphframe as a tree and return the resulting string."""
+        """Format this graphframe as a tree and return the resulting string.
+
+        Large trees can be pruned with ``threshold``, ``max_children`` and
+        ``max_lines``. Pruning uses the inclusive version of the (first)
+        metric column when there is one. Pruned siblings are summarized by a
+        single "... N more (total)" line, and their subtrees are not visited.
+
+        Arguments:
+            threshold (float, optional): hide children whose metric is below this value
+            threshold_relative (bool, optional): if True, threshold is a fraction of the root's metric
+            max_children (int, optional): show at most this many children per node, largest first
+            max_lines (int, optional): stop rendering nodes after this many lines
+            output (file, optional): if given, write the tree to this file-like
+                object line by line instead of returning it as a string
+            sort_by (str, optional): order the children of each node by
+                decreasing value of this metric instead of by name
+        """
         color = sys.stdout.isatty()
         shell = None
         if metric_column is None:
             metric_column = self.default_metric
 
+        prune_column = self._inclusive_metric(
+            metric_column if isinstance(metric_column, str) else metric_column[0]
+        )
+
         if color is False:
             try:
                 import IPython
@@ -1457,7 +1872,9 @@ class GraphFrame:
         elif sys.version_info.major == 3:
             unicode = True
 
-        return ConsoleRenderer(unicode=unicode, color=color).render(
+        renderer = ConsoleRenderer(unicode=unicode, color=color)
+        render = renderer.render if output is None else renderer.render_chunks
+        result = render(
             self.graph.roots,
             self.dataframe,
             metric_column=metric_column,
@@ -1471,151 +1888,369 @@ class GraphFrame:
             highlight_name=highlight_name,
             colormap=colormap,
             invert_colormap=invert_colormap,
+            threshold=threshold,
+            threshold_relative=threshold_relative,
+            max_children=max_children,
+            max_lines=max_lines,
+            prune_column=prune_column,
+            child_order=(
+                None if sort_by is None else self.child_order(sort_by, rank, thread)
+            ),
         )
+        if output is None:
+            return result
+        _write_chunks(result, output)
 
     @Logger.loggable
-    def to_dot(self, metric=None, name="name", rank=0, thread=0, threshold=0.0):
+    def to_dot(
+        self, metric=None, name="name", rank=0, thread=0, threshold=0.0, output=None
+    ):
         """Write the graph in the graphviz dot format:
         https://www.graphviz.org/doc/info/lang.html
+
+        If output (a file-like object) is given, the graph is written to it
+        incrementally and nothing is returned.
         """
         if metric is None:
             metric = self.default_metric
-        return trees_to_dot(
-            self.graph.roots, self.dataframe, metric, name, rank, thread, threshold
-        )
+        args = (self.graph.roots, self.dataframe, metric, name, rank, thread, threshold)
+        if output is None:
+            return trees_to_dot(*args)
+        _write_chunks(dot_chunks(*args), output)
 
     @Logger.loggable
-    def to_flamegraph(self, metric=None, name="name", rank=0, thread=0, threshold=0.0):
+    def to_flamegraph(
+        self,
+        metric=None,
+        name="name",
+        rank=0,
+        thread=0,
+        threshold=0.0,
+        output=None,
+        function=None,
+    ):
         """Write the graph in the folded stack output required by FlameGraph
         http://www.brendangregg.com/flamegraphs.html
+
+        If output (a file-like object) is given, the stacks are written to it
+        one line at a time and nothing is returned.
+
+        Arguments:
+            metric (str, optional): metric written for each stack (default: default_metric)
+            name (str, optional): column used for the frames of the stacks
+            rank (int, optional): rank to export (ignored if function is given)
+            thread (int, optional): thread to export (ignored if function is given)
+            output (file, optional): file-like object to write the stacks to
+            function (function or str, optional): if given, aggregate the metric
+                across all ranks and threads of each node with this function
+                (e.g., np.sum or "mean") instead of selecting one rank/thread
         """
-        folded_stack = ""
         if metric is None:
             metric = self.default_metric
+        chunks = self._flamegraph_chunks(metric, name, rank, thread, function)
+        if output is None:
+            return "".join(chunks)
+        _write_chunks(chunks, output)
+
+    def _flamegraph_chunks(self, metric, name, rank, thread, function):
+        """Yield the folded stack line of each node.
+
+        The stack of each node is built once from its parent's stack in a
+        single preorder pass, with names and metric values taken from arrays
+        aligned by node.
+        """
+        if function is None:
+            rows, columns = node_columns(self.dataframe, [name, metric], rank, thread)
+        else:
+            aggregated = self.dataframe.groupby(level="node", sort=False).agg(
+                {name: "first", metric: function}
+            )
+            rows, columns = node_columns(aggregated, [name, metric])
+        names = columns[name]
+        values = columns[metric]
 
         for root in self.graph.roots:
-            for hnode in root.traverse():
-                callpath = hnode.path()
-                for i in range(0, len(callpath) - 1):
-                    if (
-                        "rank" in self.dataframe.index.names
-                        and "thread" in self.dataframe.index.names
-                    ):
-                        df_index = (callpath[i], rank, thread)
-                    elif "rank" in self.dataframe.index.names:
-                        df_index = (callpath[i], rank)
-                    elif "thread" in self.dataframe.index.names:
-                        df_index = (callpath[i], thread)
-                    else:
-                        df_index = callpath[i]
-                    folded_stack = (
-                        folded_stack + str(self.dataframe.loc[df_index, "name"]) + "; "
+            visited = set()
+            stack = [(root, "")]
+            while stack:
+                hnode, parent_stack = stack.pop()
+                if id(hnode) in visited:
+                    continue
+                visited.add(id(hnode))
+                if parent_stack and len(hnode.parents) > 1:
+                    raise MultiplePathError(
+                        "Node has more than one path: {}".format(hnode.paths())
                     )
 
-                if (
-                    "rank" in self.dataframe.index.names
-                    and "thread" in self.dataframe.index.names
-                ):
-                    df_index = (callpath[-1], rank, thread)
-                elif "rank" in self.dataframe.index.names:
-                    df_index = (callpath[-1], rank)
-                elif "thread" in self.dataframe.index.names:
-                    df_index = (callpath[-1], thread)
-                else:
-                    df_index = callpath[-1]
-                folded_stack = (
-                    folded_stack + str(self.dataframe.loc[df_index, "name"]) + " "
+                row = node_row(rows, hnode)
+                folded_stack = parent_stack + str(names[row])
+                yield folded_stack + " " + str(values[row]) + "\n"
+
+                stack.extend(
+                    (child, folded_stack + "; ")
+                    for child in sorted(
+                        hnode.children, key=traversal_order, reverse=True
+                    )
                 )
 
-                # set dataframe index based on if rank and thread are part of the index
-                if (
-                    "rank" in self.dataframe.index.names
-                    and "thread" in self.dataframe.index.names
-                ):
-                    df_index = (hnode, rank, thread)
-                elif "rank" in self.dataframe.index.names:
-                    df_index = (hnode, rank)
-                elif "thread" in self.dataframe.index.names:
-                    df_index = (hnode, thread)
-                else:
-                    df_index = hnode
+    @Logger.loggable
+    def to_speedscope(
+        self,
+        filename,
+        metric=None,
+        name="name",
+        profile_type="evented",
+        unit="none",
+        sort_by=None,
+    ):
+        """Write the graph in the speedscope format, with one profile per
+        rank/thread: https://www.speedscope.app
 
-                folded_stack = (
-                    folded_stack + str(self.dataframe.loc[df_index, metric]) + "\n"
-                )
+        Arguments:
+            filename (str or file): file name or file-like object to write to
+            metric (str, optional): metric used to weigh the frames (default: default_metric)
+            name (str, optional): column used for the names of the frames
+            profile_type (str, optional): "evented" to write each node as a
+                span on a synthetic timeline, or "sampled" to write each node as
+                a stack weighted by its exclusive metric
+            unit (str, optional): speedscope unit of the metric, e.g., "seconds"
+            sort_by (str, optional): lay out the children of each node by
+                decreasing value of this metric instead of by frame
+        """
+        # import this lazily to avoid circular dependencies
+        from .writers.speedscope_writer import SpeedscopeWriter
+
+        SpeedscopeWriter(filename).write(
+            self,
+            metric=metric,
+            name=name,
+            profile_type=profile_type,
+            unit=unit,
+            sort_by=sort_by,
+        )
 
-        return folded_stack
+    @Logger.loggable
+    def to_chrome_trace(
+        self, filename, metric=None, name="name", ts="ts", scale=1.0e6, sort_by=None
+    ):
+        """Write the graph in the Chrome trace event format, for Perfetto UI
+        or chrome://tracing. Ranks and threads are written as processes and
+        threads.
+
+        Arguments:
+            filename (str or file): file name or file-like object to write to
+            metric (str, optional): inclusive duration of the nodes (default: default_metric)
+            name (str, optional): column used for the names of the events
+            ts (str, optional): column with the start time of the nodes in
+                nanoseconds; if it does not exist, the nodes are laid out on a
+                synthetic timeline
+            scale (float, optional): factor converting the metric to
+                microseconds (the default assumes seconds)
+            sort_by (str, optional): on a synthetic timeline, lay out the
+                children of each node by decreasing value of this metric
+        """
+        # import this lazily to avoid circular dependencies
+        from .writers.chrome_trace_writer import ChromeTraceWriter
+
+        ChromeTraceWriter(filename).write(
+            self, metric=metric, name=name, ts=ts, scale=scale, sort_by=sort_by
+        )
+
+    def _inclusive_metric(self, metric):
+        """The inclusive version of metric if there is one, else metric."""
+        if metric not in self.inc_metrics:
+            inc_metric = metric + self.metadata["hatchet_inclusive_suffix"]
+            if inc_metric in self.inc_metrics:
+                return inc_metric
+        return metric
 
     @Logger.loggable
-    def to_literal(self, name="name", rank=0, thread=0, cat_columns=[]):
+    def to_literal(
+        self,
+        name="name",
+        rank=0,
+        thread=0,
+        cat_columns=[],
+        output=None,
+        depth=None,
+        max_nodes=None,
+        lod_metric=None,
+        sort_by=None,
+    ):
         """Format this graph as a list of dictionaries for Roundtrip
         visualizations.
-        """
-        graph_literal = []
-        visited = []
 
-        def _get_df_index(hnode):
-            if (
-                "rank" in self.dataframe.index.names
-                and "thread" in self.dataframe.index.names
-            ):
-                df_index = (hnode, rank, thread)
-            elif "rank" in self.dataframe.index.names:
-                df_index = (hnode, rank)
-            elif "thread" in self.dataframe.index.names:
-                df_index = (hnode, thread)
-            else:
-                df_index = hnode
+        If output (a file-like object) is given, the literal is written to it
+        as JSON, one node at a time, and nothing is returned.
+
+        Large graphs can be exported at a lower level of detail with depth
+        and max_nodes: the top levels are always expanded, and then the
+        heaviest remaining nodes by lod_metric are expanded while the node
+        budget allows. Nodes whose children are left out are stubs: they
+        have no "children" entry and their "stub" entry holds the number of
+        children left out. A stub's subtree can be fetched on demand with
+        ``gf.subtree(node).to_literal(...)``.
 
-            return df_index
+        Arguments:
+            depth (int, optional): always expand the nodes above this level
+                (roots are at level 0)
+            max_nodes (int, optional): expand the heaviest nodes as long as
+                the literal has at most this many nodes
+            lod_metric (str, optional): metric used to pick the heaviest nodes
+                (default: the inclusive version of default_metric)
+            sort_by (str, optional): order the children of each node by
+                decreasing value of this metric instead of by frame
+        """
+        graph_literal = []
+        visited = set()
 
-        def metrics_to_dict(df_index):
-            metrics_dict = {}
-            for m in sorted(self.inc_metrics + self.exc_metrics):
-                node_metric_val = self.dataframe.loc[df_index, m]
-                metrics_dict[m] = node_metric_val
+        metric_columns = sorted(self.inc_metrics + self.exc_metrics)
+        attribute_columns = sorted(
+            col for col in cat_columns if col in self.dataframe.columns
+        )
+        if lod_metric is None:
+            lod_metric = self._inclusive_metric(self.default_metric)
+        rows, columns = node_columns(
+            self.dataframe,
+            [name, lod_metric] + metric_columns + attribute_columns,
+            rank,
+            thread,
+        )
+        if sort_by is None:
+            roots = sorted(self.graph.roots, key=lambda n: n.frame)
 
-            return metrics_dict
+            def sorted_children(hnode):
+                return sorted(hnode.children, key=lambda n: n.frame)
 
-        def attributes_to_dict(df_index):
-            valid_columns = [
-                col for col in cat_columns if col in self.dataframe.columns
-            ]
+        else:
+            roots, children_order = self.child_order(sort_by, rank, thread)
 
-            attributes_dict = {}
-            for m in sorted(valid_columns):
-                node_attr_val = self.dataframe.loc[df_index, m]
-                attributes_dict[m] = node_attr_val
+            def sorted_children(hnode):
+                return children_order.get(hnode, [])
 
-            return attributes_dict
+        if depth is None and max_nodes is None:
+            expanded = None
+        else:
+            expanded = self._literal_lod(
+                roots, depth, max_nodes, rows, columns[lod_metric]
+            )
 
-        def add_nodes(hnode):
-            df_index = _get_df_index(hnode)
+        def node_to_dict(hnode):
+            row = node_row(rows, hnode)
 
             node_dict = {}
 
-            node_name = self.dataframe.loc[df_index, name]
-
-            node_dict["name"] = node_name
+            node_dict["name"] = columns[name][row]
             node_dict["frame"] = hnode.frame.attrs
-            node_dict["metrics"] = metrics_to_dict(df_index)
+            node_dict["metrics"] = {m: columns[m][row] for m in metric_columns}
             node_dict["metrics"]["_hatchet_nid"] = hnode._hatchet_nid
-            node_dict["attributes"] = attributes_to_dict(df_index)
+            node_dict["attributes"] = {a: columns[a][row] for a in attribute_columns}
 
-            if hnode.children and hnode not in visited:
-                visited.append(hnode)
-                node_dict["children"] = []
+            return node_dict
 
-                for child in sorted(hnode.children, key=lambda n: n.frame):
-                    node_dict["children"].append(add_nodes(child))
+        def expand(hnode, node_dict):
+            # children are only listed the first time a node is reached
+            if not hnode.children or hnode in visited:
+                return None
+            if expanded is not None and hnode not in expanded:
+                node_dict["stub"] = len(hnode.children)
+                return None
+            visited.add(hnode)
+            return sorted_children(hnode)
+
+        def add_nodes(hnode):
+            node_dict = node_to_dict(hnode)
+            children = expand(hnode, node_dict)
+            if children is not None:
+                node_dict["children"] = [add_nodes(child) for child in children]
 
             return node_dict
 
-        for root in sorted(self.graph.roots, key=lambda n: n.frame):
+        def literal_chunks(roots):
+            # depth-first traversal with an explicit stack holding the nodes
+            # left to write and the JSON separators between them
+            stack = ["]"]
+            for i, root in enumerate(reversed(roots)):
+                stack.append(root)
+                if i < len(roots) - 1:
+                    stack.append(", ")
+            yield "["
+            while stack:
+                item = stack.pop()
+                if isinstance(item, str):
+                    yield item
+                    continue
+                node_dict = node_to_dict(item)
+                children = expand(item, node_dict)
+                node_json = json.dumps(node_dict, default=_json_default)
+                if children is None:
+                    yield node_json
+                    continue
+                yield node_json[:-1] + ', "children": ['
+                stack.append("]}")
+                for i, child in enumerate(reversed(children)):
+                    stack.append(child)
+                    if i < len(children) - 1:
+                        stack.append(", ")
+
+        if output is not None:
+            _write_chunks(literal_chunks(roots), output)
+            return
+
+        for root in roots:
             graph_literal.append(add_nodes(root))
 
         return graph_literal
 
+    @staticmethod
+    def _literal_lod(roots, depth, max_nodes, rows, values):
+        """Select the nodes whose children are included in a level-of-detail
+        literal.
+
+        Nodes above level depth are always expanded. After that, the
+        heaviest candidate nodes (by values, aligned by node_columns rows)
+        are expanded while the literal stays within max_nodes nodes.
+        """
+
+        def value(hnode):
+            nid = hnode._hatchet_nid
+            if 0 <= nid < len(rows) and rows[nid] >= 0:
+                v = values[rows[nid]]
+                if v == v:
+                    return v
+            return -np.inf
+
+        expanded = set()
+        count = len(roots)
+        level = [root for root in roots if root.children]
+        for _ in range(depth or 0):
+            next_level = []
+            for hnode in level:
+                if hnode in expanded:
+                    continue
+                expanded.add(hnode)
+                count += len(hnode.children)
+                next_level.extend(c for c in hnode.children if c.children)
+            level = next_level
+        if max_nodes is None:
+            return expanded
+
+        # (negated value, tie breaker, node) for a max-heap on value
+        candidates = [(-value(n), i, n) for i, n in enumerate(level)]
+        heapq.heapify(candidates)
+        tie = len(candidates)
+        while candidates:
+            _, _, hnode = heapq.heappop(candidates)
+            if hnode in expanded or count + len(hnode.children) > max_nodes:
+                continue
+            expanded.add(hnode)
+            count += len(hnode.children)
+            for child in hnode.children:
+                if child.children and child not in expanded:
+                    heapq.heappush(candidates, (-value(child), tie, child))
+                    tie += 1
+        return expanded
+
     def _operator(self, other, op):
         """Generic function to apply operator to two dataframes and store
         result in self.
@@ -1635,6 +2270,7 @@ class GraphFrame:
             )
         )
 
+        self._materialize()
         self.dataframe.update(op(other.dataframe[all_metrics]))
 
         return self
@@ -1648,6 +2284,7 @@ class GraphFrame:
         Return:
             (GraphFrame): self's modified graphframe
         """
+        self._materialize()
         all_metrics = list(
             set().union(
                 self.exc_metrics, self.inc_metrics, other.exc_metrics, other.inc_metrics
@@ -1749,7 +2386,7 @@ class GraphFrame:
         return self
 
     @Logger.loggable
-    def groupby_aggregate(self, groupby_column, agg_function):
+    def groupby_aggregate(self, groupby_column, agg_function, per_rank=False):
         """Groupby-aggregate dataframe and reindex the Graph.
 
         Reindex the graph to match the groupby-aggregated dataframe.
@@ -1760,95 +2397,121 @@ class GraphFrame:
             self (graphframe): self's graphframe
             groupby_column: column to groupby on dataframe
             agg_function: aggregate function on dataframe
+            per_rank (bool, optional): if True, aggregate each rank/thread
+                separately and keep the rank/thread index levels, instead of
+                one row per group
 
         Return:
             (GraphFrame): new graphframe with reindexed graph and groupby-aggregated dataframe
         """
-        # create new nodes for each unique node in the old dataframe
-        # length is equal to number of nodes in original graph
-        old_to_new = {}
-
-        # list of new roots
-        new_roots = []
-
-        # dict of (new) super nodes
-        # length is equal to length of dataframe index (after groupby-aggregate)
-        node_dicts = []
-
-        def reindex(node, parent, visited):
-            """Reindex the graph.
-
-            Connect super nodes to children according to relationships from old graph.
-            """
-            # grab the super node corresponding to original node
-            super_node = old_to_new.get(node)
-
-            if not node.parents and super_node not in new_roots:
-                # this is a new root
-                new_roots.append(super_node)
-
-            # iterate over parents of old node, adding parents to super node
-            for parent in node.parents:
-                # convert node to super node
-                snode = old_to_new.get(parent)
-                # move to next node if parent and super node are to be merged
-                if snode == super_node:
-                    continue
-                # add node to super node's parents if parent does not exist in super
-                # node's parents
-                if snode not in super_node.parents:
-                    super_node.add_parent(snode)
-
-            # iterate over children of old node, adding children to super node
-            for child in node.children:
-                # convert node to super node
-                snode = old_to_new.get(child)
-                # move to next node if child and super node are to be merged
-                if snode == super_node:
-                    continue
-                # add node to super node's children if child does not exist in super
-                # node's children
-                if snode not in super_node.children:
-                    super_node.add_child(snode)
-
-            if node not in visited:
-                visited.add(node)
-                for child in node.children:
-                    reindex(child, super_node, visited)
-
-        # groupby-aggregate dataframe based on user-supplied functions
+        index = self.dataframe.index
         groupby_obj = self.dataframe.groupby(groupby_column)
-        agg_df = groupby_obj.agg(agg_function)
+        group_codes = groupby_obj.ngroup().fillna(-1).to_numpy(dtype=np.intp)
+        rank_levels = [name for name in index.names if name != "node"]
+
+        if per_rank and rank_levels:
+            # aggregate by (group, rank, thread) in one groupby, with the
+            # groups given by their codes
+            grouped = group_codes >= 0
+            group_keys = groupby_obj.size().index
+            agg_df = (
+                self.dataframe.drop(
+                    columns=[
+                        col
+                        for col in np.atleast_1d(groupby_column)
+                        if col in self.dataframe.columns
+                    ]
+                )[grouped]
+                .groupby(
+                    [pd.Index(group_codes[grouped], name="node")]
+                    + [index.get_level_values(name)[grouped] for name in rank_levels]
+                )
+                .agg(agg_function)
+            )
+        else:
+            # groupby-aggregate dataframe based on user-supplied functions
+            agg_df = groupby_obj.agg(agg_function)
+            group_keys = agg_df.index
 
-        # traverse groupby_obj, determine old node to super node mapping
-        nid = 0
-        for k, v in groupby_obj.groups.items():
-            node_name = k
-            node_type = agg_df.index.name
+        # create a super node for each group, numbered like the groups
+        node_type = group_keys.name
+        node_dicts = []
+        super_nodes = []
+        for nid, node_name in enumerate(group_keys):
             super_node = Node(Frame({"name": node_name, "type": node_type}), None, nid)
-            n = {"node": super_node, "nid": nid, "name": node_name}
-            node_dicts.append(n)
-            nid += 1
-
-            # if many old nodes map to the same super node
-            for i in v:
-                old_to_new[i] = super_node
+            node_dicts.append({"node": super_node, "nid": nid, "name": node_name})
+            super_nodes.append(super_node)
+
+        # map every node of the dataframe (by ID) to the code of its group,
+        # using the group of its first row (-1 for nodes without a row)
+        if isinstance(index, pd.MultiIndex):
+            level = index.names.index("node")
+            node_codes, level_nodes = index.codes[level], index.levels[level]
+        else:
+            node_codes, level_nodes = pd.factorize(index)
+        level_nids = np.fromiter(
+            (n._hatchet_nid for n in level_nodes), dtype=np.intp, count=len(level_nodes)
+        )
+        row_nids = level_nids[node_codes]
+        valid = row_nids >= 0
+        group_of = np.full(level_nids.max(initial=-1) + 1, -1, dtype=np.intp)
+        # with repeated IDs, the last assignment wins: assign in reverse
+        group_of[row_nids[valid][::-1]] = group_codes[valid][::-1]
+
+        def groups(nids):
+            in_range = (nids >= 0) & (nids < len(group_of))
+            return np.where(in_range, group_of[np.where(in_range, nids, 0)], -1)
+
+        # map both ends of every edge out of the dataframe's nodes to their
+        # groups (edges to nodes without a row have no group and are
+        # dropped), and connect the super nodes once per distinct pair
+        sources = np.repeat(level_nids, [len(node.children) for node in level_nodes])
+        targets = np.fromiter(
+            (child._hatchet_nid for node in level_nodes for child in node.children),
+            dtype=np.intp,
+            count=len(sources),
+        )
+        sources = groups(sources).astype(np.int64)
+        targets = groups(targets).astype(np.int64)
+        keep = (sources >= 0) & (targets >= 0) & (sources != targets)
+        edges = np.unique((sources[keep] << 32) | targets[keep])
+        for source, target in zip(
+            (edges >> 32).tolist(), (edges & 0xFFFFFFFF).tolist()
+        ):
+            super_nodes[source].add_child(super_nodes[target])
+            super_nodes[target].add_parent(super_nodes[source])
 
-        # reindex graph by traversing old graph
-        visited = set()
-        for root in self.graph.roots:
-            reindex(root, None, visited)
+        # the super nodes of the old roots are the new roots
+        root_groups = groups(
+            np.array([root._hatchet_nid for root in self.graph.roots], dtype=np.intp)
+        )
+        new_roots = [
+            super_nodes[group]
+            for group in dict.fromkeys(root_groups.tolist())
+            if group >= 0
+        ]
 
-        # append super nodes to groupby-aggregate dataframe
-        df_index = list(agg_df.index.names)
-        agg_df.reset_index(inplace=True)
+        # append super nodes to groupby-aggregate dataframe, indexed by node
+        # (the name of a super node is its group, so the group columns are
+        # not kept, which also avoids a duplicate "name" column)
         df_nodes = pd.DataFrame.from_dict(data=node_dicts)
-        tmp_df = pd.concat([agg_df, df_nodes], axis=1)
-        # add node to dataframe index if it doesn't exist
-        if "node" not in df_index:
-            df_index.append("node")
-        # reset index
-        tmp_df.set_index(df_index, inplace=True)
+        if per_rank and rank_levels:
+            codes = agg_df.index.get_level_values("node").to_numpy()
+            tmp_df = agg_df.drop(
+                columns=[col for col in df_nodes.columns if col in agg_df.columns]
+            )
+            tmp_df["nid"] = codes
+            tmp_df["name"] = df_nodes["name"].to_numpy()[codes]
+            tmp_df.index = tmp_df.index.set_levels(
+                pd.Index(super_nodes, dtype=object)[tmp_df.index.levels[0]],
+                level="node",
+            )
+        else:
+            agg_df = agg_df.reset_index(drop=True).drop(
+                columns=[col for col in df_nodes.columns if col in agg_df.columns]
+            )
+            tmp_df = pd.concat([agg_df, df_nodes], axis=1)
+            tmp_df.set_index("node", inplace=True)
 
         # update _hatchet_nid in reindexed graph and groupby-aggregate dataframe
         graph = Graph(new_roots)
@@ -1864,56 +2527,100 @@ class GraphFrame:
             dict(self.metadata),
             attributes=dict([[x, getattr(self, x)] for x in self.attributes]),
         )
-        new_gf.drop_index_levels()
         return new_gf
 
     @Logger.loggable
-    def flat_profile(self, groupby_column=None, as_index=True):
+    def flat_profile(self, groupby_column=None, as_index=True, per_rank=False):
         """Generates flat profile for a given graphframe.
-        Returns a new dataframe."""
-        return Chopper().flat_profile(self, groupby_column, as_index)
+        Returns a new dataframe, with one profile per rank/thread if
+        per_rank is True."""
+        return Chopper().flat_profile(self, groupby_column, as_index, per_rank)
 
     @Logger.loggable
-    def flatten(self, groupby_column=None):
+    def flatten(self, groupby_column=None, per_rank=False):
         """
         Flattens the graphframe by changing its graph structure and the dataframe.
+        Keeps the rank/thread index levels if per_rank is True.
         """
-        return Chopper().flatten(self, groupby_column)
+        return Chopper().flatten(self, groupby_column, per_rank)
 
     @Logger.loggable
-    def to_callgraph(self):
+    def to_callgraph(self, per_rank=False):
         """
         Converts a CCT to a callgraph.
-        Returns a new graphframe.
+        Returns a new graphframe, with one row per rank/thread of each
+        function if per_rank is True.
         """
-        return Chopper().to_callgraph(self)
+        return Chopper().to_callgraph(self, per_rank)
 
     @Logger.loggable
-    def load_imbalance(self, metric_column=None, threshold=None, verbose=False):
+    def load_imbalance(
+        self, metric_column=None, threshold=None, verbose=False, sketch=False
+    ):
         """Calculates load imbalance for given metric column(s)
         Takes a graphframe and a list of metric column(s), and
         returns a new graphframe with metric.imbalance column(s).
+        With sketch=True, the statistics come from per-node quantile
+        sketches (see Chopper.load_imbalance).
+        """
+        return Chopper().load_imbalance(self, metric_column, threshold, verbose, sketch)
+
+    def quantile_sketch(self, metric=None, size=100):
+        """Summarize a metric across processes/threads with a mergeable
+        quantile sketch per node.
+
+        The sketches estimate quantiles (e.g., p50/p95/p99) and histograms of
+        each node's values in bounded memory. Sketches of several
+        graphframes with unified graphs can be merged for ensemble
+        statistics, and more values can be added with ``update``.
+
+        Graphframes read with ``sketch=True`` hold one row per node, and
+        return the sketches built by the reader instead. Graphframes derived
+        from them with new nodes (e.g., by ``squash``) build the sketches from
+        their dataframe.
+
+        Arguments:
+            metric (str, optional): metric to summarize (default: default_metric)
+            size (int, optional): maximum number of centroids per node
+
+        Return:
+            (QuantileSketch): sketches of the metric keyed by node
         """
-        return Chopper().load_imbalance(self, metric_column, threshold, verbose)
+        if metric is None:
+            metric = self.default_metric
+        sketch = getattr(self, "sketches", {}).get(metric)
+        if sketch is not None:
+            # the reader's sketches only describe the nodes they were built for
+            table = self.graph.node_table()
+            if all(
+                0 <= node._hatchet_nid < len(table) and table[node._hatchet_nid] is node
+                for node in sketch.keys
+            ):
+                return sketch
+        return QuantileSketch.from_values(
+            self.dataframe.index.get_level_values("node"),
+            self.dataframe[metric].to_numpy(),
+            size,
+        )
 
     @Logger.loggable
-    def hot_path(self, start_node=None, metric=None, threshold=0.5):
+    def hot_path(self, start_node=None, metric=None, threshold=0.5, top_k=None):
         """Returns the hot_path function.
         Inputs:
          - start_node: Start node of the hot path should be given.
          - metric: A numerical metric on the dataframe
          - threshold: Threshold for parent-child comparison (parent <= child/2).
+         - top_k: Return the top_k hottest paths instead of one.
         Output:
          - hot_path: list of nodes, starting from the start node to the hot node.
+         If top_k is given, a list of up to top_k such paths, hottest first.
 
         Example:
         root_node = graphframe.graph.roots[0]
         graphframe.hot_path(root_node)
         """
         # call hot_path function on high-level API
-        hot_path = Chopper().hot_path(
-            self, start_node, metric, threshold, callpath=[start_node]
-        )
+        hot_path = Chopper().hot_path(self, start_node, metric, threshold, top_k=top_k)
         return hot_path
 
     @Logger.loggable
@@ -1927,6 +2634,43 @@ class GraphFrame:
         correlation_matrix = Chopper().correlation_analysis(self, metrics, method)
         return correlation_matrix
 
+    @Logger.loggable
+    def rank_outliers(
+        self,
+        metrics=None,
+        method="mad",
+        threshold=None,
+        num_clusters=None,
+        chunk_size=2**24,
+        iterations=100,
+        seed=0,
+    ):
+        """Scores how much each rank deviates from the others, and optionally
+        clusters the ranks. See Chopper.rank_outliers.
+
+        Returns a dataframe indexed by rank.
+        """
+        return Chopper().rank_outliers(
+            self,
+            metrics,
+            method,
+            threshold,
+            num_clusters,
+            chunk_size,
+            iterations,
+            seed,
+        )
+
+    @Logger.loggable
+    def analyze(self, analyses=None):
+        """Runs several Chopper analyses of the graphframe at once, sharing
+        their intermediates. Returns a dict of the results by analysis name.
+
+        Example:
+        results = graphframe.analyze(["flat_profile", ("hot_path", {"top_k": 5})])
+        """
+        return Chopper().analyze(self, analyses)
+
     @Logger.loggable
     def add(self, other):
         """Returns the column-wise sum of two graphframes as a new graphframe.
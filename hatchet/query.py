@@ -12,8 +12,10 @@ except ImportError:
 
     ABC = ABCMeta("ABC", (object,), {"__slots__": ()})
 
+import heapq
 from itertools import groupby
-from numbers import Real
+from numbers import Integral, Real
+import operator
 import re
 import sys
 import pandas as pd
@@ -22,13 +24,161 @@ from pandas.core.indexes.multi import MultiIndex
 from textx import metamodel_from_str
 from textx.exceptions import TextXError
 
-# Flake8 to ignore this import, it does not recognize that eval("np.nan") needs
-# numpy package
-import numpy as np  # noqa: F401
+import numpy as np
 
 from .node import Node, traversal_order
 
 
+def _nodes_to_mask(nodes, gf):
+    """Convert a collection of nodes into a boolean mask over ``_hatchet_nid``."""
+    mask = np.zeros(len(gf.graph.node_table()), dtype=bool)
+    mask[np.fromiter((n._hatchet_nid for n in nodes), dtype=np.intp)] = True
+    return mask
+
+
+def _mask_to_nodes(mask, gf):
+    """Convert a boolean mask over ``_hatchet_nid`` back into a list of nodes."""
+    return list(gf.graph.node_table()[mask])
+
+
+_COMPARISON_OPS = {
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<>": operator.ne,
+}
+
+_AGGREGATE_COND_RE = re.compile(
+    r"^\s*(any|all|mean|min|max|sum|median|p\d+(?:\.\d+)?)\s*(<=|>=|==|!=|<>|<|>)\s*(.+)$",
+    re.IGNORECASE,
+)
+
+
+def _normalize_query(query):
+    """Convert a high-level query into a hashable key, or None if it
+    contains values (e.g., callables) that cannot be compared."""
+    if isinstance(query, dict):
+        items = []
+        for k, v in sorted(query.items(), key=lambda kv: str(kv[0])):
+            v = _normalize_query(v)
+            if v is None:
+                return None
+            items.append((k, v))
+        return ("dict", tuple(items))
+    if isinstance(query, (list, tuple)):
+        items = tuple(_normalize_query(v) for v in query)
+        if any(v is None for v in items):
+            return None
+        return (type(query).__name__, items)
+    if isinstance(query, (str, Real)):
+        return query
+    return None
+
+
+def _normalize_cypher(query):
+    """Collapse whitespace outside of the quoted strings of a Cypher query."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', query)
+    for i in range(0, len(parts), 2):
+        parts[i] = " ".join(parts[i].split())
+    return "".join(parts).strip()
+
+
+def _row_node(df_row):
+    """Return the node of a row passed to a query filter."""
+    if isinstance(df_row, DataFrame):
+        return df_row.index.get_level_values("node")[0]
+    return df_row.name
+
+
+class AggregateFilter(object):
+    """Query filter comparing a metric aggregated over the ranks and threads
+    of each node.
+
+    The comparison is evaluated for every node at once by ``prepare``, using
+    a groupby over the ``node`` level of the dataframe index. Calling the
+    filter on a row then only looks up the precomputed result.
+    """
+
+    def __init__(self, attr, aggregate, op, value):
+        """Create a new AggregateFilter.
+
+        Arguments:
+            attr (str): name of the metric column
+            aggregate (str): "any" or "all" to compare each rank/thread value,
+                or "mean", "min", "max", "sum", "median" or "p<N>" (e.g., "p95")
+                to compare the aggregated value
+            op (str): comparison operator (e.g., ">", "<=", "==")
+            value (float): value to compare against
+        """
+        aggregate = aggregate.lower()
+        if aggregate not in ("any", "all", "mean", "min", "max", "sum", "median"):
+            match = re.match(r"p(\d+(?:\.\d+)?)\Z", aggregate)
+            if match is None or float(match.group(1)) > 100:
+                raise InvalidQueryFilter(
+                    "Unknown aggregation for attribute {}: {}".format(attr, aggregate)
+                )
+        if op not in _COMPARISON_OPS:
+            raise InvalidQueryFilter(
+                "Unknown comparison operator for attribute {}: {}".format(attr, op)
+            )
+        self.attr = attr
+        self.aggregate = aggregate
+        self.op = op
+        self.value = value
+        self.node_results = {}
+
+    @staticmethod
+    def from_string(attr, cond):
+        """Build a filter from a string such as ``"p95 > 5"``, or return None
+        if the string is not an aggregated comparison."""
+        match = _AGGREGATE_COND_RE.match(cond)
+        if match is None:
+            return None
+        value = match.group(3).strip()
+        if value.startswith("np."):
+            value = value[3:]
+        try:
+            value = float(value)
+        except ValueError:
+            raise InvalidQueryFilter(
+                "Value of an aggregated filter on {} must be a number: {}".format(
+                    attr, cond
+                )
+            )
+        return AggregateFilter(attr, match.group(1), match.group(2), value)
+
+    def prepare(self, gf):
+        """Evaluate the filter for every node of a GraphFrame.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame the query is applied to.
+        """
+        if self.attr not in gf.dataframe.columns:
+            raise InvalidQueryFilter(
+                "Cannot aggregate missing column: {}".format(self.attr)
+            )
+        compare = _COMPARISON_OPS[self.op]
+        values = gf.dataframe[self.attr]
+        if self.aggregate in ("any", "all"):
+            by_node = compare(values, self.value).groupby(level="node")
+            result = getattr(by_node, self.aggregate)()
+        else:
+            by_node = values.groupby(level="node")
+            if self.aggregate.startswith("p"):
+                aggregated = by_node.quantile(float(self.aggregate[1:]) / 100)
+            else:
+                aggregated = by_node.agg(self.aggregate)
+            result = compare(aggregated, self.value)
+        self.node_results = result.to_dict()
+
+    def __call__(self, df_row):
+        return bool(self.node_results.get(_row_node(df_row), False))
+
+
 class AbstractQuery(ABC):
     """Abstract Base Class defining a Hatchet Query"""
 
@@ -44,6 +194,22 @@ class AbstractQuery(ABC):
         """
         pass
 
+    def apply_mask(self, gf):
+        """Apply the query to a GraphFrame and return the result as a mask.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame on which to apply the query.
+
+        Returns:
+            (numpy.ndarray): A boolean array indexed by ``_hatchet_nid`` that is True for every matched node.
+        """
+        return _nodes_to_mask(self.apply(gf), gf)
+
+    def _cache_key(self):
+        """Hashable description of the query used to cache its results in
+        the GraphFrame, or None if the results must not be cached."""
+        return None
+
     def __and__(self, other):
         """Create an AndQuery with this query and another.
 
@@ -117,11 +283,11 @@ class NaryQuery(AbstractQuery):
         """Perform the NaryQuery subclass's designated operation on the results of the subqueries.
 
         Arguments:
-            query_results (list): the results of the subqueries.
+            query_results (list): the results of the subqueries as boolean masks indexed by ``_hatchet_nid``.
             gf (GraphFrame): the GraphFrame on which the query is applied.
 
         Returns:
-            (list): A list of nodes representing the result of applying the subclass-designated operation to the results of the subqueries.
+            (numpy.ndarray): A boolean mask representing the result of applying the subclass-designated operation to the results of the subqueries.
         """
         pass
 
@@ -134,10 +300,36 @@ class NaryQuery(AbstractQuery):
         Returns:
             (list): A list of nodes representing the result of applying the subclass-designated operation to the results of the subqueries.
         """
+        return _mask_to_nodes(self.apply_mask(gf), gf)
+
+    def apply_mask(self, gf):
+        """Apply the NaryQuery to a GraphFrame and return the result as a mask.
+
+        Subquery results are combined as boolean masks, so each compound
+        operation is a single vectorized operation over all nodes.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame on which to apply the query.
+
+        Returns:
+            (numpy.ndarray): A boolean array indexed by ``_hatchet_nid`` that is True for every node in the result.
+        """
+        key = self._cache_key()
+        cached = gf._cached_query(key)
+        if cached is not None:
+            return cached.copy()
         results = []
         for query in self.subqueries:
-            results.append(query.apply(gf))
-        return self._perform_nary_op(results, gf)
+            results.append(query.apply_mask(gf))
+        mask = self._perform_nary_op(results, gf)
+        gf._cache_query(key, mask.copy())
+        return mask
+
+    def _cache_key(self):
+        keys = tuple(query._cache_key() for query in self.subqueries)
+        if any(k is None for k in keys):
+            return None
+        return (type(self).__name__, keys)
 
 
 class QueryMatcher(AbstractQuery):
@@ -152,6 +344,26 @@ class QueryMatcher(AbstractQuery):
         # Initialize containers for query and memoization cache.
         self.query_pattern = []
         self.search_cache = {}
+        self.subtree_match_index = {}
+        # Filters on aggregated metrics, evaluated once per apply.
+        self.aggregate_filters = []
+        # Optional bound on the number of matches and their ordering.
+        self.max_results = None
+        self.order_by = None
+        self.ascending = True
+        self._found = {}
+        # Indices of the query nodes whose nodes are returned and whose
+        # values order the matches (None for all of them).
+        self.return_indices = None
+        self.order_indices = None
+        # Default scope of the query (see apply), and the scope in use.
+        self.scope_root = None
+        self.scope_min_depth = None
+        self.scope_max_depth = None
+        self._scope = None
+        self._scope_reached = None
+        # Normalized source of the query, if it can identify its results.
+        self._source_key = None
         # If a high-level API list is provided, process it.
         if query is not None:
             assert isinstance(query, list)
@@ -169,6 +381,39 @@ class QueryMatcher(AbstractQuery):
                 #       once Python 2.7 support is dropped.
                 first_no_drop_indices = {"val": True}
 
+                # Split off conditions on metrics aggregated over ranks and
+                # threads, e.g. {"time": {"max": "> 5"}} or an AggregateFilter.
+                aggregate_filters = []
+                plain_filter = {}
+                for k, v in attr_filter.items():
+                    if isinstance(v, dict):
+                        for agg, conds in v.items():
+                            if isinstance(conds, (str, Real)):
+                                conds = [conds]
+                            for cond in conds:
+                                if isinstance(cond, Real):
+                                    aggregate_filters.append(
+                                        AggregateFilter(k, agg, "==", cond)
+                                    )
+                                    continue
+                                agg_filter = AggregateFilter.from_string(
+                                    k, "{} {}".format(agg, cond)
+                                )
+                                if agg_filter is None:
+                                    raise InvalidQueryFilter(
+                                        "Aggregated filter on {} must be a number or a string starting with a comparison operator.".format(
+                                            k
+                                        )
+                                    )
+                                aggregate_filters.append(agg_filter)
+                        continue
+                    if isinstance(v, AggregateFilter):
+                        aggregate_filters.append(v)
+                        continue
+                    plain_filter[k] = v
+                self.aggregate_filters.extend(aggregate_filters)
+                attr_filter = plain_filter
+
                 def filter_series(df_row):
                     def filter_single_series(df_row, key, single_value):
                         if key == "depth":
@@ -384,6 +629,13 @@ class QueryMatcher(AbstractQuery):
                         return filter_dframe(df_row)
                     return filter_series(df_row)
 
+                def filter_aggregates(df_row):
+                    if not all(f(df_row) for f in aggregate_filters):
+                        return False
+                    return attr_filter == {} or filter_choice(df_row)
+
+                if len(aggregate_filters) > 0:
+                    return filter_aggregates
                 return filter_choice if attr_filter != {} else lambda row: True
 
             for elem in query:
@@ -403,6 +655,7 @@ class QueryMatcher(AbstractQuery):
                     raise InvalidQueryPath(
                         "A query path must be a list containing String, Integer, Dict, or Tuple elements"
                     )
+            self._source_key = _normalize_query(query)
 
     def match(self, wildcard_spec=".", filter_func=lambda row: True):
         """Start a query with a root node described by the arguments.
@@ -416,6 +669,8 @@ class QueryMatcher(AbstractQuery):
         """
         if len(self.query_pattern) != 0:
             self.query_pattern = []
+            self.aggregate_filters = []
+        self._source_key = None
         self._add_node(wildcard_spec, filter_func)
         return self
 
@@ -429,28 +684,311 @@ class QueryMatcher(AbstractQuery):
         Returns:
             (QueryMatcher): The instance of the class that called this function (enables fluent design).
         """
+        self._source_key = None
         self._add_node(wildcard_spec, filter_func)
         return self
 
-    def apply(self, gf):
+    def limit(self, max_results, order_by=None, ascending=True):
+        """Bound the number of matches whose nodes the query returns.
+
+        A match is a path matching the whole query, so the nodes of at most
+        ``max_results`` complete paths are returned. Without ``order_by``,
+        the traversal stops as soon as ``max_results`` matches have been
+        found. With ``order_by``, all matches are collected and ordered by
+        the value of the metric at their last node, smallest first (or
+        largest first if not ``ascending``, as with ORDER BY ... DESC in
+        Cypher queries). Metric values are averaged over ranks and threads,
+        and nodes with NaN values come last.
+
+        Arguments:
+            max_results (int): maximum number of matches to return
+            order_by (str, optional): metric column used to order the matches
+            ascending (bool, optional): keep the smallest values (default) instead of the largest
+
+        Returns:
+            (QueryMatcher): The instance of the class that called this function (enables fluent design).
+        """
+        if not isinstance(max_results, int) or max_results < 0:
+            raise InvalidQueryPath("A query limit must be a non-negative integer")
+        self.max_results = max_results
+        self.order_by = order_by
+        self.ascending = ascending
+        return self
+
+    def apply(self, gf, root=None, min_depth=None, max_depth=None):
         """Apply the query to a GraphFrame.
 
+        The query can be restricted to the subgraph rooted at ``root`` and
+        to nodes whose depth is within ``[min_depth, max_depth]``. Matched
+        paths only contain nodes within this scope, and the traversal does
+        not visit nodes outside of it.
+
         Arguments:
             gf (GraphFrame): the GraphFrame on which to apply the query.
+            root (Node or int, optional): only match nodes in the subgraph rooted at this node (or node ID)
+            min_depth (int, optional): only match nodes at this depth or deeper
+            max_depth (int, optional): only match nodes at this depth or shallower
 
         Returns:
             (list): A list representing the set of nodes from paths that match this query.
         """
+        key = self._cache_key()
+        if key is not None:
+            if isinstance(root, Node):
+                root = root._hatchet_nid
+            key = (key, root, min_depth, max_depth)
+        cached = gf._cached_query(key)
+        if cached is not None:
+            return list(cached)
+        matched_node_set = self._apply(gf, root, min_depth, max_depth)
+        gf._cache_query(key, tuple(matched_node_set))
+        return matched_node_set
+
+    def _cache_key(self):
+        if self._source_key is None:
+            return None
+        return (
+            type(self).__name__,
+            self._source_key,
+            self.max_results,
+            self.order_by,
+            self.ascending,
+            self.return_indices,
+            self.order_indices,
+            self.scope_root,
+            self.scope_min_depth,
+            self.scope_max_depth,
+        )
+
+    def _apply(self, gf, root, min_depth, max_depth):
+        """Apply the query to a GraphFrame without using cached results.
+
+        See ``apply`` for the arguments.
+        """
         self.search_cache = {}
+        self._found = {}
+        self._scope_reached = None
+        self._scope = self._resolve_scope(
+            gf,
+            root if root is not None else self.scope_root,
+            min_depth if min_depth is not None else self.scope_min_depth,
+            max_depth if max_depth is not None else self.scope_max_depth,
+        )
+        if self.max_results == 0:
+            return []
+        for agg_filter in self.aggregate_filters:
+            agg_filter.prepare(gf)
+        self._index_subtree_matches(gf)
         matches = []
         visited = set()
-        for root in sorted(gf.graph.roots, key=traversal_order):
-            self._apply_impl(gf, root, visited, matches)
-        assert len(visited) == len(gf.graph)
+        if self._scope is not None and self._scope[0] is not None:
+            roots = [self._scope[0]]
+        else:
+            roots = sorted(gf.graph.roots, key=traversal_order)
+        for root in roots:
+            if self._apply_impl(gf, root, visited, matches):
+                break
+        if self._stops_early():
+            # matches were collected in traversal order while searching
+            return self._match_nodes(list(self._found)[: self.max_results])
+        assert self._scope is not None or len(visited) == len(gf.graph)
+        if self.max_results is not None:
+            found = {}
+            for path in matches:
+                match, order_node = self._project(path)
+                if match:
+                    found.setdefault(match, []).append(order_node)
+            return self._match_nodes(self._top_matches(gf, found))
+        if self.return_indices is not None:
+            matches = (self._project(path)[0] for path in matches)
         matched_node_set = list(set().union(*matches))
         # return matches
         return matched_node_set
 
+    def _resolve_scope(self, gf, root, min_depth, max_depth):
+        """Check the scope arguments of apply.
+
+        Returns:
+            (tuple): (root node, min depth, max depth), or None if the query is not scoped.
+        """
+        if root is None and min_depth is None and max_depth is None:
+            return None
+        if root is not None:
+            table = gf.graph.node_table()
+            nid = root if isinstance(root, Integral) else root._hatchet_nid
+            if not (0 <= nid < len(table)) or table[nid] is None:
+                raise InvalidQueryPath("Query root is not a node of the graph")
+            if isinstance(root, Node) and table[nid] is not root:
+                raise InvalidQueryPath("Query root is not a node of the graph")
+            root = table[nid]
+        return (root, min_depth, max_depth)
+
+    def _in_scope(self, gf, node):
+        """Check if node is within the scope the query is applied to."""
+        if self._scope is None:
+            return True
+        root, min_depth, max_depth = self._scope
+        if min_depth is not None and node._depth < min_depth:
+            return False
+        if max_depth is not None and node._depth > max_depth:
+            return False
+        if root is None or node is root:
+            return True
+        _, entry, exit, _, _, is_forest = gf.graph._interval_index()
+        position = entry[node._hatchet_nid]
+        if is_forest:
+            return entry[root._hatchet_nid] < position < exit[root._hatchet_nid]
+        return bool(self._scope_reach(gf)[position])
+
+    def _scope_reach(self, gf):
+        """Mask of the preorder positions reachable from the scope's root.
+
+        It is computed once per ``apply``, so that checking the scope of a
+        node in a DAG is a lookup.
+        """
+        if self._scope_reached is None:
+            self._scope_reached = gf.graph._reachable_positions(self._scope[0])
+        return self._scope_reached
+
+    def _scope_positions(self, gf):
+        """Preorder positions of the subgraph the query is applied to.
+
+        Depth bounds are not applied. Without a root this is the whole
+        preorder, and on trees the subtree of the root is a single range.
+        """
+        order, entry, exit, _, _, is_forest = gf.graph._interval_index()
+        if self._scope is None or self._scope[0] is None:
+            return np.arange(len(order))
+        nid = self._scope[0]._hatchet_nid
+        if is_forest:
+            return np.arange(entry[nid], exit[nid])
+        return np.flatnonzero(self._scope_reach(gf))
+
+    def _stops_early(self):
+        """Whether the traversal can stop once enough nodes are found."""
+        return self.max_results is not None and self.order_by is None
+
+    def _top_matches(self, gf, found):
+        """Keep the first max_results matches according to order_by.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame being queried.
+            found (dict): the nodes that order each match, by match.
+
+        Returns:
+            (list): at most max_results of the matches.
+        """
+        if self.order_by is None:
+            return list(found)[: self.max_results]
+        if self.order_by not in gf.dataframe.columns:
+            raise InvalidQueryFilter(
+                "Cannot order query results by missing column: {}".format(self.order_by)
+            )
+        values = gf.dataframe[self.order_by]
+        if isinstance(gf.dataframe.index, MultiIndex):
+            values = values.groupby(level="node").mean()
+        missing = np.inf if self.ascending else -np.inf
+        values = values.fillna(missing).to_dict()
+        best = min if self.ascending else max
+        keys = {
+            match: best(values.get(n, missing) for n in nodes)
+            for match, nodes in found.items()
+        }
+        select = heapq.nsmallest if self.ascending else heapq.nlargest
+        return select(self.max_results, keys, key=keys.get)
+
+    @staticmethod
+    def _match_nodes(matches):
+        """The distinct nodes of a list of matches, in order."""
+        return list(dict.fromkeys(node for match in matches for node in match))
+
+    def _project(self, path):
+        """Project a matched path onto the returned query nodes.
+
+        Arguments:
+            path (list): the nodes of a path that matches the query.
+
+        Returns:
+            (tuple): the returned nodes of the path, and the node whose value
+                orders the match (None if the match has no such node).
+        """
+        if self.return_indices is None and self.order_indices is None:
+            return tuple(path), path[-1]
+        query_nodes = self._path_query_nodes(path)
+        match = tuple(path)
+        if self.return_indices is not None:
+            match = tuple(
+                node
+                for node, indices in zip(path, query_nodes)
+                if indices & self.return_indices
+            )
+        if self.order_indices is None:
+            return match, match[-1] if match else None
+        order_nodes = [
+            node
+            for node, indices in zip(path, query_nodes)
+            if indices & self.order_indices
+        ]
+        return match, order_nodes[-1] if order_nodes else None
+
+    def _path_query_nodes(self, path):
+        """Find the query nodes that each node of a matched path stands for.
+
+        A path matches the query if it splits into consecutive segments, one
+        per query node, whose nodes all satisfy the query node's filter,
+        with one node for ".", at least one for "+" and any number for "*".
+        A node stands for a query node if some such split puts it in that
+        query node's segment.
+
+        Arguments:
+            path (list): the nodes of a path that matches the query.
+
+        Returns:
+            (list): the set of query node indices of each node of the path.
+        """
+        pattern = self.query_pattern
+        num_nodes = len(path)
+        fits = [
+            [i in self.search_cache.get(node._hatchet_nid, ()) for node in path]
+            for i in range(len(pattern))
+        ]
+        # before[i][j]: the first i query nodes can match the first j nodes
+        # of the path; after[i][j]: the query nodes from i on can match the
+        # nodes of the path from j on
+        before = [[False] * (num_nodes + 1) for _ in range(len(pattern) + 1)]
+        after = [[False] * (num_nodes + 1) for _ in range(len(pattern) + 1)]
+        before[0][0] = True
+        after[len(pattern)][num_nodes] = True
+        # ends[i][j] (starts[i][j]): a segment of query node i can end
+        # (start) at node j of the path
+        ends = [[False] * num_nodes for _ in pattern]
+        starts = [[False] * num_nodes for _ in pattern]
+        for i, (wcard, _) in enumerate(pattern):
+            for j in range(num_nodes):
+                ends[i][j] = fits[i][j] and (
+                    before[i][j] or (wcard != "." and j > 0 and ends[i][j - 1])
+                )
+                before[i + 1][j + 1] = ends[i][j]
+            if wcard == "*":
+                before[i + 1] = [a or b for a, b in zip(before[i + 1], before[i])]
+        for i in reversed(range(len(pattern))):
+            wcard = pattern[i][0]
+            for j in reversed(range(num_nodes)):
+                starts[i][j] = fits[i][j] and (
+                    after[i + 1][j + 1]
+                    or (wcard != "." and j + 1 < num_nodes and starts[i][j + 1])
+                )
+                after[i][j] = starts[i][j]
+            if wcard == "*":
+                after[i] = [a or b for a, b in zip(after[i], after[i + 1])]
+        if not before[len(pattern)][num_nodes]:
+            # not expected for paths found by the matcher
+            return [set(range(len(pattern))) for _ in path]
+        return [
+            set(i for i in range(len(pattern)) if ends[i][j] and starts[i][j])
+            for j in range(num_nodes)
+        ]
+
     def _add_node(self, wildcard_spec=".", filter_func=lambda row: True):
         """Add a node to the query.
         Arguments:
@@ -459,6 +997,8 @@ class QueryMatcher(AbstractQuery):
         """
         assert isinstance(wildcard_spec, int) or isinstance(wildcard_spec, str)
         assert callable(filter_func)
+        if isinstance(filter_func, AggregateFilter):
+            self.aggregate_filters.append(filter_func)
         if isinstance(wildcard_spec, int):
             for i in range(wildcard_spec):
                 self.query_pattern.append((".", filter_func))
@@ -475,6 +1015,10 @@ class QueryMatcher(AbstractQuery):
         """
         assert isinstance(node, Node)
         matches = []
+        if not self._in_scope(gf, node):
+            # nodes outside the scope of the query match nothing
+            self.search_cache[node._hatchet_nid] = matches
+            return
         # Applies each filtering function to the node to cache which
         # query nodes the current node matches.
         for i, node_query in enumerate(self.query_pattern):
@@ -488,6 +1032,110 @@ class QueryMatcher(AbstractQuery):
                 matches.append(i)
         self.search_cache[node._hatchet_nid] = matches
 
+    def _index_subtree_matches(self, gf):
+        """Index which subtrees contain a match for each query node after a wildcard.
+
+        For each query node that follows a "*" or "+" wildcard, the index
+        lets the wildcard matchers skip subtrees in which the pattern cannot
+        continue. Building it caches every node in the scope of the query,
+        which the traversal in ``apply`` visits anyway unless the query can
+        stop early. Such queries are not indexed, so that their predicates
+        are only evaluated for the nodes the traversal reaches.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame being queried.
+        """
+        self.subtree_match_index = {}
+        targets = [
+            i
+            for i in range(1, len(self.query_pattern))
+            if self.query_pattern[i - 1][0] in ("*", "+")
+        ]
+        if not targets or self._stops_early():
+            return
+        order, entry, exit, extra_src, extra_dst, is_forest = gf.graph._interval_index()
+        if not is_forest and np.any(
+            (extra_dst <= extra_src) & (extra_src < exit[order[extra_dst]])
+        ):
+            # cycles have no reverse topological order; skip the index
+            return
+        # only the nodes in the scope of the query are indexed
+        positions = self._scope_positions(gf)
+        table = gf.graph.node_table()
+        for nid in order[positions]:
+            if nid not in self.search_cache:
+                self._cache_node(gf, table[nid])
+        if not is_forest:
+            # a node's descendants finish before it in a depth-first search
+            positions = positions[np.lexsort((-positions, exit[order[positions]]))]
+        for idx in targets:
+            hits = np.fromiter(
+                (idx in self.search_cache[nid] for nid in order[positions]),
+                dtype=bool,
+                count=len(positions),
+            )
+            if is_forest:
+                # preorder prefix counts of the matching nodes, from the
+                # first position in the scope
+                counts = np.concatenate(([0], np.cumsum(hits)))
+                offset = positions[0] if len(positions) else 0
+                self.subtree_match_index[idx] = (offset, counts)
+            else:
+                self.subtree_match_index[idx] = self._descendant_hits(
+                    gf, hits, positions
+                )
+
+    @staticmethod
+    def _descendant_hits(gf, hits, postorder):
+        """Mark the preorder positions of the nodes with a matching descendant.
+
+        Nodes are visited in reverse topological order, so that each node
+        only looks at its children.
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame being queried.
+            hits (numpy.ndarray): whether each node of postorder matches.
+            postorder (numpy.ndarray): the preorder positions in postorder,
+                closed under descendants.
+
+        Returns:
+            (numpy.ndarray): whether each preorder position has a matching descendant.
+        """
+        order, entry = gf.graph._interval_index()[:2]
+        table = gf.graph.node_table()
+        matched = np.zeros(len(order), dtype=bool)
+        matched[postorder] = hits
+        below = np.zeros(len(order), dtype=bool)
+        for position in postorder:
+            below[position] = any(
+                matched[entry[child._hatchet_nid]] or below[entry[child._hatchet_nid]]
+                for child in table[order[position]].children
+            )
+        return below
+
+    def _subtree_has_match(self, gf, node, idx):
+        """Check if any descendant of node can match query node idx.
+
+        Always True when no index was built for idx (e.g., outside ``apply``).
+
+        Arguments:
+            gf (GraphFrame): the GraphFrame being queried.
+            node (Node): the root of the subtree to check (excluded from the check).
+            idx (int): the index of the query node.
+        """
+        index = self.subtree_match_index.get(idx)
+        if index is None:
+            return True
+        _, entry, exit, _, _, is_forest = gf.graph._interval_index()
+        start = entry[node._hatchet_nid]
+        if is_forest:
+            offset, counts = index
+            if not offset <= start < offset + len(counts) - 1:
+                # nodes outside the scope have no matches
+                return False
+            return counts[exit[node._hatchet_nid] - offset] > counts[start + 1 - offset]
+        return bool(index[start])
+
     def _match_0_or_more(self, gf, node, wcard_idx):
         """Process a "*" wildcard in the query on a subgraph.
 
@@ -515,6 +1163,9 @@ class QueryMatcher(AbstractQuery):
                 if wcard_idx == len(self.query_pattern) - 1:
                     return [[node]]
                 return None
+            # Stop early if nothing below this node matches the next query node.
+            if not self._subtree_has_match(gf, node, wcard_idx + 1):
+                return None
             for child in sorted(node.children, key=traversal_order):
                 sub_match = self._match_0_or_more(gf, child, wcard_idx)
                 if sub_match is not None:
@@ -552,6 +1203,8 @@ class QueryMatcher(AbstractQuery):
         # current node has no children.
         if len(node.children) == 0:
             return None
+        if not self._subtree_has_match(gf, node, wcard_idx + 1):
+            return None
         # Use _match_0_or_more to collect all additional wildcard matches.
         matches = []
         for child in sorted(node.children, key=traversal_order):
@@ -677,11 +1330,21 @@ class QueryMatcher(AbstractQuery):
             node (Node): the root node of the subgraph that is being queried.
             visited (set): a set that keeps track of what nodes have been visited in the traversal to minimize the amount of work that is repeated.
             matches (list): the list in which the final set of matches are stored.
+
+        Returns:
+            (bool): True if enough matches were found to stop the traversal.
         """
         # If the node has already been visited (or is None for some
         # reason), skip it.
         if node is None or node._hatchet_nid in visited:
-            return
+            return False
+        # Nodes below the maximum depth of the scope cannot match.
+        if (
+            self._scope is not None
+            and self._scope[2] is not None
+            and node._depth > self._scope[2]
+        ):
+            return False
         # Cache the node if it's not already cached
         if node._hatchet_nid not in self.search_cache:
             self._cache_node(gf, node)
@@ -699,13 +1362,23 @@ class QueryMatcher(AbstractQuery):
                 matches.extend(sub_match)
         # Note that the node is now visited.
         visited.add(node._hatchet_nid)
+        if self._stops_early():
+            for path in matches:
+                match = self._project(path)[0]
+                if match:
+                    self._found.setdefault(match, None)
+            del matches[:]
+            if len(self._found) >= self.max_results:
+                return True
         # Continue the Depth First Search.
         for child in sorted(node.children, key=traversal_order):
-            self._apply_impl(gf, child, visited, matches)
+            if self._apply_impl(gf, child, visited, matches):
+                return True
+        return False
 
 
-GRAMMAR = """
-FullQuery: path_expr=MatchExpr(cond_expr=WhereExpr)?;
+GRAMMAR = r"""
+FullQuery: path_expr=MatchExpr(cond_expr=WhereExpr)?(scope_expr=ScopeExpr)?(ret_expr=ReturnExpr)?;
 MatchExpr: 'MATCH' path=PathQuery;
 PathQuery: '(' nodes=NodeExpr ')'('->' '(' nodes=NodeExpr ')')*;
 NodeExpr: ((wcard=INT | wcard=STRING) ',' name=ID) | (wcard=INT | wcard=STRING) |  name=ID;
@@ -717,7 +1390,10 @@ AndCond: 'AND' subcond=UnaryCond;
 OrCond: 'OR' subcond=UnaryCond;
 UnaryCond: NotCond | SingleCond;
 NotCond: 'NOT' subcond=SingleCond;
-SingleCond: StringCond | NumberCond | NoneCond | NotNoneCond;
+SingleCond: AggregateCond | StringCond | NumberCond | NoneCond | NotNoneCond;
+AggregateCond: agg=Aggregate '(' name=ID '.' prop=STRING ')' op=CompOp val=NUMBER;
+Aggregate: 'ANY' | 'ALL' | 'MEAN' | 'MIN' | 'MAX' | 'SUM' | 'MEDIAN' | /P\d+(\.\d+)?/;
+CompOp: '<=' | '>=' | '<>' | '!=' | '=' | '<' | '>';
 NoneCond: name=ID '.' prop=STRING 'IS NONE';
 NotNoneCond: name=ID '.' prop=STRING 'IS NOT NONE';
 StringCond: StringEq | StringStartsWith | StringEndsWith | StringContains | StringMatch;
@@ -736,6 +1412,14 @@ NumNan: name=ID '.' prop=STRING 'IS NAN';
 NumNotNan: name=ID '.' prop=STRING 'IS NOT NAN';
 NumInf: name=ID '.' prop=STRING 'IS INF';
 NumNotInf: name=ID '.' prop=STRING 'IS NOT INF';
+ScopeExpr: 'WITHIN' clauses+=ScopeClause[','];
+ScopeClause: RootClause | DepthClause;
+RootClause: 'ROOT' node_id=INT;
+DepthClause: 'DEPTH' op=DepthOp depth=INT;
+DepthOp: '>=' | '<=' | '=';
+ReturnExpr: 'RETURN' name=ID (order=OrderExpr)? (limit=LimitExpr)?;
+OrderExpr: 'ORDER BY' name=ID '.' prop=STRING (direction='DESC' | direction='ASC')?;
+LimitExpr: 'LIMIT' val=INT;
 """
 
 mm = metamodel_from_str(GRAMMAR)
@@ -775,13 +1459,63 @@ class CypherQuery(QueryMatcher):
         self.wcard_pos = {}
         self._parse_path(model.path_expr)
         self.filters = [[] for _ in self.wcards]
-        self._parse_conditions(model.cond_expr)
+        if model.cond_expr is not None:
+            self._parse_conditions(model.cond_expr)
         self.lambda_filters = [None for _ in self.wcards]
         self._build_lambdas()
         self._build_query()
+        self._source_key = _normalize_cypher(cypher_query)
+        if model.scope_expr is not None:
+            self._parse_scope(model.scope_expr)
+        if model.ret_expr is not None:
+            self._parse_return(model.ret_expr)
+
+    def _parse_scope(self, scope_expr):
+        for clause in scope_expr.clauses:
+            if cname(clause) == "RootClause":
+                self.scope_root = clause.node_id
+            elif clause.op == "=":
+                self.scope_min_depth = clause.depth
+                self.scope_max_depth = clause.depth
+            elif clause.op == ">=":
+                self.scope_min_depth = clause.depth
+            else:
+                self.scope_max_depth = clause.depth
+
+    def _parse_return(self, ret_expr):
+        names = [ret_expr.name]
+        if ret_expr.order is not None:
+            names.append(ret_expr.order.name)
+        for name in names:
+            if name not in self.wcard_pos:
+                raise InvalidQueryPath(
+                    "Undefined node name in RETURN clause: {}".format(name)
+                )
+        # only the nodes of the returned name are returned
+        self.return_indices = self._query_indices(ret_expr.name)
+        if len(self.return_indices) == len(self.query_pattern):
+            self.return_indices = None
+        if ret_expr.limit is None and ret_expr.order is None:
+            return
+        order_by = None
+        ascending = True
+        if ret_expr.order is not None:
+            order_by = ret_expr.order.prop
+            ascending = ret_expr.order.direction != "DESC"
+            self.order_indices = self._query_indices(ret_expr.order.name)
+        max_results = sys.maxsize
+        if ret_expr.limit is not None:
+            max_results = ret_expr.limit.val
+        self.limit(max_results, order_by, ascending)
+
+    def _query_indices(self, name):
+        """The indices in query_pattern of the query nodes of a name."""
+        return frozenset(self.wcard_indices[self.wcard_pos[name]])
 
     def _build_query(self):
+        self.wcard_indices = []
         for i in range(0, len(self.wcards)):
+            start = len(self.query_pattern)
             wcard = self.wcards[i][0]
             # TODO Remove this when Python 2.7 support is dropped.
             if sys.version_info[0] == 2 and not isinstance(wcard, Real):
@@ -793,26 +1527,31 @@ class CypherQuery(QueryMatcher):
                 else:
                     self.rel(wildcard_spec=wcard)
             else:
+                # aggregated conditions refer to their filter objects by name
+                filt_globals = dict(globals(), aggregate_filters=self.aggregate_filters)
                 if i == 0:
-                    self.match(wildcard_spec=wcard, filter_func=eval(filt_str))
+                    self.match(
+                        wildcard_spec=wcard, filter_func=eval(filt_str, filt_globals)
+                    )
                 else:
-                    self.rel(wildcard_spec=wcard, filter_func=eval(filt_str))
+                    self.rel(
+                        wildcard_spec=wcard, filter_func=eval(filt_str, filt_globals)
+                    )
+            self.wcard_indices.append(range(start, len(self.query_pattern)))
 
     def _build_lambdas(self):
         for i in range(0, len(self.wcards)):
             n = self.wcards[i]
-            if n[1] != "":
+            if n[1] != "" and len(self.filters[i]) > 0:
                 bool_expr = ""
-                type_check = ""
-                for j, cond in enumerate(self.filters[i]):
+                type_checks = []
+                for cond in self.filters[i]:
                     if cond[0] is not None:
                         bool_expr += " {}".format(cond[0])
                     bool_expr += " {}".format(cond[1])
                     if cond[2] is not None:
-                        if j == 0:
-                            type_check += " {}".format(cond[2])
-                        else:
-                            type_check += " and {}".format(cond[2])
+                        type_checks.append(cond[2])
+                type_check = " and ".join(type_checks)
                 bool_expr = "lambda df_row: {}".format(bool_expr)
                 bool_expr = (
                     'lambda df_row: filter_check_types("{}", df_row, {})'.format(
@@ -856,7 +1595,7 @@ class CypherQuery(QueryMatcher):
             cname(obj) == "NotCond"
             or self._is_str_cond(obj)
             or self._is_num_cond(obj)
-            or cname(obj) in ["NoneCond", "NotNoneCond"]
+            or cname(obj) in ["NoneCond", "NotNoneCond", "AggregateCond"]
         ):
             return True
         return False
@@ -894,6 +1633,8 @@ class CypherQuery(QueryMatcher):
         return converted_subcond
 
     def _parse_single_cond(self, obj):
+        if cname(obj) == "AggregateCond":
+            return self._parse_aggregate(obj)
         if self._is_str_cond(obj):
             return self._parse_str(obj)
         if self._is_num_cond(obj):
@@ -904,6 +1645,16 @@ class CypherQuery(QueryMatcher):
             return self._parse_not_none(obj)
         raise RuntimeError("Bad Single Condition")
 
+    def _parse_aggregate(self, obj):
+        agg_filter = AggregateFilter(obj.prop, obj.agg, obj.op, obj.val)
+        self.aggregate_filters.append(agg_filter)
+        return [
+            None,
+            obj.name,
+            "aggregate_filters[{}](df_row)".format(len(self.aggregate_filters) - 1),
+            None,
+        ]
+
     def _parse_none(self, obj):
         if obj.prop == "depth":
             return [
@@ -1272,10 +2023,9 @@ class AndQuery(NaryQuery):
             gf (GraphFrame): the GraphFrame on which the query is applied.
 
         Returns:
-            (list): A list of nodes representing the intersection of the results of the subqueries.
+            (numpy.ndarray): A boolean mask representing the intersection of the results of the subqueries.
         """
-        intersection_set = set(query_results[0]).intersection(*query_results[1:])
-        return list(intersection_set)
+        return np.logical_and.reduce(query_results)
 
 
 """Alias of AndQuery to signify the relationship to set Intersection"""
@@ -1307,10 +2057,9 @@ class OrQuery(NaryQuery):
             gf (GraphFrame): the GraphFrame on which the query is applied.
 
         Returns:
-            (list): A list of nodes representing the union of the results of the subqueries.
+            (numpy.ndarray): A boolean mask representing the union of the results of the subqueries.
         """
-        union_set = set().union(*query_results)
-        return list(union_set)
+        return np.logical_or.reduce(query_results)
 
 
 """Alias of OrQuery to signify the relationship to set Union"""
@@ -1342,12 +2091,9 @@ class XorQuery(NaryQuery):
             gf (GraphFrame): the GraphFrame on which the query is applied.
 
         Returns:
-            (list): A list of nodes representing the symmetric difference of the results of the subqueries.
+            (numpy.ndarray): A boolean mask representing the symmetric difference of the results of the subqueries.
         """
-        xor_set = set()
-        for res in query_results:
-            xor_set = xor_set.symmetric_difference(set(res))
-        return list(xor_set)
+        return np.logical_xor.reduce(query_results)
 
 
 """Alias of XorQuery to signify the relationship to set Symmetric Difference"""
@@ -1379,11 +2125,9 @@ class NotQuery(NaryQuery):
             gf (GraphFrame): the GraphFrame on which the query is applied.
 
         Returns:
-            (list): A list of all nodes not found in the subquery.
+            (numpy.ndarray): A boolean mask of all nodes not found in the subquery.
         """
-        nodes = set(gf.graph.traverse())
-        query_nodes = set(query_results[0])
-        return list(nodes.difference(query_nodes))
+        return ~query_results[0] & gf.graph.node_mask()
 
 
 class InvalidQueryPath(Exception):
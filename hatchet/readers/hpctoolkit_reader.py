@@ -36,6 +36,7 @@ import hatchet.graphframe
 from hatchet.node import Node
 from hatchet.graph import Graph
 from hatchet.util.timer import Timer
+from hatchet.util.sketch import QuantileSketch
 from hatchet.frame import Frame
 
 
@@ -93,10 +94,16 @@ class HPCToolkitReader:
     metric-db files.
     """
 
-    def __init__(self, dir_name):
+    def __init__(self, dir_name, sketch_size=None):
         # this is the name of the HPCToolkit database directory. The directory
         # contains an experiment.xml and some metric-db files
         self.dir_name = dir_name
+        # if given, the metric-db files are folded into quantile sketches of
+        # this size as they are read, instead of being kept in memory
+        self.sketch_size = sketch_size
+        # (nid, parent nid) of the statement nodes, whose exclusive metric
+        # values are subtracted from their parents' values
+        self.statement_nids = []
 
         root = ET.parse(self.dir_name + "/experiment.xml").getroot()
         self.loadmodule_table = next(root.iter("LoadModuleTable"))
@@ -207,16 +214,7 @@ class HPCToolkitReader:
             pool.close()
 
         # once all files have been read, create a dataframe of metrics
-        metric_names = [
-            self.metric_names[key] for key in sorted(self.metric_names.keys())
-        ]
-        for idx, name in enumerate(metric_names):
-            if name == "CPUTIME (usec) (E)" or name == "CPUTIME (sec) (E)":
-                metric_names[idx] = "time"
-            if name == "CPUTIME (usec) (I)" or name == "CPUTIME (sec) (I)":
-                metric_names[idx] = "time (inc)"
-
-        self.metric_columns = metric_names
+        self.metric_columns = self.metric_column_names()
         df_columns = self.metric_columns + ["nid", "rank", "thread"]
         self.df_metrics = pd.DataFrame(self.metrics, columns=df_columns)
         self.df_metrics["nid"] = self.df_metrics["nid"].astype(int, copy=False)
@@ -234,19 +232,87 @@ class HPCToolkitReader:
         # subtract_exclusive_metric_vals/ num nodes is already calculated
         self.total_execution_threads = self.num_threads_per_rank * self.num_ranks
 
+    def metric_column_names(self):
+        """Names of the metric columns, in the order of the metric-db files."""
+        metric_names = [
+            self.metric_names[key] for key in sorted(self.metric_names.keys())
+        ]
+        for idx, name in enumerate(metric_names):
+            if name == "CPUTIME (usec) (E)" or name == "CPUTIME (sec) (E)":
+                metric_names[idx] = "time"
+            if name == "CPUTIME (usec) (I)" or name == "CPUTIME (sec) (I)":
+                metric_names[idx] = "time (inc)"
+        return metric_names
+
+    def sketch_all_metricdb_files(self):
+        """Fold the metric-db files into quantile sketches of each metric.
+
+        The files are read one at a time, so only one process/thread's
+        metrics are in memory at once. Must be called after the calling
+        context tree has been parsed.
+
+        Return:
+            (dict): QuantileSketch of each metric column, keyed by node
+        """
+        metricdb_files = glob.glob(self.dir_name + "/*.metric-db")
+        metricdb_files.sort()
+
+        rows = np.array([node_dict["nid"] for node_dict in self.node_dicts]) - 1
+        exclusive = [
+            i
+            for i, column in enumerate(self.metric_columns)
+            if "(inc)" not in column and "(I)" not in column
+        ]
+        statements = np.array(self.statement_nids, dtype=np.intp).reshape(-1, 2) - 1
+        sketches = [QuantileSketch(self.sketch_size) for _ in self.metric_columns]
+
+        for filename in metricdb_files:
+            with open(filename, "rb") as metricdb:
+                metricdb.seek(32)
+                arr1d = np.fromfile(
+                    metricdb,
+                    dtype=np.dtype(">f8"),
+                    count=self.num_nodes * self.num_metrics,
+                )
+            metrics = arr1d.astype(float).reshape(self.num_nodes, self.num_metrics)
+            # statement nodes are leaves, so their values can be subtracted
+            # from their parents' values all at once
+            exc_metrics = metrics[:, exclusive]
+            np.subtract.at(exc_metrics, statements[:, 1], exc_metrics[statements[:, 0]])
+            metrics[:, exclusive] = exc_metrics
+            for sketch, values in zip(sketches, metrics.T):
+                sketch.update(rows, values[rows])
+
+        # the sketches are keyed by metric-db row while reading
+        nodes = pd.Index(
+            [node_dict["node"] for node_dict in self.node_dicts], name="node"
+        )
+        for sketch in sketches:
+            sketch.keys = nodes
+        return dict(zip(self.metric_columns, sketches))
+
     def read(self):
         """Read the experiment.xml file to extract the calling context tree and create
         a dataframe out of it. Then merge the two dataframes to create the final
         dataframe.
 
+        If ``sketch_size`` was given, the metric-db files are folded into
+        per-node quantile sketches after the tree is parsed, and the
+        dataframe has one row per node with the mean of each metric across
+        processes/threads. The sketches are the ``sketches`` attribute of
+        the GraphFrame.
+
         Return:
             (GraphFrame): new GraphFrame with HPCToolkit data.
         """
         with self.timer.phase("fill tables"):
             self.fill_tables()
 
-        with self.timer.phase("read metric db"):
-            self.read_all_metricdb_files()
+        if self.sketch_size is None:
+            with self.timer.phase("read metric db"):
+                self.read_all_metricdb_files()
+        else:
+            self.metric_columns = self.metric_column_names()
 
         list_roots = []
 
@@ -283,9 +349,10 @@ class HPCToolkitReader:
                 self.parse_xml_children(root, graph_root)
 
             # put updated metrics back in dataframe
-            for i, column in enumerate(self.metric_columns):
-                if "(inc)" not in column and "(I)" not in column:
-                    self.df_metrics[column] = self.np_metrics.T[i]
+            if self.sketch_size is None:
+                for i, column in enumerate(self.metric_columns):
+                    if "(inc)" not in column and "(I)" not in column:
+                        self.df_metrics[column] = self.np_metrics.T[i]
 
         with self.timer.phase("graph construction"):
             graph = Graph(list_roots)
@@ -294,12 +361,25 @@ class HPCToolkitReader:
         # create a dataframe for all the nodes in the graph
         self.df_nodes = pd.DataFrame.from_dict(data=self.node_dicts)
 
+        attributes = None
+        if self.sketch_size is not None:
+            with self.timer.phase("read metric db"):
+                sketches = self.sketch_all_metricdb_files()
+            self.df_metrics = pd.DataFrame(
+                {column: sketch.mean for column, sketch in sketches.items()}
+            )
+            self.df_metrics["nid"] = self.df_nodes["nid"]
+            attributes = {"sketches": sketches}
+
         # merge the metrics and node dataframes
         with self.timer.phase("data frame"):
             dataframe = pd.merge(self.df_metrics, self.df_nodes, on="nid")
 
             # set the index to be a MultiIndex
-            if self.num_threads_per_rank > 1:
+            if self.sketch_size is not None:
+                # ranks and threads are summarized by the sketches
+                indices = ["node"]
+            elif self.num_threads_per_rank > 1:
                 indices = ["node", "rank", "thread"]
             # if number of threads per rank is 1, do not make thread an index
             elif self.num_threads_per_rank == 1:
@@ -316,7 +396,9 @@ class HPCToolkitReader:
             else:
                 exc_metrics.append(column)
 
-        return hatchet.graphframe.GraphFrame(graph, dataframe, exc_metrics, inc_metrics)
+        return hatchet.graphframe.GraphFrame(
+            graph, dataframe, exc_metrics, inc_metrics, attributes=attributes
+        )
 
     def parse_xml_children(self, xml_node, hnode):
         """Parses all children of an XML node."""
@@ -390,15 +472,18 @@ class HPCToolkitReader:
 
             # when we reach statement nodes, we subtract their exclusive
             # metric values from the parent's values
-            for i, column in enumerate(self.metric_columns):
-                if "(inc)" not in column and "(I)" not in column:
-                    _crm.subtract_exclusive_metric_vals(
-                        nid,
-                        parent_nid,
-                        self.np_metrics.T[i],
-                        self.total_execution_threads,
-                        self.num_nodes,
-                    )
+            # (when sketching, as each metric-db file is read)
+            self.statement_nids.append((nid, parent_nid))
+            if self.sketch_size is None:
+                for i, column in enumerate(self.metric_columns):
+                    if "(inc)" not in column and "(I)" not in column:
+                        _crm.subtract_exclusive_metric_vals(
+                            nid,
+                            parent_nid,
+                            self.np_metrics.T[i],
+                            self.total_execution_threads,
+                            self.num_nodes,
+                        )
 
         if xml_tag == "C" or (
             xml_tag == "Pr" and self.procedure_names[xml_node.get("n")] == ""
@@ -5,6 +5,7 @@
 
 import pandas as pd
 import numpy as np
+import pytest
 from hatchet.graphframe import GraphFrame
 from hatchet.chopper import Chopper
 
@@ -32,10 +33,65 @@ def test_flat_profile(calc_pi_hpct_db):
         graphframe.dataframe.loc[another]["time (inc)"].to_numpy()
     )
 
+    # the other columns are kept, with the first value of each group
+    assert list(flat_profile.columns) == [
+        column for column in graphframe.dataframe.columns if column != "name"
+    ]
+    first = graphframe.dataframe.groupby("name")["file"].first()
+    assert flat_profile["file"].equals(first.reindex(flat_profile.index))
+
     # If as_index is False, check if the index is properly numbered
     flat_profile = graphframe.flat_profile(as_index=False)
     assert sorted(flat_profile.index.tolist()) == list(range(len(flat_profile)))
 
+    # One flat profile per rank, which sum to the flat profile of all ranks
+    flat_profile = graphframe.flat_profile()
+    per_rank = graphframe.flat_profile(per_rank=True)
+    assert per_rank.index.names == ["name", "rank"]
+    ranks = graphframe.dataframe.index.unique(level="rank")
+    assert sorted(per_rank.index.unique(level="rank")) == sorted(ranks)
+    assert np.allclose(
+        per_rank["time (inc)"].groupby(level="name").sum() / len(ranks),
+        flat_profile["time (inc)"].reindex(
+            per_rank.index.unique(level="name").sort_values()
+        ),
+    )
+    assert per_rank[graphframe.default_metric].is_monotonic_decreasing
+
+
+def test_to_callgraph_per_rank(calc_pi_hpct_db):
+    """Validate that per-rank call graphs keep the rank index level."""
+
+    graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    callgraph = graphframe.to_callgraph()
+    per_rank = graphframe.to_callgraph(per_rank=True)
+
+    assert per_rank.dataframe.index.names == ["node", "rank"]
+    assert len(per_rank.graph) == len(callgraph.graph)
+    assert list(per_rank.dataframe.columns) == list(callgraph.dataframe.columns)
+
+    # the metrics of each function are summed per rank
+    df = graphframe.dataframe
+    expected = df.groupby(["name", df.index.get_level_values("rank")])["time"].sum()
+    result = per_rank.dataframe.set_index("name", append=True)["time"]
+    result = result.droplevel("node").reorder_levels(["name", "rank"])
+    assert result.sort_index().equals(expected.sort_index())
+
+    # and add up to the call graph over all ranks
+    totals = per_rank.dataframe.groupby("name")["time"].sum()
+    assert totals.sort_index().equals(
+        callgraph.dataframe.set_index("name")["time"].sort_index()
+    )
+
+    # the imbalance of each function can be computed on the call graph
+    imbalance = per_rank.load_imbalance(metric_column="time")
+    assert "time.imbalance" in imbalance.dataframe.columns
+    assert len(imbalance.dataframe) == len(callgraph.dataframe)
+
+    flat = graphframe.flatten("module", per_rank=True)
+    assert flat.dataframe.index.names == ["node", "rank"]
+    assert len(flat.dataframe) == df["module"].nunique() * len(df.index.unique("rank"))
+
 
 def test_load_imbalance(calc_pi_hpct_db):
     """Validate that the load imbalance is calculated correctly."""
@@ -70,6 +126,50 @@ def test_load_imbalance(calc_pi_hpct_db):
     assert another_metric_max_org / another_metric_mean_org == another_imbalance
 
 
+def test_load_imbalance_verbose(calc_pi_hpct_db):
+    """Validate the per-node statistics of verbose load imbalance."""
+
+    graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    load_imb_gf = graphframe.load_imbalance(metric_column="time (inc)", verbose=True)
+    df = load_imb_gf.dataframe
+
+    assert load_imb_gf.default_metric == "time (inc).imbalance"
+    assert "time (inc).max" not in df.columns
+    assert len(df) == len(graphframe.graph)
+    assert load_imb_gf.graph is not graphframe.graph
+    means = df["time (inc).mean"].to_numpy()
+    assert (means[:-1] >= means[1:]).all()
+
+    for name in ["main", "62:MPI_Finalize", "__GI_sched_yield"]:
+        org = graphframe.dataframe[graphframe.dataframe["name"] == name]
+        values = org["time (inc)"].to_numpy()
+        ranks = org.index.get_level_values("rank").to_numpy()
+        row = df[df["name"] == name].iloc[0]
+
+        assert row["time (inc).mean"] == np.mean(values)
+        assert row["time (inc).imbalance"] == np.max(values) / np.mean(values)
+        assert row["time (inc).percentiles"] == [
+            np.percentile(values, q) for q in [0, 25, 50, 75, 100]
+        ]
+        assert list(row["time (inc).ranks"]) == list(
+            ranks[np.argsort(-values, kind="stable")][:5]
+        )
+
+        lo, hi = values.min(), values.max()
+        size = (hi - lo) / 10
+        if size == 0:
+            hist = [len(values)] * 10
+        else:
+            edges = [lo + i * size for i in range(10)] + [hi]
+            hist = [
+                int(((values > edges[i]) & (values <= edges[i + 1])).sum())
+                for i in range(10)
+            ]
+            hist[0] += int((values == lo).sum())
+        assert row["time (inc).hist"] == hist
+        assert sum(hist) == len(values)
+
+
 def test_hot_path(calc_pi_hpct_db):
     """Validate the hot path with known data from HPCToolkit."""
     graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
@@ -101,6 +201,42 @@ def test_hot_path(calc_pi_hpct_db):
     assert len(hot_path) == 2
     assert hot_path[0].frame["name"] == "<program root>"
 
+    # the nodes are those of the GraphFrame, not of a copy
+    hot_path = graphframe.hot_path(metric="time (inc)")
+    assert all(node in graphframe.graph.traverse() for node in hot_path)
+
+    # the hottest of the top-k paths is the hot path
+    hot_path = graphframe.hot_path(metric="time (inc)", threshold=0.1)
+    hot_paths = graphframe.hot_path(metric="time (inc)", threshold=0.1, top_k=3)
+    assert len(hot_paths) == 3
+    assert hot_paths[0] == hot_path
+    values = graphframe.dataframe.groupby(level="node")["time (inc)"].mean()
+    for path in hot_paths:
+        assert path[0] in graphframe.graph.roots
+        for parent, child in zip(path, path[1:]):
+            assert child in parent.children
+    end_values = [values[path[-2]] for path in hot_paths]
+    assert end_values == sorted(end_values, reverse=True)
+
+    # other metrics are also averaged across ranks, not read from rank 0
+    df = graphframe.dataframe
+    df["other"] = df["time (inc)"].where(df.index.get_level_values("rank") != 0, 0)
+    graphframe.update_version()
+    expected = graphframe.deepcopy()
+    expected.exc_metrics.append("other")
+    expected.drop_index_levels()
+    assert [n.frame for n in graphframe.hot_path(metric="other")] == [
+        n.frame for n in expected.hot_path(metric="other")
+    ]
+
+    # the deprecated callpath parameter does not change the result
+    with pytest.warns(DeprecationWarning):
+        path = Chopper().hot_path(graphframe, callpath=[])
+    assert path == graphframe.hot_path()
+    with pytest.warns(DeprecationWarning):
+        path = Chopper().hot_path(graphframe, None, None, 0.5, [])
+    assert path == graphframe.hot_path()
+
 
 def test_multirun_analysis_lulesh(lulesh_caliper_json):
     """Validate that multirun_analysis works correctly with data containing
@@ -205,6 +341,35 @@ def test_multirun_analysis_literal(mock_graph_literal):
     # check if the test and dummy dataframes match
     assert df_test.equals(df_dummy)
 
+    # graphframes can be read one at a time
+    df_iter = Chopper.multirun_analysis(
+        graphframes=(gf for gf in [gf1_copy, gf2_copy, gf4_copy, gf8_copy]),
+        pivot_index="num_processes",
+        columns="name",
+        metric="time",
+        threshold=5.0,
+    )
+    assert df_iter.equals(df_dummy)
+
+
+def test_multirun_analysis_groupby_function(calc_pi_hpct_db):
+    """Validate that groupby_function groups the nodes by name when the
+    pivot table is over another column."""
+    gfs = [GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db)) for _ in range(2)]
+    for num_processes, gf in zip([2, 4], gfs):
+        gf.dataframe["time"] *= num_processes
+        gf.update_metadata(num_processes)
+
+    df_test = Chopper.multirun_analysis(gfs, columns="type", groupby_function="sum")
+
+    for num_processes, gf in zip([2, 4], gfs):
+        by_node = gf.dataframe.groupby(level="node").agg(
+            {"name": "first", "type": "first", "time": "mean"}
+        )
+        by_name = by_node.groupby("name").agg("sum")
+        expected = by_name.groupby("type")["time"].mean()
+        assert np.allclose(df_test.loc[num_processes, expected.index], expected)
+
 
 def test_speedup_eff_analysis_literal(mock_graph_literal):
     """Validate that speedup_efficiency works correctly."""
@@ -251,6 +416,41 @@ def test_speedup_eff_analysis_literal(mock_graph_literal):
     assert eff.iloc[1]["2.time.speedup"] == 2.0
     assert eff.iloc[1]["2.time.efficiency"] == 1.0
 
+    # the graphframes are not modified, and can be read one at a time
+    assert all(
+        gf.dataframe.equals(other.dataframe) for gf, other in zip(gfs[2:], [gf4, gf8])
+    )
+    eff_iter = Chopper.speedup_efficiency(
+        (gf for gf in reversed(gfs)), strong=True, speedup=True, metrics=["time"]
+    )
+    assert eff_iter.equals(
+        Chopper.speedup_efficiency(gfs, strong=True, speedup=True, metrics=["time"])
+    )
+
+
+def test_speedup_eff_analysis_ranks(calc_pi_hpct_db):
+    """Validate that speedup_efficiency averages the ranks of each node."""
+    gf1 = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    gf2 = gf1.deepcopy()
+    ranks = gf2.dataframe.index.get_level_values("rank")
+    gf2.dataframe.loc[ranks == 0, "time"] *= 2
+    gf2.update_version()
+    gf1.update_metadata(4)
+    gf2.update_metadata(8)
+
+    eff = Chopper.speedup_efficiency(
+        [gf1, gf2], strong=True, speedup=True, metrics=["time"]
+    )
+    # the nodes with the same call path are summed
+    means = gf1.dataframe["time"].groupby(level="node").mean()
+    first = gf1.dataframe["time"].xs(0, level="rank").loc[means.index]
+    paths = ["/".join(str(n) for n in node.path()) for node in means.index]
+    means = means.groupby(paths).transform("sum")
+    first = first.groupby(paths).transform("sum")
+    expected = means / (means + first / len(ranks.unique()))
+    assert np.allclose(eff["8.time.speedup"], expected.loc[eff.index], equal_nan=True)
+    assert "name" in eff.columns
+
 
 def test_correlation_analysis_literal(mock_graph_literal):
     """Validate that correlation analysis functions works correctly."""
@@ -261,3 +461,97 @@ def test_correlation_analysis_literal(mock_graph_literal):
         metrics=["time", "time2"], method="spearman"
     )
     assert correlation_matrix.loc["time", "time2"] == 1.0
+
+
+def test_analyze(calc_pi_hpct_db):
+    """Validate that analyze gives the results of the individual analyses."""
+    graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+
+    results = graphframe.analyze(
+        [
+            "flat_profile",
+            ("load_imbalance", {"metric_column": "time (inc)", "verbose": True}),
+            ("hot_path", {"metric": "time (inc)"}),
+            "correlation_analysis",
+        ]
+    )
+    assert sorted(results) == [
+        "correlation_analysis",
+        "flat_profile",
+        "hot_path",
+        "load_imbalance",
+    ]
+    assert results["flat_profile"].equals(graphframe.flat_profile())
+    load_imb = graphframe.load_imbalance(metric_column="time (inc)", verbose=True)
+
+    # the nodes of the two results are different copies of the graph
+    def rows(gf):
+        return sorted(map(str, gf.dataframe.itertuples(index=False)))
+
+    assert rows(results["load_imbalance"]) == rows(load_imb)
+    assert results["hot_path"] == graphframe.hot_path(metric="time (inc)")
+    assert results["correlation_analysis"].equals(
+        graphframe.correlation_analysis(metrics=["time", "time (inc)"])
+    )
+
+    # all analyses by default
+    assert len(graphframe.analyze()) == 5
+
+    with pytest.raises(ValueError):
+        graphframe.analyze(["no_such_analysis"])
+
+
+def test_analyze_without_ranks(calc_pi_callgrind_dot):
+    """Validate that the default analyses skip rank outliers without ranks."""
+    graphframe = GraphFrame.from_gprof_dot(str(calc_pi_callgrind_dot))
+    assert "rank" not in graphframe.dataframe.index.names
+
+    results = graphframe.analyze()
+    assert sorted(results) == [
+        "correlation_analysis",
+        "flat_profile",
+        "hot_path",
+        "load_imbalance",
+    ]
+    assert results["hot_path"] == graphframe.hot_path()
+
+
+def test_rank_outliers(mock_graph_literal):
+    """Validate outlier scores and clusters of ranks."""
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    nodes = list(gf.graph.traverse())
+
+    # two groups of ranks with different times, and one rank that is slow
+    # in a single node
+    rows = []
+    for rank in range(40):
+        for i, node in enumerate(nodes):
+            time = 10.0 * (i + 1) + rank % 5 + (100.0 if rank >= 20 else 0.0)
+            if rank == 7 and i == 3:
+                time = 5000.0
+            rows.append((node, rank, time))
+    dataframe = pd.DataFrame(rows, columns=["node", "rank", "time"])
+    graphframe = GraphFrame(
+        gf.graph, dataframe.set_index(["node", "rank"]), ["time"], []
+    )
+
+    for method in ["mad", "zscore"]:
+        outliers = graphframe.rank_outliers(method=method, num_clusters=3)
+        assert outliers.index.tolist() == list(range(40))
+        assert outliers.index[outliers["outlier"]].tolist() == [7]
+        assert outliers.loc[7, "node"] == nodes[3]
+        assert outliers.loc[7, "metric"] == "time"
+        assert outliers.loc[7, "num_outliers"] == 1
+
+        # the slow rank and each group of ranks are clusters
+        clusters = outliers["cluster"]
+        assert clusters[7] not in set(clusters[:7]) | set(clusters[20:])
+        assert len(set(clusters[:7]) | set(clusters[8:20])) == 1
+        assert len(set(clusters[20:])) == 1
+        assert clusters[0] != clusters[20]
+
+    # processing the matrix in small blocks gives the same result
+    small_blocks = graphframe.rank_outliers(num_clusters=3, chunk_size=50)
+    assert small_blocks[["score", "num_outliers"]].equals(
+        graphframe.rank_outliers(num_clusters=3)[["score", "num_outliers"]]
+    )
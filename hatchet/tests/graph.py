@@ -89,3 +89,48 @@ def test_trees_are_trees():
         ("a", ("b", "e", "f", "g"), ("c", "e", "f", "g"), ("d", "e", "f", "g"))
     )
     assert g.is_tree()
+
+
+def test_descendants_tree():
+    graph = Graph.from_lists(("a", ("b", "d", "e"), ("c", "f", ("g", "h"))))
+    nodes = {n.frame["name"]: n for n in graph.traverse()}
+
+    assert [n.frame["name"] for n in graph.descendants(nodes["a"])] == [
+        "b",
+        "d",
+        "e",
+        "c",
+        "f",
+        "g",
+        "h",
+    ]
+    assert [n.frame["name"] for n in graph.descendants(nodes["c"])] == ["f", "g", "h"]
+    assert graph.descendants(nodes["h"]) == []
+
+    assert graph.is_ancestor(nodes["a"], nodes["h"])
+    assert graph.is_ancestor(nodes["c"], nodes["h"])
+    assert not graph.is_ancestor(nodes["b"], nodes["h"])
+    assert not graph.is_ancestor(nodes["h"], nodes["c"])
+    assert not graph.is_ancestor(nodes["c"], nodes["c"])
+
+
+def test_descendants_dag():
+    d = Node(Frame(name="d"))
+    e = Node.from_lists(("e", "f"))
+    graph = Graph.from_lists(("a", ("b", d), ("c", (d, e))), ("g", e))
+    nodes = {n.frame["name"]: n for n in graph.traverse()}
+
+    assert sorted(n.frame["name"] for n in graph.descendants(nodes["b"])) == [
+        "d",
+        "e",
+        "f",
+    ]
+    assert sorted(n.frame["name"] for n in graph.descendants(nodes["g"])) == [
+        "e",
+        "f",
+    ]
+    assert graph.is_ancestor(nodes["b"], nodes["f"])
+    assert graph.is_ancestor(nodes["c"], nodes["e"])
+    assert graph.is_ancestor(nodes["g"], nodes["f"])
+    assert not graph.is_ancestor(nodes["g"], nodes["d"])
+    assert not graph.is_ancestor(nodes["d"], nodes["b"])
@@ -23,6 +23,47 @@ def test_graphframe_to_literal(mock_graph_literal):
     assert len(test_literal_output.graph) == len(gf.graph)
 
 
+def test_graphframe_to_literal_lod(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    def count(literal):
+        return sum(1 + count(node.get("children", [])) for node in literal)
+
+    def stubs(literal):
+        return [
+            stub
+            for node in literal
+            for stub in ([node] if "stub" in node else [])
+            + stubs(node.get("children", []))
+        ]
+
+    # only the roots and their children
+    graph_literal = gf.to_literal(depth=1)
+    assert [len(root["children"]) for root in graph_literal] == [
+        len(root.children) for root in sorted(gf.graph.roots, key=lambda n: n.frame)
+    ]
+    assert all("children" not in c for r in graph_literal for c in r["children"])
+    assert count(graph_literal) == 6
+    assert sum(stub["stub"] for stub in stubs(graph_literal)) == 7
+
+    # the heaviest nodes are expanded first, within the node budget
+    graph_literal = gf.to_literal(max_nodes=10)
+    assert count(graph_literal) <= 10
+    foo = graph_literal[0]
+    assert foo["name"] == "foo" and "children" in foo
+    expanded = [c["name"] for c in foo["children"] if "children" in c]
+    assert expanded == ["qux", "waldo"]
+
+    # a stub can be fetched on its own
+    stub = stubs(graph_literal)[0]
+    node = gf.graph.node_table()[stub["metrics"]["_hatchet_nid"]]
+    subtree_literal = gf.subtree(node).to_literal()
+    assert len(subtree_literal[0]["children"]) == stub["stub"]
+
+    # without a budget the literal is complete
+    assert count(gf.to_literal(depth=100)) == len(gf.graph)
+
+
 def test_with_duplicates(mock_graph_literal_duplicates):
     gf = GraphFrame.from_literal(mock_graph_literal_duplicates)
 
@@ -7,6 +7,8 @@
 
 from __future__ import division
 
+import io
+import json
 import os
 
 import pytest
@@ -47,6 +49,135 @@ def test_deepcopy(mock_graph_literal):
     assert gf.metadata == other.metadata
 
 
+def test_subtree(calc_pi_hpct_db):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    root = gf.graph.roots[0]
+    node = root.children[0]
+    nodes = [node] + gf.graph.descendants(node)
+
+    view = gf.subtree(node)
+    assert view.graph.roots == [node]
+    assert list(view.graph.traverse()) == list(node.traverse())
+    assert view.dataframe.equals(
+        gf.dataframe[gf.dataframe.index.get_level_values("node").isin(nodes)]
+    )
+    assert np.shares_memory(view.dataframe["time"].values, gf.dataframe["time"].values)
+
+    # the view cannot renumber the parent's nodes
+    nids = [n._hatchet_nid for n in gf.graph.traverse()]
+    with pytest.raises(ValueError):
+        view.graph.enumerate_traverse()
+    copy = view.deepcopy()
+    assert copy.graph.roots[0]._hatchet_nid == 0
+    assert copy.graph.roots[0].parents == []
+    assert [n._hatchet_nid for n in gf.graph.traverse()] == nids
+
+    # in-place operations on the view leave the parent untouched
+    expected = gf.dataframe["time (inc)"].copy()
+    view.subtree_sum(["time"], ["time (inc)"])
+    assert gf.dataframe["time (inc)"].equals(expected)
+    assert view.graph.roots[0] is not node
+    assert view.graph.roots[0]._hatchet_nid == node._hatchet_nid
+    assert not np.shares_memory(
+        view.dataframe["time"].values, gf.dataframe["time"].values
+    )
+    view.graph.enumerate_traverse()
+    assert [n._hatchet_nid for n in gf.graph.traverse()] == nids
+
+    shallow = gf.subtree(root, depth=1)
+    assert len(shallow.graph) == 1 + len(root.children)
+    assert sorted(n._hatchet_nid for n in shallow.graph.traverse()) == sorted(
+        n._hatchet_nid for n in [root] + root.children
+    )
+    assert all(
+        n in shallow.graph.roots[0].children
+        for n in shallow.dataframe.index.get_level_values("node")
+        if n is not shallow.graph.roots[0]
+    )
+
+
+def test_query_cache(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    query = [{"name": "foo"}, "*", {"time (inc)": "> 5"}]
+
+    version = gf.version
+    first = gf.filter(query, squash=False)
+    assert len(gf._query_cache) == 1
+    # equivalent queries reuse the cached result
+    second = gf.filter(list(query), squash=False)
+    assert len(gf._query_cache) == 1
+    assert first.dataframe.equals(second.dataframe)
+    assert gf.version == version
+
+    matches = QueryMatcher(query).apply(gf)
+    assert sorted(matches) == sorted(first.dataframe.index)
+
+    cypher = """MATCH (".", p)->("*")->(".", q) WHERE p."name" = "foo" """
+    gf.filter(cypher, squash=False)
+    assert len(gf._query_cache) == 2
+    gf.filter(" ".join(cypher.split()).replace("->", "\n  ->"), squash=False)
+    assert len(gf._query_cache) == 3
+    gf.filter(cypher.replace(" WHERE", "\n    WHERE"), squash=False)
+    assert len(gf._query_cache) == 3
+
+    # low-level queries with callables are not cached
+    QueryMatcher().match(".", lambda row: row["name"] == "foo").apply(gf)
+    assert len(gf._query_cache) == 3
+
+    # in-place writes to the dataframe are followed by update_version()
+    gf.dataframe.loc[gf.dataframe["time (inc)"] > 5, "time (inc)"] = 0.0
+    gf.update_version()
+    assert gf.version != version
+    assert len(gf._query_cache) == 0
+    assert len(QueryMatcher(query).apply(gf)) == 0
+
+    assert QueryMatcher(query).apply(gf) == []
+    gf.dataframe["time (inc)"] = 10.0
+    gf.update_version()
+    matches = QueryMatcher(query).apply(gf)
+    assert len(matches) > 0
+    assert sorted(matches) == sorted(QueryMatcher(query)._apply(gf, None, None, None))
+
+    gf.dataframe = gf.dataframe.assign(**{"time (inc)": 10.0})
+    assert len(gf._query_cache) == 0
+    gf.subtree_sum(["time"], ["time (inc)"])
+    assert sorted(QueryMatcher(query).apply(gf)) == sorted(
+        QueryMatcher(query)._apply(gf, None, None, None)
+    )
+
+    # so do edits to the graph's nodes
+    version = gf.version
+    cached = gf.child_order("time (inc)")
+    gf.graph.roots[0].add_child(Node(Frame(name="new"), hnid=len(gf.graph)))
+    gf.update_version()
+    assert gf.version != version
+    assert gf.child_order("time (inc)") is not cached
+
+    # graph methods that renumber or merge nodes update the version
+    version = gf.version
+    gf.graph.enumerate_traverse()
+    assert gf.version != version
+    version = gf.version
+    gf.graph.normalize()
+    assert gf.version != version
+
+
+def test_query_cache_list_columns(calc_pi_hpct_db):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    imbalance = gf.load_imbalance("time", verbose=True)
+    assert isinstance(imbalance.dataframe["time.percentiles"].iloc[0], list)
+
+    # columns of lists do not get in the way of caching queries
+    query = [{"name": "main"}]
+    first = imbalance.filter(query, squash=False)
+    assert len(imbalance._query_cache) == 1
+    assert first.dataframe.equals(imbalance.filter(query, squash=False).dataframe)
+    imbalance.filter("""MATCH (".", p) WHERE p."name" = "main" """, squash=False)
+    assert len(imbalance._query_cache) == 2
+    imbalance.hot_path()
+    imbalance.tree(sort_by="time.imbalance")
+
+
 def test_drop_index_levels(calc_pi_hpct_db):
     gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
     num_nodes = len(gf.graph)
@@ -813,6 +944,112 @@ def test_to_dot(mock_graph_literal):
         for child in node.children:
             assert '"%s" -> "%s"' % (node._hatchet_nid, child._hatchet_nid) in output
 
+    # nodes are colored from light to dark red by metric value
+    times = gf.dataframe["time"]
+    assert output.count('color="#67000d"') == (times == times.max()).sum()
+    assert output.count('color="#fff5f0"') == (times == times.min()).sum()
+
+    # only nodes (and edges to nodes) above the threshold are shown
+    output = gf.to_dot(metric="time (inc)", threshold=0.2)
+    visible = gf.dataframe["time (inc)"] >= 0.2 * gf.dataframe["time (inc)"].max()
+    assert output.count("shape=oval") == visible.sum()
+    for node in gf.graph.traverse():
+        shown = '"%s" [color=' % node._hatchet_nid in output
+        assert shown == visible[node]
+        assert ('-> "%s"' % node._hatchet_nid in output) == (
+            visible[node] and bool(node.parents)
+        )
+
+
+def test_to_flamegraph(mock_graph_literal, calc_pi_hpct_db):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    lines = gf.to_flamegraph(metric="time").splitlines()
+    assert len(lines) == len(gf.graph)
+    assert lines[0] == "foo 0.0"
+    assert "foo; bar; baz 5.0" in lines
+
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    folded = gf.to_flamegraph(metric="time", function=np.sum)
+    totals = gf.dataframe.groupby(level="node")["time"].sum()
+    for node, line in zip(gf.graph.traverse(), folded.splitlines()):
+        stack, value = line.rsplit(" ", 1)
+        assert stack.split("; ")[-1] == gf.dataframe.loc[(node, 0), "name"]
+        assert float(value) == pytest.approx(totals[node])
+
+
+def test_streaming_output(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    for func in ["tree", "to_dot", "to_flamegraph"]:
+        output = io.StringIO()
+        assert getattr(gf, func)(output=output) is None
+        assert output.getvalue() == getattr(gf, func)()
+
+    output = io.StringIO()
+    assert gf.to_literal(output=output) is None
+    literal = json.loads(output.getvalue())
+    assert literal == json.loads(json.dumps(gf.to_literal()))
+    assert GraphFrame.from_literal(literal).graph == gf.graph
+
+
+def test_to_speedscope(mock_graph_literal, calc_pi_hpct_db):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    output = io.StringIO()
+    gf.to_speedscope(output, metric="time (inc)")
+    speedscope = json.loads(output.getvalue())
+    frames = [f["name"] for f in speedscope["shared"]["frames"]]
+    assert sorted(frames) == sorted(set(gf.dataframe["name"]))
+    (profile,) = speedscope["profiles"]
+    assert profile["type"] == "evented"
+    # the two roots are laid out one after the other
+    assert profile["endValue"] == 165.0
+    opened = [e for e in profile["events"] if e["type"] == "O"]
+    closed = [e for e in profile["events"] if e["type"] == "C"]
+    assert len(opened) == len(closed) == len(gf.graph)
+    assert [e["at"] for e in profile["events"]] == sorted(
+        e["at"] for e in profile["events"]
+    )
+
+    output = io.StringIO()
+    gf.to_speedscope(output, profile_type="sampled")
+    (profile,) = json.loads(output.getvalue())["profiles"]
+    assert sum(profile["weights"]) == gf.dataframe["time"].sum()
+    assert [frames[f] for f in profile["samples"][0]] == ["foo", "bar"]
+
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    output = io.StringIO()
+    gf.to_speedscope(output)
+    profiles = json.loads(output.getvalue())["profiles"]
+    assert len(profiles) == len(gf.dataframe.index.unique(level="rank"))
+
+
+def test_to_chrome_trace(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    output = io.StringIO()
+    gf.to_chrome_trace(output, metric="time (inc)", scale=1.0)
+    events = json.loads(output.getvalue())["traceEvents"]
+    assert len(events) == len(gf.graph)
+    assert events[0] == {
+        "name": "foo",
+        "ph": "X",
+        "ts": 0.0,
+        "dur": 135.0,
+        "pid": 0,
+        "tid": 0,
+    }
+    # the second root starts after the first one
+    assert max(e["ts"] + e["dur"] for e in events) == 165.0
+    assert any(e["name"] == "waldo" and e["ts"] == 135.0 for e in events)
+
+    # recorded start times (in nanoseconds) are used when available
+    gf.dataframe["ts"] = np.arange(len(gf.dataframe)) * 1000
+    output = io.StringIO()
+    gf.to_chrome_trace(output, metric="time (inc)", scale=1.0)
+    events = json.loads(output.getvalue())["traceEvents"]
+    assert [e["ts"] for e in events] == list(np.arange(len(gf.dataframe)))
+
 
 def test_unify_multiple_graphframes():
     tuple1 = ["a", ("b", "c"), ("d", "e")]
@@ -1078,6 +1315,38 @@ def test_groupby_aggregate_more_complex(mock_dag_literal_module_more_complex):
     assert len(out_gf.graph) == len(modules)
 
 
+def test_groupby_aggregate_name(mock_graph_literal, calc_pi_hpct_db):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    out_gf = gf.to_callgraph()
+
+    names = gf.dataframe["name"].unique()
+    assert len(out_gf.graph) == len(names)
+    assert sorted(out_gf.dataframe["name"]) == sorted(names)
+    # one edge per pair of distinct caller and callee names
+    edges = set(
+        (parent.frame["name"], child.frame["name"])
+        for node in gf.graph.traverse()
+        for parent in [node]
+        for child in node.children
+        if parent.frame["name"] != child.frame["name"]
+    )
+    out_edges = [
+        (node.frame["name"], child.frame["name"])
+        for node in out_gf.graph.traverse()
+        for child in node.children
+    ]
+    assert sorted(out_edges) == sorted(edges)
+    times = gf.dataframe.groupby("name")["time"].sum()
+    for node, row in out_gf.dataframe.iterrows():
+        assert row["time"] == times[node.frame["name"]]
+
+    # every rank is aggregated into a single row per name
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    out_gf = gf.to_callgraph()
+    assert out_gf.dataframe.index.names == ["node"]
+    assert len(out_gf.dataframe) == gf.dataframe["name"].nunique()
+
+
 def test_depth(mock_graph_literal):
     gf = GraphFrame.from_literal(mock_graph_literal)
 
@@ -1096,6 +1365,105 @@ def test_depth(mock_graph_literal):
     assert max_depth == 5
 
 
+def test_tree_rank(calc_pi_hpct_db):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+
+    output = ConsoleRenderer(unicode=True, color=False).render(
+        gf.graph.roots,
+        gf.dataframe,
+        metric_column="time",
+        precision=1,
+        name_column="name",
+        expand_name=True,
+        context_column="file",
+        rank=1,
+        thread=0,
+        depth=10000,
+        highlight_name=False,
+        colormap="RdYlGn",
+        invert_colormap=False,
+    )
+    for node in gf.graph.traverse():
+        row = gf.dataframe.loc[(node, 1)]
+        assert "{:.1f} {} {}".format(row["time"], row["name"], row["file"]) in output
+
+
+def test_tree_pruning(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    full = gf.tree(metric_column="time")
+    assert "... " not in full
+
+    # children are pruned by inclusive time, "baz" has 5.0
+    output = gf.tree(metric_column="time", threshold=10)
+    assert "baz" not in output
+    assert "plugh" not in output
+    assert "... 1 more (5.000 total)" in output
+    assert "15.000 garply" in output
+
+    # relative to the inclusive time of each root (135.0 and 30.0)
+    output = gf.tree(metric_column="time", threshold=0.35, threshold_relative=True)
+    assert "5.000 fred" not in output
+    assert "10.000 waldo" in output
+    assert "... 2 more (15.000 total)" in output
+
+    output = gf.tree(metric_column="time", max_children=1)
+    assert "0.000 qux" in output
+    assert "─ 0.000 waldo" not in output
+    assert "... 2 more" in output
+
+    output = gf.tree(metric_column="time", max_lines=5)
+    full_lines = [line for line in full.splitlines() if "0 " in line]
+    lines = [line for line in output.splitlines() if "0 " in line]
+    assert [line for line in lines if "more (" not in line] == full_lines[:5]
+    assert output.count(" more (") == 3
+    assert output.rstrip().endswith("... 1 more (30.000 total)")
+
+
+def test_child_order(mock_graph_literal, calc_pi_hpct_db):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    roots, children = gf.child_order("time (inc)")
+    assert [r.frame["name"] for r in roots] == ["foo", "waldo"]
+    for node in gf.graph.traverse():
+        ordered = children.get(node, [])
+        assert sorted(ordered) == sorted(node.children)
+        values = [gf.dataframe.loc[c, "time (inc)"] for c in ordered]
+        assert values == sorted(values, reverse=True)
+    foo = roots[0]
+    assert [c.frame["name"] for c in children[foo]] == ["qux", "waldo", "bar"]
+
+    # only the subtree of node is ordered
+    qux = children[foo][0]
+    sub_roots, sub_children = gf.child_order("time (inc)", node=qux)
+    assert sub_roots == [qux]
+    assert sorted(sub_children) == sorted(
+        n for n in [qux] + gf.graph.descendants(qux) if n.children
+    )
+    assert all(sub_children[n] == children[n] for n in sub_children)
+    with pytest.raises(ValueError):
+        gf.child_order("time (inc)", node=qux.copy())
+
+    # the order is cached until the graphframe changes
+    assert gf.child_order("time (inc)") is gf.child_order("time (inc)")
+    cached = gf.child_order("time (inc)")
+    gf.update_version()
+    assert gf.child_order("time (inc)") is not cached
+
+    output = gf.tree(metric_column="time (inc)", sort_by="time (inc)")
+    assert output.index("60.000 qux") < output.index("55.000 waldo")
+    assert output.index("├─ 55.000 waldo") < output.index("└─ 20.000 bar")
+
+    literal = gf.to_literal(sort_by="time (inc)")
+    assert [c["name"] for c in literal[0]["children"]] == ["qux", "waldo", "bar"]
+
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    roots, children = gf.child_order("time", rank=1)
+    for parent, ordered in children.items():
+        values = [gf.dataframe.loc[(c, 1), "time"] for c in ordered]
+        assert values == sorted(values, reverse=True)
+
+
 def test_tree_deprecated_parameters(mock_graph_literal):
     gf = GraphFrame.from_literal(mock_graph_literal)
 
@@ -0,0 +1,92 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hatchet import GraphFrame
+from hatchet.frame import Frame
+from hatchet.graph import Graph
+from hatchet.node import Node
+from hatchet.util.profile_index import ProfileIndex, profile_vector
+
+
+def test_profile_vector(calc_pi_hpct_db, mock_graph_literal):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    vector = profile_vector(gf, dim=1024)
+    assert vector.shape == (1024,)
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+
+    # the vector depends on the call paths and their proportions only
+    scaled = gf.deepcopy()
+    scaled.dataframe["time (inc)"] *= 3
+    scaled.update_version()
+    assert np.allclose(profile_vector(scaled, dim=1024), vector)
+
+    other = GraphFrame.from_literal(mock_graph_literal)
+    assert abs(float(profile_vector(other, dim=1024) @ vector)) < 0.5
+
+
+def test_profile_vector_dag():
+    def diamonds(num_diamonds):
+        # a -> (b, c) -> a -> ... has 2**num_diamonds paths to the last node
+        top = Node(Frame(name="a"))
+        nodes = [top]
+        for _ in range(num_diamonds):
+            bottom = Node(Frame(name="a"))
+            for name in ["b", "c"]:
+                middle = Node(Frame(name=name), parent=top)
+                top.add_child(middle)
+                middle.add_child(bottom)
+                bottom.add_parent(middle)
+                nodes.append(middle)
+            nodes.append(bottom)
+            top = bottom
+        graph = Graph([nodes[0]])
+        graph.enumerate_traverse()
+        dataframe = pd.DataFrame(
+            {"name": [n.frame["name"] for n in nodes], "time (inc)": 1.0},
+            index=pd.Index(nodes, name="node"),
+        )
+        return GraphFrame(graph, dataframe, [], ["time (inc)"])
+
+    # every node is hashed once, however many paths lead to it
+    gf = diamonds(40)
+    vector = profile_vector(gf, dim=2**16)
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.count_nonzero(vector) <= len(gf.graph)
+    assert np.allclose(profile_vector(diamonds(40), dim=2**16), vector)
+    assert float(profile_vector(diamonds(39), dim=2**16) @ vector) < 1.0
+
+
+def test_profile_index(
+    tmpdir, calc_pi_hpct_db, lulesh_caliper_json, mock_graph_literal
+):
+    gfs = [
+        GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db)),
+        GraphFrame.from_caliper(str(lulesh_caliper_json)),
+        GraphFrame.from_literal(mock_graph_literal),
+    ]
+    path = str(tmpdir.join("index"))
+    index = ProfileIndex(path, dim=1024)
+    # enough runs to grow the vectors file
+    index.extend(
+        (gf for _ in range(7) for gf in gfs), labels=["hpct", "cali", "lit"] * 7
+    )
+    assert len(index) == 21
+
+    # reopen from disk, and compare blocks of 5 stored vectors at a time
+    index = ProfileIndex(path)
+    assert index.dim == 1024
+    neighbors = index.query(gfs, k=3, batch_size=5)
+    assert neighbors.index.names == ["query", "neighbor"]
+    for query, label in enumerate(["hpct", "cali", "lit"]):
+        assert (neighbors.loc[query, "label"] == label).all()
+        assert np.allclose(neighbors.loc[query, "similarity"], 1.0)
+        assert (neighbors.loc[query, "position"] % 3 == query).all()
+
+    with pytest.raises(ValueError):
+        ProfileIndex(path, dim=2048)
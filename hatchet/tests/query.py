@@ -8,9 +8,12 @@ import pytest
 import re
 
 import numpy as np
+import pandas as pd
 
 from hatchet import GraphFrame
-from hatchet.node import traversal_order
+from hatchet.frame import Frame
+from hatchet.graph import Graph
+from hatchet.node import Node, traversal_order
 from hatchet.query import (
     QueryMatcher,
     InvalidQueryFilter,
@@ -23,7 +26,9 @@ from hatchet.query import (
     IntersectionQuery,
     UnionQuery,
     SymDifferenceQuery,
+    NotQuery,
     CypherQuery,
+    AggregateFilter,
 )
 
 
@@ -246,6 +251,49 @@ def test_match_0_or_more_wildcard(mock_graph_literal):
     assert query._match_0_or_more(gf, none_node, 1) is None
 
 
+def test_wildcard_subtree_index(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    path = [{"name": "foo"}, "*", {"name": "gr[a-z]+"}]
+
+    # queries that stop early only evaluate the nodes they reach
+    query = QueryMatcher(path).limit(1)
+    assert len(query.apply(gf)) > 0
+    assert query.subtree_match_index == {}
+    assert len(query.search_cache) < len(gf.graph)
+
+    d = Node(Frame(name="d"))
+    e = Node.from_lists(("e", "f"))
+    graph = Graph.from_lists(("a", ("b", d), ("c", (d, e))), ("g", e))
+    graph.enumerate_traverse()
+    nodes = list(graph.traverse())
+    dataframe = pd.DataFrame(
+        {"node": nodes, "name": [n.frame["name"] for n in nodes], "time": 1.0}
+    ).set_index("node")
+    gf = GraphFrame(graph, dataframe, ["time"], [])
+
+    query = QueryMatcher([{"name": "a"}, "*", {"name": "f"}])
+    matches = query.apply(gf)
+    assert len(query.subtree_match_index) == 1
+    assert sorted(n.frame["name"] for n in matches) == ["a", "b", "c", "d", "e", "f"]
+    assert QueryMatcher([{"name": "c"}, "+", {"name": "b"}]).apply(gf) == []
+
+    # scopes in DAGs include the nodes reachable through shared children
+    b = graph.roots[0].children[0]
+    assert sorted(n.frame["name"] for n in QueryMatcher(["*"]).apply(gf, root=b)) == [
+        "b",
+        "d",
+        "e",
+        "f",
+    ]
+    query = QueryMatcher([{"name": "b|g"}, "*", {"name": "f"}])
+    assert sorted(n.frame["name"] for n in query.apply(gf, root=b)) == [
+        "b",
+        "d",
+        "e",
+        "f",
+    ]
+
+
 def test_match_1_or_more_wildcard(mock_graph_literal):
     path = [
         {"name": "qux"},
@@ -891,6 +939,149 @@ def test_sym_diff_query(mock_graph_literal):
     assert sorted(compound_query.apply(gf)) == sorted(matches)
 
 
+def test_not_query(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    query = [("*", {"time (inc)": ">= 20"})]
+    compound_query = NotQuery(query)
+    matched = set(QueryMatcher(query).apply(gf))
+    matches = [n for n in gf.graph.traverse() if n not in matched]
+    assert sorted(compound_query.apply(gf)) == sorted(matches)
+    assert sorted((~QueryMatcher(query)).apply(gf)) == sorted(matches)
+
+
+def test_compound_query_mask(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    query1 = QueryMatcher([("*", {"time (inc)": [">= 5.0", "<= 10.0"]})])
+    query2 = QueryMatcher([("*", {"time (inc)": 10.0})])
+
+    mask1 = query1.apply_mask(gf)
+    mask2 = query2.apply_mask(gf)
+    assert mask1.dtype == bool
+    assert len(mask1) == len(gf.graph)
+    assert sorted(np.flatnonzero(mask1)) == sorted(
+        n._hatchet_nid for n in query1.apply(gf)
+    )
+
+    assert np.array_equal((query1 & query2).apply_mask(gf), mask1 & mask2)
+    assert np.array_equal((query1 | query2).apply_mask(gf), mask1 | mask2)
+    assert np.array_equal((query1 ^ query2).apply_mask(gf), mask1 ^ mask2)
+    assert np.array_equal((~query1).apply_mask(gf), ~mask1)
+
+    filtered_gf = gf.filter(query1 ^ query2, squash=False)
+    assert sorted(filtered_gf.dataframe.index) == sorted((query1 ^ query2).apply(gf))
+
+
+def test_query_limit(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    all_nodes = QueryMatcher([(".", {"time (inc)": "> 0"})]).apply(gf)
+
+    query = QueryMatcher([(".", {"time (inc)": "> 0"})]).limit(3)
+    matches = query.apply(gf)
+    assert len(matches) == 3
+    assert all(n in all_nodes for n in matches)
+    # the traversal stops after the first matches in DFS order
+    assert matches == list(gf.graph.roots[0].traverse())[:3]
+
+    query = QueryMatcher([(".", {"time (inc)": "> 0"})]).limit(
+        4, order_by="time (inc)", ascending=False
+    )
+    expected = gf.dataframe.loc[all_nodes, "time (inc)"].nlargest(4).values
+    assert sorted(gf.dataframe.loc[query.apply(gf), "time (inc)"].values) == sorted(
+        expected
+    )
+
+    # matches are ordered by their smallest values by default
+    query = QueryMatcher([(".", {"time (inc)": "> 0"})]).limit(2, order_by="time")
+    expected = gf.dataframe.loc[all_nodes, "time"].nsmallest(2).values
+    assert sorted(gf.dataframe.loc[query.apply(gf), "time"].values) == sorted(expected)
+
+    # the limit counts whole matches, not nodes
+    matches = QueryMatcher(["*"]).limit(1).apply(gf)
+    assert len(matches) > 1
+    assert all(child in parent.children for parent, child in zip(matches, matches[1:]))
+    assert matches[-1].children == []
+
+    assert QueryMatcher(["*"]).limit(0).apply(gf) == []
+    assert sorted(QueryMatcher(["*"]).limit(1000).apply(gf)) == sorted(
+        QueryMatcher(["*"]).apply(gf)
+    )
+    with pytest.raises(InvalidQueryPath):
+        QueryMatcher(["*"]).limit(-1)
+
+
+def test_high_level_aggregate_filters(calc_pi_hpct_db):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    by_node = gf.dataframe["time"].groupby(level="node")
+
+    def expected(result):
+        return sorted(result[result].index)
+
+    query = QueryMatcher([("*", {"time": {"max": "> 20000"}})])
+    assert sorted(query.apply(gf)) == expected(by_node.max() > 20000)
+
+    query = QueryMatcher([("*", {"time": {"all": "> 0"}})])
+    assert sorted(query.apply(gf)) == expected(
+        (gf.dataframe["time"] > 0).groupby(level="node").all()
+    )
+
+    query = QueryMatcher([("*", {"time": {"p95": ">= 40000", "mean": "> 10"}})])
+    assert sorted(query.apply(gf)) == expected(
+        (by_node.quantile(0.95) >= 40000) & (by_node.mean() > 10)
+    )
+
+    any_filter = AggregateFilter("time", "any", ">", 20000)
+    query = QueryMatcher([("*", {"time": any_filter, "name": "interp.*"})])
+    assert query.apply(gf) == [
+        n
+        for n in expected(by_node.max() > 20000)
+        if gf.dataframe.loc[n, "name"].iloc[0].startswith("interp")
+    ]
+
+    with pytest.raises(InvalidQueryFilter):
+        QueryMatcher([("*", {"time": {"p95": "big"}})])
+    with pytest.raises(InvalidQueryFilter):
+        QueryMatcher([("*", {"time": {"mode": "> 5"}})])
+    with pytest.raises(InvalidQueryFilter):
+        QueryMatcher([("*", {"missing": {"max": "> 5"}})]).apply(gf)
+
+    # plain strings are never read as aggregated conditions
+    gf = GraphFrame.from_lists(("max<int>", "any<T>", "b"))
+    root, any_node, _ = gf.graph.traverse()
+    assert QueryMatcher([{"name": "max<.*"}]).apply(gf) == [root]
+    assert QueryMatcher([{"name": "any<T>"}]).apply(gf) == [any_node]
+
+
+def test_apply_scoped(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    root = gf.graph.roots[0].children[0]
+    in_subtree = [root] + gf.graph.descendants(root)
+    path = [{"time (inc)": "> 0"}, "*", {"time": "> 0"}]
+
+    # a scoped query matches the same paths as the query on the subtree
+    query = QueryMatcher(path)
+    expected = QueryMatcher(path).apply(gf.subtree(root))
+    assert sorted(query.apply(gf, root=root)) == sorted(expected)
+    assert sorted(query.apply(gf, root=root._hatchet_nid)) == sorted(expected)
+    assert sorted(query.apply(gf, root=np.int64(root._hatchet_nid))) == sorted(expected)
+    assert all(n in in_subtree for n in expected)
+    # only the subtree is indexed
+    offset, counts = query.subtree_match_index[2]
+    assert len(counts) == len(in_subtree) + 1
+
+    query = QueryMatcher(["*"])
+    assert sorted(query.apply(gf, min_depth=1, max_depth=2)) == sorted(
+        n for n in gf.graph.traverse() if 1 <= n._depth <= 2
+    )
+    assert sorted(query.apply(gf, root=root, max_depth=root._depth + 1)) == sorted(
+        [root] + root.children
+    )
+    # without a scope, the whole graph is matched again
+    assert len(query.apply(gf)) == len(gf.graph)
+
+    with pytest.raises(InvalidQueryPath):
+        query.apply(gf, root=len(gf.graph) + 10)
+
+
 def test_construct_cypher_api():
     mock_node_mpi = {"name": "MPI_Bcast"}
     mock_node_ibv = {"name": "ibv_reg_mr"}
@@ -1249,3 +1440,83 @@ def test_apply_cypher(mock_graph_literal):
     match = [gf.graph.roots[0]]
     query = CypherQuery(path)
     assert query.apply(gf) == match
+
+
+def test_apply_cypher_return_limit(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+
+    query = CypherQuery("""MATCH ("*", p) RETURN p""")
+    assert sorted(query.apply(gf)) == sorted(QueryMatcher(["*"]).apply(gf))
+
+    query = CypherQuery("""MATCH ("*", p) RETURN p LIMIT 5""")
+    assert query.apply(gf) == QueryMatcher(["*"]).limit(5).apply(gf)
+
+    # only the nodes of the returned name are returned and ordered
+    root = gf.graph.roots[0]
+    query = CypherQuery("""MATCH (".", p)->("*")->(".", q)
+        WHERE p."name" = "foo" RETURN q""")
+    assert sorted(query.apply(gf)) == sorted(root.children)
+
+    query = CypherQuery("""MATCH (".", p)->("*")->(".", q)
+        WHERE p."name" = "foo" RETURN q ORDER BY q."time" DESC LIMIT 1""")
+    times = gf.dataframe.loc[root.children, "time"]
+    assert query.apply(gf) == [times.idxmax()]
+
+    query = CypherQuery("""MATCH (".", p)
+        WHERE p."time (inc)" > 0
+        RETURN p ORDER BY p."time (inc)" DESC LIMIT 3""")
+    expected = gf.dataframe["time (inc)"].nlargest(3).values
+    assert sorted(gf.dataframe.loc[query.apply(gf), "time (inc)"].values) == sorted(
+        expected
+    )
+
+    query = CypherQuery("""MATCH (".", p) RETURN p ORDER BY p."time" LIMIT 2""")
+    expected = gf.dataframe["time"].nsmallest(2).values
+    assert sorted(gf.dataframe.loc[query.apply(gf), "time"].values) == sorted(expected)
+
+    with pytest.raises(InvalidQueryPath):
+        CypherQuery("""MATCH ("*", p) RETURN q LIMIT 2""")
+
+
+def test_apply_cypher_aggregate(calc_pi_hpct_db):
+    gf = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    by_node = gf.dataframe["time"].groupby(level="node")
+    max_matches = by_node.max() > 20000
+    max_matches = sorted(max_matches[max_matches].index)
+
+    query = CypherQuery("""MATCH ("*", p) WHERE MAX(p."time") > 20000""")
+    assert sorted(query.apply(gf)) == max_matches
+
+    query = CypherQuery("""MATCH ("*", p)
+        WHERE P95(p."time") >= 40000 AND ALL(p."time") > 0""")
+    result = (by_node.quantile(0.95) >= 40000) & (
+        (gf.dataframe["time"] > 0).groupby(level="node").all()
+    )
+    assert sorted(query.apply(gf)) == sorted(result[result].index)
+
+    query = CypherQuery("""MATCH ("*", p) WHERE NOT MAX(p."time") > 20000""")
+    assert len(query.apply(gf)) == len(gf.graph) - len(max_matches)
+
+
+def test_apply_cypher_scoped(mock_graph_literal):
+    gf = GraphFrame.from_literal(mock_graph_literal)
+    root = gf.graph.roots[0].children[0]
+
+    query = CypherQuery(
+        """MATCH ("*", p) WITHIN ROOT {}, DEPTH <= {}""".format(
+            root._hatchet_nid, root._depth + 1
+        )
+    )
+    assert sorted(query.apply(gf)) == sorted([root] + root.children)
+
+    query = CypherQuery("""MATCH ("*", p) WITHIN DEPTH >= 1, DEPTH <= 2 RETURN p""")
+    assert sorted(query.apply(gf)) == sorted(
+        n for n in gf.graph.traverse() if 1 <= n._depth <= 2
+    )
+
+    query = CypherQuery(
+        """MATCH ("*", p) WHERE p."time" > 0 WITHIN DEPTH = 1 RETURN p LIMIT 2"""
+    )
+    matches = query.apply(gf)
+    assert len(matches) == 2
+    assert all(n._depth == 1 for n in matches)
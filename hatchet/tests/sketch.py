@@ -0,0 +1,118 @@
+# Copyright 2021-2024 University of Maryland and other Hatchet Project
+# Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+
+from hatchet import GraphFrame
+from hatchet.util.sketch import QuantileSketch
+
+
+def test_quantile_sketch(calc_pi_hpct_db):
+    """Validate per-node quantile sketches and merging them."""
+    graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    sketch = graphframe.quantile_sketch("time (inc)")
+    root = graphframe.graph.roots[0]
+    values = graphframe.dataframe.loc[root, "time (inc)"].to_numpy()
+
+    assert len(sketch) == len(graphframe.graph)
+    quantiles = sketch.quantile([0, 0.5, 1]).loc[root]
+    assert quantiles[0] == values.min()
+    assert quantiles[1] == values.max()
+    assert values.min() <= quantiles[0.5] <= values.max()
+    assert sketch.histogram(10).loc[root].sum() == len(values)
+
+    # a large sketch estimates tail quantiles of many values closely
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(size=(4, 20000))
+    keys = np.repeat(["a", "b", "c", "d"], 20000)
+    sketch = QuantileSketch(size=100)
+    for rank in range(20):
+        # add values one "rank" at a time
+        chunk = slice(rank * 1000, (rank + 1) * 1000)
+        sketch.update(keys.reshape(4, -1)[:, chunk].ravel(), values[:, chunk].ravel())
+    estimated = sketch.quantile([0.5, 0.95, 0.99])
+    for i, key in enumerate(["a", "b", "c", "d"]):
+        for q in [0.5, 0.95, 0.99]:
+            rank = np.mean(values[i] <= estimated.loc[key, q])
+            assert abs(rank - q) < 0.005
+
+    # merged sketches keep exact counts, means and extremes
+    first = QuantileSketch.from_values(keys[::2], values.ravel()[::2])
+    second = QuantileSketch.from_values(keys[1::2], values.ravel()[1::2])
+    merged = first.merge(second)
+    assert list(merged.count) == [20000] * 4
+    assert np.allclose(merged.mean, values.mean(axis=1))
+    assert list(merged.max) == list(values.max(axis=1))
+    estimated = merged.quantile(0.99)
+    for i, key in enumerate(["a", "b", "c", "d"]):
+        assert abs(np.mean(values[i] <= estimated.loc[key, 0.99]) - 0.99) < 0.005
+
+
+def test_read_hpctoolkit_sketches(calc_pi_hpct_db):
+    """Validate folding ranks into sketches while reading a database."""
+    exact = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    sketched = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db), sketch=True)
+    metrics = ["time", "time (inc)"]
+
+    # one row per node holding the mean over ranks
+    assert len(sketched.dataframe) == len(sketched.graph)
+    assert sorted(sketched.sketches) == sorted(metrics)
+    grouped = exact.dataframe.groupby("nid")[metrics]
+    means = sketched.dataframe.set_index("nid")[metrics].sort_index()
+    assert np.allclose(means.to_numpy(), grouped.mean().sort_index().to_numpy())
+
+    for metric in metrics:
+        sketch = sketched.quantile_sketch(metric)
+        nids = sketched.dataframe.loc[sketch.keys, "nid"]
+        assert list(sketch.min) == list(grouped.min().loc[nids, metric])
+        assert list(sketch.max) == list(grouped.max().loc[nids, metric])
+        assert set(sketch.count) == {len(exact.dataframe.index.unique("rank"))}
+
+
+def test_sketch_load_imbalance(calc_pi_hpct_db):
+    """Validate load imbalance computed from sketches."""
+    exact = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db))
+    sketched = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db), sketch=True)
+    columns = ["time.mean", "time.imbalance"]
+
+    expected = exact.load_imbalance("time").dataframe
+    expected = expected.set_index("nid")[columns].sort_index()
+    for graphframe in [exact, sketched]:
+        result = graphframe.load_imbalance("time", sketch=True).dataframe
+        result = result.set_index("nid")[columns].sort_index()
+        assert np.allclose(result, expected, equal_nan=True)
+
+    verbose = sketched.load_imbalance("time", verbose=True, sketch=True).dataframe
+    assert "time.hist" in verbose.columns
+    assert "time.percentiles" in verbose.columns
+    assert all(len(hist) == 10 for hist in verbose["time.hist"])
+
+
+def test_sketches_of_derived_graphframes(calc_pi_hpct_db):
+    """Validate that derived graphframes do not reuse another node's sketch."""
+    graphframe = GraphFrame.from_hpctoolkit(str(calc_pi_hpct_db), sketch=True)
+
+    for derived in [
+        graphframe.copy(),
+        graphframe.deepcopy(),
+        graphframe.filter([{"name": "[^<].*"}], squash=False),
+        graphframe.filter([{"name": "[^<].*"}]),
+        graphframe.filter([{"name": "[^<].*"}]).deepcopy(),
+    ]:
+        for metric in ["time", "time (inc)"]:
+            sketch = derived.quantile_sketch(metric)
+            rows = sketch.keys.get_indexer(derived.dataframe.index)
+            assert np.allclose(sketch.mean[rows], derived.dataframe[metric])
+            result = derived.load_imbalance(metric, sketch=True).dataframe
+            means = result.set_index("nid")[metric + ".mean"]
+            expected = derived.dataframe.set_index("nid")[metric]
+            assert np.allclose(means.loc[expected.index], expected)
+
+    # sketches of the unchanged nodes are kept
+    assert graphframe.copy().quantile_sketch("time") is graphframe.sketches["time"]
+    deep = graphframe.deepcopy()
+    assert list(deep.quantile_sketch("time").max) == list(
+        graphframe.sketches["time"].max
+    )
@@ -3,101 +3,189 @@
 #
 # SPDX-License-Identifier: MIT
 
-import matplotlib.cm
-import matplotlib.colors
+import numpy as np
+
+from .node_columns import node_columns
+
+# ColorBrewer's "Reds" scheme, from which matplotlib's Reds colormap is built
+_REDS = (
+    (1.0, 0.9607843137254902, 0.9411764705882353),
+    (0.996078431372549, 0.8784313725490196, 0.8235294117647058),
+    (0.9882352941176471, 0.7333333333333333, 0.6313725490196078),
+    (0.9882352941176471, 0.5725490196078431, 0.4470588235294118),
+    (0.984313725490196, 0.41568627450980394, 0.2901960784313726),
+    (0.9372549019607843, 0.23137254901960785, 0.17254901960784313),
+    (0.796078431372549, 0.09411764705882353, 0.11372549019607843),
+    (0.6470588235294118, 0.058823529411764705, 0.08235294117647057),
+    (0.403921568627451, 0.0, 0.05098039215686274),
+)
+_REDS_N = 256
+_reds_lut = None
+
+
+def _reds_hex(weights):
+    """Hex colors of weights in [0, 1] in the Reds colormap.
+
+    This gives the same colors as ``matplotlib.colors.rgb2hex(
+    matplotlib.cm.Reds(weight))`` without importing matplotlib: weights are
+    binned into a 256-entry lookup table interpolated between the scheme's
+    colors, out-of-range weights get the end colors, and NaN is black.
+    """
+    global _reds_lut
+    if _reds_lut is None:
+        x = np.linspace(0, 1, len(_REDS)) * (_REDS_N - 1)
+        xind = (_REDS_N - 1) * np.linspace(0, 1, _REDS_N)
+        ind = np.searchsorted(x, xind)[1:-1]
+        distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+        channels = []
+        for y in np.array(_REDS).T:
+            lut = distance * (y[ind] - y[ind - 1]) + y[ind - 1]
+            channels.append(np.clip(np.concatenate([[y[0]], lut, [y[-1]]]), 0, 1))
+        rgb = np.round(np.array(channels).T * 255).astype(int)
+        _reds_lut = np.array(
+            ["#{:02x}{:02x}{:02x}".format(*color) for color in rgb] + ["#000000"]
+        )
+
+    weights = np.asarray(weights, dtype=float) * _REDS_N
+    weights[weights == _REDS_N] = _REDS_N - 1
+    with np.errstate(invalid="ignore"):
+        index = np.clip(weights, 0, _REDS_N - 1).astype(int)
+    index[np.isnan(weights)] = _REDS_N
+    return _reds_lut[index]
 
 
 def trees_to_dot(roots, dataframe, metric, name, rank, thread, threshold):
     """Calls to_dot in turn for each tree in the graph/forest."""
-    text = (
+    return "".join(dot_chunks(roots, dataframe, metric, name, rank, thread, threshold))
+
+
+def dot_chunks(roots, dataframe, metric, name, rank, thread, threshold):
+    """Yield the dot output of the graph/forest incrementally.
+
+    The output is the same as trees_to_dot, with all node statements
+    followed by all edge statements.
+    """
+    nodes, edges = _dot_statements(
+        roots, dataframe, metric, name, rank, thread, threshold, set()
+    )
+
+    yield (
         "strict digraph {\n"
         "graph [bgcolor=transparent];\n"
         "node [penwidth=4, shape=circle];\n"
         "edge [penwidth=2];\n\n"
     )
+    yield from nodes
+    yield "\n"
+    yield from edges
+    yield "\n}\n"
 
-    all_nodes = ""
-    all_edges = ""
 
-    # call to_dot for each root in the graph
-    visited = []
-    for root in roots:
-        (nodes, edges) = to_dot(
-            root, dataframe, metric, name, rank, thread, threshold, visited
-        )
-        all_nodes += nodes
-        all_edges += edges
+def to_dot(hnode, dataframe, metric, name, rank, thread, threshold, visited):
+    """Write to graphviz dot format."""
+    nodes, edges = _dot_statements(
+        [hnode], dataframe, metric, name, rank, thread, threshold, visited
+    )
+    return ("".join(nodes), "".join(edges))
+
+
+def _children_csr(roots):
+    """Nodes reachable from roots and their children as a CSR edge list.
+
+    Return:
+        (tuple): ``(nodes, indptr, indices)``, where the children of
+            ``nodes[i]`` are ``nodes[indices[indptr[i]:indptr[i + 1]]]``, in
+            the order of ``Node.children``
+    """
+    position = {}
+    nodes = []
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        if id(node) not in position:
+            position[id(node)] = len(nodes)
+            nodes.append(node)
+            stack.extend(node.children)
+    counts = np.fromiter(
+        (len(node.children) for node in nodes), dtype=np.intp, count=len(nodes)
+    )
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    indices = np.fromiter(
+        (position[id(child)] for node in nodes for child in node.children),
+        dtype=np.intp,
+        count=indptr[-1],
+    )
+    return nodes, indptr, indices
 
-    text += all_nodes + "\n" + all_edges + "\n}\n"
 
-    return text
+def _dot_statements(roots, dataframe, metric, name, rank, thread, threshold, visited):
+    """Node and edge statements of the trees rooted at roots.
 
+    Node metrics, colors and visibility are computed for all nodes at once.
+    The traversal then only follows the visible edges of the CSR edge list,
+    in the same depth-first order as a recursive traversal.
 
-def to_dot(hnode, dataframe, metric, name, rank, thread, threshold, visited):
-    """Write to graphviz dot format."""
-    colormap = matplotlib.cm.Reds
+    visited is a set of nodes that have already been written out; it is
+    updated with the nodes written.
+    """
+    nodes, indptr, indices = _children_csr(roots)
+    position = {id(node): i for i, node in enumerate(nodes)}
+
+    rows, columns = node_columns(dataframe, [metric, name], rank, thread)
+    nids = np.fromiter(
+        (node._hatchet_nid for node in nodes), dtype=np.int64, count=len(nodes)
+    )
+    node_rows = np.full(len(nodes), -1, dtype=np.int64)
+    in_table = (nids >= 0) & (nids < len(rows))
+    node_rows[in_table] = rows[nids[in_table]]
+    has_row = node_rows >= 0
+
+    node_time = np.full(len(nodes), np.nan)
+    node_time[has_row] = columns[metric][node_rows[has_row]]
     min_time = dataframe[metric].min()
     max_time = dataframe[metric].max()
 
-    def add_nodes_and_edges(hnode):
-        # set dataframe index based on if rank is a part of the index
-        if "rank" in dataframe.index.names and "thread" in dataframe.index.names:
-            df_index = (hnode, rank, thread)
-        elif "rank" in dataframe.index.names:
-            df_index = (hnode, rank)
-        elif "thread" in dataframe.index.names:
-            df_index = (hnode, thread)
-        else:
-            df_index = hnode
-
-        node_time = dataframe.loc[df_index, metric]
-        node_name = dataframe.loc[df_index, name]
-        node_id = hnode._hatchet_nid
-
-        weight = (node_time - min_time) / (max_time - min_time)
-        color = matplotlib.colors.rgb2hex(colormap(weight))
-
-        # only display nodes whose metric is greater than some threshold
-        if (node_time >= threshold * max_time) and (hnode not in visited):
-            node_string = '"{0}" [color="{1}", label="{2}" shape=oval];\n'.format(
-                node_id, color, node_name
-            )
-            edge_string = ""
-
-            # only display those edges where child's metric is greater than
-            # threshold
-            children = []
-            for child in hnode.children:
-                if (
-                    "rank" in dataframe.index.names
-                    and "thread" in dataframe.index.names
-                ):
-                    df_index = (child, rank, thread)
-                elif "rank" in dataframe.index.names:
-                    df_index = (child, rank)
-                elif "thread" in dataframe.index.names:
-                    df_index = (child, thread)
-                else:
-                    df_index = child
-
-                child_time = dataframe.loc[df_index, metric]
-                if child_time >= threshold * max_time:
-                    children.append(child)
-
-            visited.append(hnode)
-            for child in children:
-                # add edges
-                child_id = child._hatchet_nid
-
-                edge_string += '"{0}" -> "{1}";\n'.format(node_id, child_id)
-                (nodes, edges) = add_nodes_and_edges(child)
-                node_string += nodes
-                edge_string += edges
-        else:
-            node_string = ""
-            edge_string = ""
-
-        return (node_string, edge_string)
-
-    # call add_nodes_and_edges on the root
-    return add_nodes_and_edges(hnode)
+    # only display nodes whose metric is greater than some threshold, and
+    # only the edges to those nodes
+    visible = node_time >= threshold * max_time
+    edge_visible = visible[indices]
+
+    # depth-first traversal over node positions; each stack entry is a node
+    # and the parent that the edge to it comes from
+    done = np.zeros(len(nodes), dtype=bool)
+    for i, node in enumerate(nodes):
+        done[i] = node in visited
+    node_order = []
+    edge_order = []
+    for root in roots:
+        stack = [(position[id(root)], -1)]
+        while stack:
+            i, parent = stack.pop()
+            if parent >= 0:
+                edge_order.append((parent, i))
+            if not visible[i] or done[i]:
+                continue
+            done[i] = True
+            node_order.append(i)
+            start, end = indptr[i], indptr[i + 1]
+            children = indices[start:end][edge_visible[start:end]]
+            stack.extend((child, i) for child in children[::-1])
+    visited.update(nodes[i] for i in node_order)
+
+    node_order = np.array(node_order, dtype=np.intp)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = (node_time[node_order] - min_time) / (max_time - min_time)
+    colors = _reds_hex(weights)
+    names = columns[name][node_rows[node_order]]
+
+    node_statements = (
+        '"{0}" [color="{1}", label="{2}" shape=oval];\n'.format(
+            nids[i], color, node_name
+        )
+        for i, color, node_name in zip(node_order, colors, names)
+    )
+    edge_statements = (
+        '"{0}" -> "{1}";\n'.format(nids[parent], nids[child])
+        for parent, child in edge_order
+    )
+    return node_statements, edge_statements
@@ -0,0 +1,76 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+
+
+def rank_thread_mask(dataframe, rank=0, thread=0):
+    """Select the rows of a GraphFrame's dataframe for one rank and thread.
+
+    Index levels that are not present in the dataframe are ignored, so the
+    selected rows are the ones that ``dataframe.loc[(node, rank, thread)]``
+    (or the equivalent for the levels present) returns for each node.
+
+    Arguments:
+        dataframe (DataFrame): dataframe indexed by node and optionally rank/thread
+        rank (int): rank to select
+        thread (int): thread to select
+
+    Return:
+        (numpy.ndarray): boolean mask over the rows of the dataframe
+    """
+    index = dataframe.index
+    mask = np.ones(len(dataframe), dtype=bool)
+    if "rank" in index.names:
+        mask &= index.get_level_values("rank") == rank
+    if "thread" in index.names:
+        mask &= index.get_level_values("thread") == thread
+    return mask
+
+
+def node_columns(dataframe, columns, rank=0, thread=0):
+    """Extract columns of a GraphFrame's dataframe as arrays aligned by node.
+
+    This replaces per-node ``dataframe.loc[(node, rank, thread), column]``
+    lookups with a single pass over the dataframe.
+
+    Arguments:
+        dataframe (DataFrame): dataframe indexed by node and optionally rank/thread
+        columns (list of str): columns to extract (missing columns are skipped)
+        rank (int): rank to select
+        thread (int): thread to select
+
+    Return:
+        (tuple): ``(rows, arrays)``, where ``arrays`` maps each column to a
+            numpy array of values and ``rows[node._hatchet_nid]`` is the
+            position of the node's value in these arrays, or -1 if the node
+            has no row
+    """
+    mask = rank_thread_mask(dataframe, rank, thread)
+    nodes = dataframe.index.get_level_values("node")[mask]
+    nids = np.fromiter(
+        (n._hatchet_nid for n in nodes), dtype=np.int64, count=len(nodes)
+    )
+    valid = np.flatnonzero(nids >= 0)
+    rows = np.full(nids.max() + 1 if len(valid) else 0, -1, dtype=np.int64)
+    rows[nids[valid]] = valid
+    arrays = {
+        col: dataframe[col].to_numpy()[mask]
+        for col in columns
+        if col in dataframe.columns
+    }
+    return rows, arrays
+
+
+def node_row(rows, node):
+    """Position of node's values in the arrays returned by node_columns.
+
+    Raises:
+        KeyError: if the node has no row for the selected rank and thread
+    """
+    nid = node._hatchet_nid
+    if 0 <= nid < len(rows) and rows[nid] >= 0:
+        return rows[nid]
+    raise KeyError(node)
@@ -0,0 +1,236 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def profile_vector(graphframe, dim=2**14, metric=None):
+    """Embed a GraphFrame as a unit vector over its call paths.
+
+    Every node is hashed from its frame and the hashes of its parents, i.e.,
+    from its call path in a tree (so the hash is the same in every run and
+    every session), to one of ``dim`` coordinates and a sign, and adds its
+    metric value there. In a graph, a node with several parents is hashed
+    once from the sorted hashes of its parents, so the cost stays linear.
+    Two profiles with the same call paths in the same proportions have a
+    cosine similarity of 1.
+
+    Arguments:
+        graphframe (GraphFrame): profile to embed
+        dim (int): number of coordinates of the vector
+        metric (str, optional): metric that weights the call paths, averaged
+            across ranks/threads (default: the inclusive version of
+            default_metric)
+
+    Return:
+        (numpy.ndarray): float32 vector of norm 1 (or 0 if the metric is 0
+            everywhere)
+    """
+    if metric is None:
+        metric = graphframe.default_metric
+    metric = graphframe._inclusive_metric(metric)
+    function = "mean" if graphframe.dataframe.index.nlevels > 1 else None
+    values = graphframe._node_values(metric, function=function)
+
+    hashes = {}
+    indices = []
+    weights = []
+    # parents come before their children in reverse postorder
+    for node in reversed(list(graphframe.graph.traverse(order="post"))):
+        frame = repr(node.frame.tuple_repr).encode()
+        # parents of a cycle may not be hashed yet, and are skipped
+        parent_hashes = sorted(
+            set(hashes[parent] for parent in node.parents if parent in hashes)
+        )
+        hashes[node] = hashlib.blake2b(
+            b"".join(parent_hashes) + frame, digest_size=8
+        ).digest()
+        nid = node._hatchet_nid
+        value = values[nid] if 0 <= nid < len(values) else np.nan
+        if not np.isfinite(value) or value == 0:
+            continue
+        key = int.from_bytes(hashes[node], "little")
+        indices.append(key % dim)
+        # the top bit gives the sign, so that collisions cancel out on
+        # average instead of adding up
+        weights.append(-value if key >> 63 else value)
+
+    vector = np.bincount(
+        np.array(indices, dtype=np.intp), np.array(weights, dtype=float), dim
+    )
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.astype(np.float32)
+
+
+class ProfileIndex:
+    """On-disk index of profiles for finding the runs most similar to a
+    given one.
+
+    Each profile is stored as a normalized vector over its call paths (see
+    profile_vector) in a memory-mapped NumPy file, so the index can hold
+    thousands of runs without loading them in memory. Queries compare
+    profiles by cosine similarity, against a block of stored vectors at a
+    time.
+
+    The index is a directory with the vectors (``vectors.npy``) and a JSON
+    file with the parameters and the label of each run (``index.json``).
+    """
+
+    def __init__(self, path, dim=None, metric=None):
+        """Open the index in a directory, creating it if it does not exist.
+
+        Arguments:
+            path (str): directory of the index
+            dim (int, optional): number of coordinates of the vectors of a
+                new index (default 2**14)
+            metric (str, optional): metric that weights the call paths of a
+                new index (default: the inclusive version of each
+                GraphFrame's default_metric)
+        """
+        self.path = path
+        self._vectors_file = os.path.join(path, "vectors.npy")
+        self._index_file = os.path.join(path, "index.json")
+        if os.path.exists(self._index_file):
+            with open(self._index_file) as index_file:
+                info = json.load(index_file)
+            if dim is not None and info["dim"] != dim:
+                raise ValueError(
+                    "index at {} has {} dimensions, not {}".format(
+                        path, info["dim"], dim
+                    )
+                )
+            self.dim = info["dim"]
+            self.metric = info["metric"]
+            self.labels = info["labels"]
+            self._vectors = np.load(self._vectors_file, mmap_mode="r+")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.dim = 2**14 if dim is None else dim
+            self.metric = metric
+            self.labels = []
+            self._vectors = np.lib.format.open_memmap(
+                self._vectors_file, mode="w+", dtype=np.float32, shape=(16, self.dim)
+            )
+            self.flush()
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def vectors(self):
+        """Memory-mapped (runs x dim) array of the stored vectors."""
+        return self._vectors[: len(self)]
+
+    def add(self, graphframe, label=None):
+        """Add a run to the index.
+
+        Arguments:
+            graphframe (GraphFrame): profile of the run
+            label (optional): JSON-serializable label of the run, returned
+                by queries (default: its position in the index)
+
+        Return:
+            (int): position of the run in the index
+        """
+        position = len(self)
+        vector = profile_vector(graphframe, self.dim, self.metric)
+        if position == len(self._vectors):
+            self._grow(2 * position)
+        self._vectors[position] = vector
+        self.labels.append(position if label is None else label)
+        return position
+
+    def extend(self, graphframes, labels=None):
+        """Add several runs to the index, e.g., from a generator that reads
+        them one at a time, and write the index to disk.
+
+        Arguments:
+            graphframes (iterable of GraphFrame): profiles of the runs
+            labels (iterable, optional): label of each run
+        """
+        labels = iter(labels) if labels is not None else None
+        for graphframe in graphframes:
+            self.add(graphframe, next(labels) if labels is not None else None)
+        self.flush()
+
+    def query(self, graphframes, k=5, batch_size=4096):
+        """Find the runs most similar to each of the given profiles.
+
+        Arguments:
+            graphframes (GraphFrame or list of GraphFrame): profiles to look up
+            k (int): number of runs to return for each profile
+            batch_size (int): number of stored vectors compared at a time
+
+        Return:
+            (DataFrame): the k most similar runs of each profile, most
+                similar first, indexed by (query, neighbor) with the
+                position, label and cosine similarity of each run
+        """
+        if not isinstance(graphframes, (list, tuple)):
+            graphframes = [graphframes]
+        queries = np.array(
+            [profile_vector(gf, self.dim, self.metric) for gf in graphframes],
+            dtype=np.float32,
+        ).reshape(len(graphframes), self.dim)
+        k = min(k, len(self))
+
+        # keep the k best runs of each query, merging one block of stored
+        # vectors at a time
+        best_positions = np.zeros((len(queries), 0), dtype=np.intp)
+        best_similarities = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), batch_size):
+            stop = min(start + batch_size, len(self))
+            similarities = queries @ np.asarray(self._vectors[start:stop]).T
+            positions = np.broadcast_to(np.arange(start, stop), similarities.shape)
+            similarities = np.hstack([best_similarities, similarities])
+            positions = np.hstack([best_positions, positions])
+            if similarities.shape[1] > k:
+                top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+                similarities = np.take_along_axis(similarities, top, axis=1)
+                positions = np.take_along_axis(positions, top, axis=1)
+            best_similarities, best_positions = similarities, positions
+
+        # most similar first, then by position
+        order = np.lexsort((best_positions, -best_similarities), axis=1)
+        best_similarities = np.take_along_axis(best_similarities, order, axis=1)
+        best_positions = np.take_along_axis(best_positions, order, axis=1)
+        num_queries, num_neighbors = best_positions.shape
+        return pd.DataFrame(
+            {
+                "position": best_positions.ravel(),
+                "label": [self.labels[p] for p in best_positions.ravel()],
+                "similarity": best_similarities.ravel().astype(float),
+            },
+            index=pd.MultiIndex.from_product(
+                [range(num_queries), range(num_neighbors)], names=["query", "neighbor"]
+            ),
+        )
+
+    def flush(self):
+        """Write the index to disk."""
+        self._vectors.flush()
+        info = {"dim": self.dim, "metric": self.metric, "labels": self.labels}
+        with open(self._index_file, "w") as index_file:
+            json.dump(info, index_file)
+
+    def _grow(self, capacity):
+        """Move the vectors to a larger file."""
+        grown_file = self._vectors_file + ".tmp"
+        grown = np.lib.format.open_memmap(
+            grown_file, mode="w+", dtype=np.float32, shape=(capacity, self.dim)
+        )
+        grown[: len(self)] = self._vectors[: len(self)]
+        grown.flush()
+        del self._vectors
+        del grown
+        os.replace(grown_file, self._vectors_file)
+        self._vectors = np.load(self._vectors_file, mmap_mode="r+")
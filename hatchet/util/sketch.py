@@ -0,0 +1,289 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """Mergeable quantile sketches of a metric, one per key (e.g., per node).
+
+    Each sketch is a merging t-digest: the values of a key are summarized by
+    at most ``size`` centroids (mean, weight), which are small near the
+    minimum and maximum and large around the median, so tail quantiles such
+    as p99 stay accurate. The count, sum, minimum and maximum of each key are
+    kept exactly.
+
+    The centroids of all keys are stored in (keys x size) arrays and
+    compressed together, so values can be added a batch at a time (e.g., one
+    rank at a time, as they are read) without keeping all of them in memory,
+    and sketches of different runs can be merged for ensemble statistics.
+    Keys are matched by equality, so the graphs of GraphFrames should be
+    unified before merging their sketches by node.
+    """
+
+    def __init__(self, size=100):
+        """Create an empty sketch.
+
+        Arguments:
+            size (int): maximum number of centroids per key; larger sketches
+                are more accurate
+        """
+        self.size = size
+        self.keys = pd.Index([])
+        self._means = np.zeros((0, size))
+        self._weights = np.zeros((0, size))
+        self.count = np.zeros(0)
+        self.sum = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        # values added since the last compression, as (row, value, weight)
+        self._pending = []
+        self._num_pending = 0
+
+    @classmethod
+    def from_values(cls, keys, values, size=100):
+        """Create sketches of values grouped by keys.
+
+        Arguments:
+            keys (array-like): key of each value
+            values (array-like): values to add
+            size (int): maximum number of centroids per key
+
+        Return:
+            (QuantileSketch): new sketch
+        """
+        sketch = cls(size)
+        sketch.update(keys, values)
+        return sketch
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def mean(self):
+        """Exact mean of the values of each key."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum / self.count
+
+    def update(self, keys, values, weights=None):
+        """Add values to the sketches of their keys.
+
+        NaN values are ignored.
+
+        Arguments:
+            keys (array-like): key of each value
+            values (array-like): values to add
+            weights (array-like, optional): weight of each value (default 1)
+        """
+        keys = pd.Index(keys)
+        rows = self.keys.get_indexer(keys)
+        new = rows < 0
+        if new.any():
+            new_keys = keys[new].unique()
+            self._add_keys(new_keys)
+            rows[new] = self.keys.get_indexer(keys[new])
+        self._update_rows(rows, values, weights)
+
+    def merge(self, *others):
+        """Merge sketches, e.g., of the same metric in several runs.
+
+        Arguments:
+            others (QuantileSketch): sketches to merge with this one
+
+        Return:
+            (QuantileSketch): new sketch of the values of all sketches
+        """
+        result = QuantileSketch(max([self.size] + [other.size for other in others]))
+        for sketch in (self,) + others:
+            sketch._compress()
+            result._add_keys(sketch.keys.difference(result.keys, sort=False))
+            rows = result.keys.get_indexer(sketch.keys)
+            result.count[rows] += sketch.count
+            result.sum[rows] += sketch.sum
+            result.min[rows] = np.fmin(result.min[rows], sketch.min)
+            result.max[rows] = np.fmax(result.max[rows], sketch.max)
+            used = sketch._weights > 0
+            result._append(
+                np.broadcast_to(rows[:, np.newaxis], used.shape)[used],
+                sketch._means[used],
+                sketch._weights[used],
+            )
+        result._compress()
+        return result
+
+    def quantile(self, q):
+        """Estimate quantiles of the values of each key.
+
+        Arguments:
+            q (float or list of float): quantile(s) between 0 and 1
+
+        Return:
+            (DataFrame): estimated quantiles, indexed by key with one column
+                per quantile (NaN for keys without values)
+        """
+        self._compress()
+        qs = np.atleast_1d(np.asarray(q, dtype=float))
+        xp, fp = self._cdf_points()
+        num_keys = len(self.keys)
+        # the points of key i are at x in [2i, 2i + 1]
+        queries = 2 * np.arange(num_keys)[:, np.newaxis] + qs[np.newaxis, :]
+        result = np.interp(queries.ravel(), xp, fp).reshape(num_keys, len(qs))
+        result[self.count == 0] = np.nan
+        return pd.DataFrame(result, index=self.keys, columns=list(qs))
+
+    def histogram(self, bins=10):
+        """Estimate histograms of the values of each key.
+
+        The bins of each key evenly divide the range between its minimum and
+        maximum value.
+
+        Arguments:
+            bins (int): number of bins
+
+        Return:
+            (DataFrame): estimated number of values in each bin, indexed by
+                key with one column per bin
+        """
+        self._compress()
+        xp, fp = self._cdf_points()
+        num_keys = len(self.keys)
+        offset = 2 * np.arange(num_keys)
+        # invert the quantile function of each key, with the values scaled
+        # to [0, 1] and offset by key so that they are increasing overall
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scaled = (fp.reshape(num_keys, -1) - self.min[:, np.newaxis]) / (
+                self.max - self.min
+            )[:, np.newaxis]
+        scaled = np.nan_to_num(scaled) + offset[:, np.newaxis]
+        edges = np.linspace(0, 1, bins + 1)[np.newaxis, :] + offset[:, np.newaxis]
+        cdf = np.interp(edges.ravel(), scaled.ravel(), xp).reshape(num_keys, bins + 1)
+        cdf -= offset[:, np.newaxis]
+        # the first bin includes the minimum and the last bin the maximum
+        cdf[:, 0] = 0.0
+        cdf[:, -1] = 1.0
+        counts = np.diff(cdf, axis=1) * self.count[:, np.newaxis]
+        # keys whose values are all equal have all of them in each bin
+        equal = self.min == self.max
+        counts[equal] = self.count[equal, np.newaxis]
+        counts[self.count == 0] = np.nan
+        return pd.DataFrame(counts, index=self.keys)
+
+    def _add_keys(self, keys):
+        num_new = len(keys)
+        if not num_new:
+            return
+        keys = pd.Index(keys)
+        self.keys = self.keys.append(keys) if len(self.keys) else keys
+        self._means = np.vstack([self._means, np.zeros((num_new, self.size))])
+        self._weights = np.vstack([self._weights, np.zeros((num_new, self.size))])
+        self.count = np.concatenate([self.count, np.zeros(num_new)])
+        self.sum = np.concatenate([self.sum, np.zeros(num_new)])
+        self.min = np.concatenate([self.min, np.full(num_new, np.nan)])
+        self.max = np.concatenate([self.max, np.full(num_new, np.nan)])
+
+    def _update_rows(self, rows, values, weights=None):
+        """Add values to the sketches of the keys at the given rows."""
+        rows = np.asarray(rows, dtype=np.intp)
+        values = np.asarray(values, dtype=float)
+        if weights is None:
+            weights = np.ones(len(values))
+        else:
+            weights = np.asarray(weights, dtype=float)
+        valid = ~np.isnan(values)
+        rows, values, weights = rows[valid], values[valid], weights[valid]
+
+        num_keys = len(self.keys)
+        self.count += np.bincount(rows, weights=weights, minlength=num_keys)
+        self.sum += np.bincount(rows, weights=weights * values, minlength=num_keys)
+        batch_min = np.full(num_keys, np.nan)
+        batch_max = np.full(num_keys, np.nan)
+        np.fmin.at(batch_min, rows, values)
+        np.fmax.at(batch_max, rows, values)
+        self.min = np.fmin(self.min, batch_min)
+        self.max = np.fmax(self.max, batch_max)
+        self._append(rows, values, weights)
+
+    def _append(self, rows, values, weights):
+        self._pending.append((rows, values, weights))
+        self._num_pending += len(rows)
+        # compress once the buffered values outnumber the centroids, so each
+        # value is sorted a bounded number of times
+        if self._num_pending > len(self.keys) * self.size:
+            self._compress()
+
+    def _compress(self):
+        """Merge the pending values into the centroids of each key."""
+        if not self._pending:
+            return
+        num_keys, size = len(self.keys), self.size
+        used = self._weights > 0
+        rows = np.concatenate(
+            [np.broadcast_to(np.arange(num_keys)[:, np.newaxis], used.shape)[used]]
+            + [p[0] for p in self._pending]
+        )
+        values = np.concatenate([self._means[used]] + [p[1] for p in self._pending])
+        weights = np.concatenate([self._weights[used]] + [p[2] for p in self._pending])
+        self._pending = []
+        self._num_pending = 0
+
+        # sort by key, then value, and find the quantile at the middle of
+        # each centroid within its key
+        order = np.lexsort((values, rows))
+        rows, values, weights = rows[order], values[order], weights[order]
+        total = np.bincount(rows, weights=weights, minlength=num_keys)
+        cumulative = np.cumsum(weights)
+        starts = np.concatenate([[0.0], np.cumsum(total)[:-1]])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            q = (cumulative - weights / 2 - starts[rows]) / total[rows]
+
+        # centroids with the same k1 scale value (arcsine of the quantile)
+        # are merged; the scale puts smaller centroids at the tails
+        scale = np.arcsin(2 * np.clip(q, 0, 1) - 1) / np.pi + 0.5
+        bucket = np.minimum((scale * size).astype(np.intp), size - 1)
+        flat = rows * size + bucket
+        merged_weights = np.bincount(flat, weights=weights, minlength=num_keys * size)
+        merged_sums = np.bincount(
+            flat, weights=weights * values, minlength=num_keys * size
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged_means = np.where(
+                merged_weights > 0, merged_sums / merged_weights, 0.0
+            )
+        self._weights = merged_weights.reshape(num_keys, size)
+        self._means = merged_means.reshape(num_keys, size)
+
+    def _cdf_points(self):
+        """Points (x, value) of the piecewise-linear quantile function of all
+        keys, where x runs from 2i to 2i + 1 over the values of key i.
+
+        Each key's function goes from its minimum, through the middle of
+        each centroid, to its maximum.
+        """
+        num_keys = len(self.keys)
+        weights = self._weights
+        with np.errstate(invalid="ignore", divide="ignore"):
+            middle = (np.cumsum(weights, axis=1) - weights / 2) / self.count[
+                :, np.newaxis
+            ]
+        # empty centroids are placed on the previous centroid
+        empty = weights == 0
+        middle[empty] = 0.0
+        middle = np.maximum.accumulate(middle, axis=1)
+        previous = np.maximum.accumulate(
+            np.where(empty, 0, np.arange(self.size)), axis=1
+        )
+        means = np.take_along_axis(self._means, previous, axis=1)
+        means = np.where(
+            np.take_along_axis(empty, previous, axis=1), self.min[:, np.newaxis], means
+        )
+
+        x = np.hstack(
+            [np.zeros((num_keys, 1)), np.nan_to_num(middle), np.ones((num_keys, 1))]
+        )
+        x = np.clip(x, 0, 1) + 2 * np.arange(num_keys)[:, np.newaxis]
+        fp = np.hstack([self.min[:, np.newaxis], means, self.max[:, np.newaxis]])
+        fp = np.clip(fp, self.min[:, np.newaxis], self.max[:, np.newaxis])
+        return x.ravel(), np.nan_to_num(fp).ravel()
@@ -0,0 +1,82 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import json
+
+import numpy as np
+
+from .timeline_writer import TimelineWriter
+
+
+class ChromeTraceWriter(TimelineWriter):
+    """Write a GraphFrame in the Chrome trace event format, which can be
+    opened in Perfetto UI or chrome://tracing:
+    https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+
+    Every node is written as a complete ("X") event, with the rank as the
+    process id and the thread as the thread id. If the dataframe has a
+    timestamp column (as in GraphFrames read from Perfetto traces), the
+    events keep their recorded start times. Otherwise, the events are laid
+    out on a synthetic timeline where children start one after another
+    inside their parent.
+    """
+
+    def _chunks(self, gf, metric=None, name="name", ts="ts", scale=1.0e6, sort_by=None):
+        if metric is None:
+            metric = gf.default_metric
+
+        # encode each distinct name once
+        names = {}
+
+        def event(name_value, start, duration, pid, tid):
+            encoded = names.get(name_value)
+            if encoded is None:
+                encoded = names[name_value] = json.dumps(str(name_value))
+            return '{{"name":{},"ph":"X","ts":{},"dur":{},"pid":{},"tid":{}}}'.format(
+                encoded, float(start), float(duration), pid, tid
+            )
+
+        yield '{"displayTimeUnit":"ns","traceEvents":[\n'
+        sep = ""
+        if ts in gf.dataframe.columns:
+            dataframe = gf.dataframe
+            index = dataframe.index
+            zeros = np.zeros(len(dataframe), dtype=np.int64)
+            pids = (
+                index.get_level_values("rank").to_numpy()
+                if "rank" in index.names
+                else zeros
+            )
+            tids = (
+                index.get_level_values("thread").to_numpy()
+                if "thread" in index.names
+                else zeros
+            )
+            # timestamps are recorded in nanoseconds
+            starts = dataframe[ts].to_numpy(dtype=float) * 1.0e-3
+            durations = dataframe[metric].to_numpy(dtype=float) * scale
+            name_values = dataframe[name].to_numpy()
+            # rows that were filled in for missing rank/thread combinations
+            # have no duration
+            for i in np.flatnonzero(durations > 0):
+                yield sep + event(
+                    name_values[i], starts[i], durations[i], pids[i], tids[i]
+                )
+                sep = ",\n"
+        else:
+            for timeline in self._timelines(gf, metric, [name], sort_by):
+                name_values = timeline.column(name)
+                starts = timeline.start * scale
+                durations = (timeline.end - timeline.start) * scale
+                for i in range(len(timeline)):
+                    yield sep + event(
+                        name_values[i],
+                        starts[i],
+                        durations[i],
+                        timeline.rank,
+                        timeline.thread,
+                    )
+                    sep = ",\n"
+        yield "\n]}\n"
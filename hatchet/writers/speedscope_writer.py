@@ -0,0 +1,100 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+import json
+
+from hatchet.version import __version__
+
+from .timeline_writer import TimelineWriter
+
+
+class SpeedscopeWriter(TimelineWriter):
+    """Write a GraphFrame in the speedscope file format, with one profile
+    per rank/thread:
+    https://github.com/jlfwong/speedscope/wiki/Importing-from-custom-sources
+
+    Frames are stored once in the shared frame table and referenced by index
+    from the profiles. The table is written after the profiles, so the file
+    is produced in a single pass.
+    """
+
+    def _chunks(
+        self,
+        gf,
+        metric=None,
+        name="name",
+        profile_type="evented",
+        unit="none",
+        sort_by=None,
+    ):
+        if profile_type not in ("evented", "sampled"):
+            raise ValueError("profile_type must be one of 'evented' or 'sampled'")
+        if metric is None:
+            metric = gf.default_metric
+
+        frames = {}
+
+        def frame_index(timeline):
+            names = timeline.column(name)
+            files = timeline.column("file") if "file" in timeline.columns else None
+            index = []
+            for i in range(len(timeline)):
+                file = files[i] if files is not None else None
+                key = (str(names[i]), file if isinstance(file, str) else None)
+                if key not in frames:
+                    frames[key] = len(frames)
+                index.append(frames[key])
+            return index
+
+        yield '{"$schema": "https://www.speedscope.app/file-format-schema.json", '
+        yield '"exporter": "hatchet@{}", "activeProfileIndex": 0, '.format(__version__)
+        yield '"profiles": ['
+        for count, timeline in enumerate(
+            self._timelines(gf, metric, [name, "file"], sort_by)
+        ):
+            frame = frame_index(timeline)
+            end_value = timeline.end.max()
+            header = {
+                "type": profile_type,
+                "name": "rank {}, thread {}".format(timeline.rank, timeline.thread),
+                "unit": unit,
+                "startValue": 0,
+                "endValue": float(end_value),
+            }
+            yield (", " if count else "") + json.dumps(header)[:-1]
+            if profile_type == "evented":
+                yield ', "events": [\n'
+                sep = ""
+                for kind, i in timeline.events():
+                    at = timeline.start[i] if kind == "O" else timeline.end[i]
+                    yield '{}{{"type": "{}", "frame": {}, "at": {}}}'.format(
+                        sep, kind, frame[i], float(at)
+                    )
+                    sep = ",\n"
+                yield "]}"
+            else:
+                weights = []
+                yield ', "samples": [\n'
+                sep = ""
+                stack = []
+                for kind, i in timeline.events():
+                    if kind == "C":
+                        stack.pop()
+                        continue
+                    stack.append(frame[i])
+                    if timeline.exclusive[i] > 0:
+                        yield sep + json.dumps(stack)
+                        weights.append(float(timeline.exclusive[i]))
+                        sep = ",\n"
+                yield '], "weights": ' + json.dumps(weights) + "}"
+        yield '], "shared": {"frames": ['
+        sep = ""
+        for frame_name, frame_file in frames:
+            frame = {"name": frame_name}
+            if frame_file is not None:
+                frame["file"] = frame_file
+            yield sep + json.dumps(frame)
+            sep = ",\n"
+        yield "]}}\n"
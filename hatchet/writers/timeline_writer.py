@@ -0,0 +1,227 @@
+# Copyright 2017-2024 Lawrence Livermore National Security, LLC and other
+# Hatchet Project Developers. See the top-level LICENSE file for details.
+#
+# SPDX-License-Identifier: MIT
+
+from abc import abstractmethod
+
+import numpy as np
+
+from hatchet.node import traversal_order
+from hatchet.util.node_columns import node_columns
+
+# TODO The ABC class was introduced in Python 3.4.
+# When support for earlier versions is (eventually) dropped,
+# this entire "try-except" block can be reduced to:
+# from abc import ABC
+try:
+    from abc import ABC
+except ImportError:
+    from abc import ABCMeta
+
+    ABC = ABCMeta("ABC", (object,), {"__slots__": ()})
+
+
+def _rank_thread_groups(dataframe):
+    """Yield (rank, thread, dataframe) for each rank/thread of a dataframe."""
+    levels = [lvl for lvl in ("rank", "thread") if lvl in dataframe.index.names]
+    if not levels:
+        yield 0, 0, dataframe
+        return
+    level = levels if len(levels) > 1 else levels[0]
+    for key, group in dataframe.groupby(level=level, sort=True):
+        key = dict(zip(levels, key if isinstance(key, tuple) else (key,)))
+        yield key.get("rank", 0), key.get("thread", 0), group
+
+
+def _preorder(roots, rows, child_order=None):
+    """Nodes reachable from roots that have a row, in preorder.
+
+    Each node is visited once, and subtrees of nodes without a row are
+    skipped. Children are visited by frame, or in the order given by
+    child_order (see GraphFrame.child_order).
+
+    Return:
+        (tuple): ``(positions, parents)``, where ``positions[i]`` is the row of
+            the i-th node and ``parents[i]`` is the index of its parent in
+            the preorder (-1 for roots)
+    """
+    positions = []
+    parents = []
+    visited = set()
+    if child_order is None:
+        roots = sorted(roots, key=traversal_order)
+
+        def sorted_children(node):
+            return sorted(node.children, key=traversal_order)
+
+    else:
+        roots = child_order[0]
+
+        def sorted_children(node):
+            return child_order[1].get(node, [])
+
+    stack = [(root, -1) for root in reversed(roots)]
+    while stack:
+        node, parent = stack.pop()
+        nid = node._hatchet_nid
+        if node in visited or not (0 <= nid < len(rows)) or rows[nid] < 0:
+            continue
+        visited.add(node)
+        index = len(positions)
+        positions.append(rows[nid])
+        parents.append(parent)
+        stack.extend((child, index) for child in reversed(sorted_children(node)))
+    return np.array(positions, dtype=np.int64), np.array(parents, dtype=np.int64)
+
+
+class Timeline:
+    """Nodes of one rank/thread laid out on a synthetic timeline.
+
+    Every node starts where the previous sibling ends, and a node spans at
+    least its inclusive value and all of its children, so the events are
+    properly nested even if the metric is not. Subtrees with no value are
+    dropped.
+
+    Attributes:
+        rank, thread (int): rank and thread of the timeline
+        positions (ndarray): rows of the nodes (in preorder) in ``columns``
+        parents (ndarray): preorder index of each node's parent, or -1
+        exclusive, inclusive (ndarray): metric values of the nodes
+        start, end (ndarray): position of the nodes on the timeline
+        columns (dict): arrays of the dataframe columns for this rank/thread
+    """
+
+    def __init__(
+        self,
+        rank,
+        thread,
+        roots,
+        dataframe,
+        metric,
+        inclusive,
+        columns,
+        child_order=None,
+    ):
+        self.rank = rank
+        self.thread = thread
+        rows, self.columns = node_columns(
+            dataframe, [metric] + list(columns), rank, thread
+        )
+        positions, parents = _preorder(roots, rows, child_order)
+        values = np.nan_to_num(
+            self.columns[metric][positions].astype(float), nan=0.0, posinf=0.0
+        )
+        has_parent = parents >= 0
+        n = len(positions)
+
+        if inclusive:
+            children_sum = np.bincount(
+                parents[has_parent], weights=values[has_parent], minlength=n
+            )
+            exc = np.maximum(values - children_sum, 0.0)
+        else:
+            exc = values
+        inc = values.copy()
+
+        # width of each node: at least its inclusive value and the sum of its
+        # children (children always come after their parent in preorder)
+        width = np.zeros(n)
+        children_inc = np.zeros(n)
+        children_width = np.zeros(n)
+        for i in range(n - 1, -1, -1):
+            if not inclusive:
+                inc[i] += children_inc[i]
+            width[i] = max(inc[i], children_width[i])
+            if parents[i] >= 0:
+                children_inc[parents[i]] += inc[i]
+                children_width[parents[i]] += width[i]
+
+        keep = width > 0
+        for i in range(n):
+            if parents[i] >= 0 and not keep[parents[i]]:
+                keep[i] = False
+
+        start = np.zeros(n)
+        next_start = np.zeros(n)
+        cursor = 0.0
+        for i in np.flatnonzero(keep):
+            parent = parents[i]
+            if parent < 0:
+                start[i] = cursor
+                cursor += width[i]
+            else:
+                start[i] = next_start[parent]
+                next_start[parent] += width[i]
+            next_start[i] = start[i]
+
+        remap = np.cumsum(keep) - 1
+        self.positions = positions[keep]
+        self.parents = np.where(parents[keep] >= 0, remap[parents[keep]], -1)
+        self.exclusive = exc[keep]
+        self.inclusive = inc[keep]
+        self.start = start[keep]
+        self.end = start[keep] + width[keep]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def column(self, name):
+        """Values of a column for the nodes of the timeline, in preorder."""
+        return self.columns[name][self.positions]
+
+    def events(self):
+        """Yield ("O", i) and ("C", i) for opening and closing the i-th node,
+        in timeline order."""
+        open_nodes = []
+        for i, parent in enumerate(self.parents):
+            while open_nodes and open_nodes[-1] != parent:
+                yield "C", open_nodes.pop()
+            yield "O", i
+            open_nodes.append(i)
+        while open_nodes:
+            yield "C", open_nodes.pop()
+
+
+class TimelineWriter(ABC):
+    """Base class of writers that export a GraphFrame as a timeline of
+    events. The output is produced as a stream of chunks and written to a
+    file name or to a file-like object."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    @abstractmethod
+    def _chunks(self, gf, **kwargs):
+        pass
+
+    def write(self, gf, **kwargs):
+        chunks = self._chunks(gf, **kwargs)
+        if hasattr(self.filename, "write"):
+            for chunk in chunks:
+                self.filename.write(chunk)
+        else:
+            with open(self.filename, "w") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+
+    @staticmethod
+    def _timelines(gf, metric, columns=(), sort_by=None):
+        """Yield a Timeline for each rank/thread of the GraphFrame.
+
+        Children are laid out by frame, or by decreasing sort_by metric.
+        """
+        inclusive = metric in gf.inc_metrics
+        for rank, thread, dataframe in _rank_thread_groups(gf.dataframe):
+            timeline = Timeline(
+                rank,
+                thread,
+                gf.graph.roots,
+                dataframe,
+                metric,
+                inclusive,
+                [c for c in columns if c in gf.dataframe.columns],
+                None if sort_by is None else gf.child_order(sort_by, rank, thread),
+            )
+            if len(timeline):
+                yield timeline